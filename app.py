@@ -6,9 +6,23 @@ import os
 import json
 import sqlite3
 import re
+import ipaddress
+import queue
+import tempfile
+import hashlib
+import base64
+import random
+import argparse
+import gzip
+import csv
+import shutil
 import urllib.parse
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from datetime import datetime, timedelta
 from pathlib import Path
+from zoneinfo import ZoneInfo
 
 # --- 1. AUTO INSTALL REQUIRED PACKAGES ---
 def install_package(package):
@@ -35,13 +49,19 @@ except ImportError:
 try:
     import google.auth
     from google.oauth2.credentials import Credentials
-    from googleapiclient.discovery import build
+    from googleapiclient.discovery import build, build_from_document
+    from googleapiclient.http import HttpRequest
+    from googleapiclient.errors import HttpError
+    from googleapiclient import discovery_cache
     from google_auth_oauthlib.flow import Flow
 except ImportError:
     subprocess.check_call([sys.executable, "-m", "pip", "install", "google-auth", "google-auth-oauthlib", "google-api-python-client"])
     import google.auth
     from google.oauth2.credentials import Credentials
-    from googleapiclient.discovery import build
+    from googleapiclient.discovery import build, build_from_document
+    from googleapiclient.http import HttpRequest
+    from googleapiclient.errors import HttpError
+    from googleapiclient import discovery_cache
     from google_auth_oauthlib.flow import Flow
 
 # Predefined OAuth configuration
@@ -57,12 +77,98 @@ PREDEFINED_OAUTH_CONFIG = {
     }
 }
 
+# --- DATABASE ACCESS LAYER ---
+DB_PATH = "streaming_logs.db"
+DB_BUSY_TIMEOUT = 10          # Seconds to wait on a locked database before failing
+DB_STATEMENT_CACHE = 256      # Prepared statements cached per connection
+DB_POOL_IDLE = 8              # Connections kept open for reuse after their thread ends
+
+def open_connection(db_path=DB_PATH):
+    """Open a SQLite connection tuned for concurrent ffmpeg writers and UI readers"""
+    conn = sqlite3.connect(
+        str(db_path),
+        timeout=DB_BUSY_TIMEOUT,
+        cached_statements=DB_STATEMENT_CACHE,
+        check_same_thread=False
+    )
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Only takes effect on a new, empty file
+    conn.execute("PRAGMA journal_mode=WAL")       # Readers don't block the writer
+    conn.execute("PRAGMA synchronous=NORMAL")     # fsync on checkpoint, not every commit
+    conn.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT * 1000}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+class _ConnectionLease:
+    """A thread's hold on a pooled connection; handed back when the thread ends"""
+
+    def __init__(self, database, conn):
+        self.database = database
+        self.conn = conn
+
+    def __del__(self):
+        if self.conn is not None:
+            self.database.release(self.conn)
+
+class Database:
+    """Pool of tuned SQLite connections for one database file.
+
+    Each thread keeps one connection while it lives (SQLite transactions are
+    per connection). Streamlit runs every rerun on a new thread, so when a
+    thread ends its connection goes back to a bounded idle queue for the next
+    thread instead of being closed and reopened with all the PRAGMAs.
+    """
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = str(db_path)
+        self._local = threading.local()
+        self._idle = queue.LifoQueue(maxsize=DB_POOL_IDLE)
+
+    def connection(self):
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = open_connection(self.db_path)
+            lease = self._local.lease = _ConnectionLease(self, conn)
+        return lease.conn
+
+    def release(self, conn):
+        """Return a connection to the idle queue (closed if the queue is full)"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except (queue.Full, sqlite3.Error):
+            conn.close()
+
+    def close(self):
+        """Close the calling thread's connection and every idle one"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None:
+            lease.conn.close()
+            lease.conn = None
+            self._local.lease = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+@st.cache_resource
+def get_database(db_path=DB_PATH):
+    """Shared connection pool, kept alive across Streamlit reruns and sessions"""
+    return Database(db_path)
+
+def get_db(db_path=DB_PATH):
+    """The calling thread's pooled connection (use `with conn:` for writes)"""
+    return get_database(str(db_path)).connection()
+
 # Initialize database for persistent logs
-def init_database():
+def init_database(db_path=DB_PATH):
     """Initialize SQLite database for persistent logs"""
     try:
-        db_path = Path("streaming_logs.db")
-        conn = sqlite3.connect(db_path)
+        conn = get_db(db_path)
         cursor = conn.cursor()
         
         # Create logs table
@@ -110,31 +216,315 @@ def init_database():
             )
         ''')
         
+        # Create stream_metrics table (downsampled ffmpeg progress samples)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS stream_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                frame INTEGER,
+                fps REAL,
+                bitrate_kbps REAL,
+                speed REAL,
+                dup_frames INTEGER,
+                drop_frames INTEGER,
+                out_time_ms INTEGER
+            )
+        ''')
+        
+        # Create transcode_cache table (stream-ready copies of source videos)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS transcode_cache (
+                cache_key TEXT PRIMARY KEY,
+                source_hash TEXT NOT NULL,
+                profile_key TEXT NOT NULL,
+                path TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at TEXT NOT NULL,
+                last_used TEXT NOT NULL
+            )
+        ''')
+        
+        # Create daemon_streams table (streams owned by the headless daemon)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daemon_streams (
+                stream_id TEXT PRIMARY KEY,
+                config TEXT NOT NULL,
+                desired_state TEXT NOT NULL,
+                state TEXT,
+                pid INTEGER,
+                updated_at TEXT NOT NULL
+            )
+        ''')
+        
         conn.commit()
-        conn.close()
+        
+        # Bring older databases up to the current schema
+        migrate_database(conn)
     except Exception as e:
         st.error(f"Database initialization error: {e}")
 
+# --- SCHEMA MIGRATIONS ---
+# Each migration runs once, in order, inside a transaction; the applied
+# version is tracked in PRAGMA user_version.
+
+def _iso_to_epoch_ms(value):
+    try:
+        return int(datetime.fromisoformat(value).timestamp() * 1000)
+    except (TypeError, ValueError):
+        return None
+
+def _migrate_session_restart_columns(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(streaming_sessions)")}
+    for column, ddl in [
+        ("restart_count", "INTEGER DEFAULT 0"),
+        ("downtime_seconds", "REAL DEFAULT 0")
+    ]:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE streaming_sessions ADD COLUMN {column} {ddl}")
+
+def _migrate_log_epoch_timestamps(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(streaming_logs)")}
+    if "ts" not in existing:
+        conn.execute("ALTER TABLE streaming_logs ADD COLUMN ts INTEGER")
+    conn.create_function("iso_to_epoch_ms", 1, _iso_to_epoch_ms, deterministic=True)
+    conn.execute("UPDATE streaming_logs SET ts = iso_to_epoch_ms(timestamp) WHERE ts IS NULL")
+
+def _migrate_log_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_session_ts ON streaming_logs(session_id, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_type_ts ON streaming_logs(log_type, ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_logs_ts ON streaming_logs(ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_session ON stream_metrics(session_id, id)")
+
+def _migrate_log_rollups(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS log_rollups (
+            session_id TEXT NOT NULL,
+            log_type TEXT NOT NULL,
+            minute_ts INTEGER NOT NULL,
+            line_count INTEGER NOT NULL,
+            last_message TEXT,
+            PRIMARY KEY (session_id, log_type, minute_ts)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollups_minute ON log_rollups(minute_ts)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_timestamp ON stream_metrics(timestamp)")
+
+def fts5_available(conn):
+    """Whether this SQLite build ships the FTS5 extension"""
+    options = {row[0] for row in conn.execute("PRAGMA compile_options")}
+    return "ENABLE_FTS5" in options
+
+def _migrate_log_fts(conn):
+    # Without FTS5 the log search falls back to LIKE scans
+    if not fts5_available(conn):
+        return
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS streaming_logs_fts USING fts5(
+            message, content='streaming_logs', content_rowid='id', tokenize='unicode61'
+        )
+    ''')
+    # External-content triggers keep the index in sync with every insert path
+    # (log_to_database, LogWriter) and with retention deletes
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS streaming_logs_fts_insert AFTER INSERT ON streaming_logs BEGIN
+            INSERT INTO streaming_logs_fts(rowid, message) VALUES (new.id, new.message);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS streaming_logs_fts_delete AFTER DELETE ON streaming_logs BEGIN
+            INSERT INTO streaming_logs_fts(streaming_logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS streaming_logs_fts_update AFTER UPDATE OF message ON streaming_logs BEGIN
+            INSERT INTO streaming_logs_fts(streaming_logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+            INSERT INTO streaming_logs_fts(rowid, message) VALUES (new.id, new.message);
+        END
+    ''')
+    conn.execute("INSERT INTO streaming_logs_fts(streaming_logs_fts) VALUES ('rebuild')")
+
+def _migrate_download_jobs(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS download_jobs (
+            id TEXT PRIMARY KEY,
+            url TEXT NOT NULL,
+            dest TEXT NOT NULL,
+            state TEXT NOT NULL,
+            bytes_done INTEGER DEFAULT 0,
+            total_bytes INTEGER,
+            error TEXT,
+            created_at INTEGER NOT NULL,
+            updated_at INTEGER NOT NULL,
+            finished_at INTEGER
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_download_jobs_state ON download_jobs(state, created_at)")
+
+def _migrate_media_library(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_library (
+            media_id TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            original_name TEXT,
+            source_url TEXT,
+            size_bytes INTEGER,
+            duration REAL,
+            video_codec TEXT,
+            audio_codec TEXT,
+            width INTEGER,
+            height INTEGER,
+            added_at INTEGER NOT NULL,
+            last_used INTEGER NOT NULL
+        )
+    ''')
+    # Every source (Drive id / URL) seen for a media file, for download dedupe
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_sources (
+            source_key TEXT PRIMARY KEY,
+            media_id TEXT NOT NULL,
+            added_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_sources_media ON media_sources(media_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_last_used ON media_library(last_used)")
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(download_jobs)")}
+    if "name" not in existing:
+        conn.execute("ALTER TABLE download_jobs ADD COLUMN name TEXT")
+
+def _migrate_media_catalog(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS media_catalog (
+            path TEXT PRIMARY KEY,
+            dir TEXT NOT NULL,
+            name TEXT NOT NULL,
+            size_bytes INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            inode INTEGER,
+            duration REAL,
+            video_codec TEXT,
+            audio_codec TEXT,
+            width INTEGER,
+            height INTEGER,
+            probed_at INTEGER,
+            seen_at INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_catalog_dir ON media_catalog(dir)")
+
+def _migrate_api_quota_usage(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS api_quota_usage (
+            day TEXT NOT NULL,
+            channel_key TEXT NOT NULL,
+            method TEXT NOT NULL,
+            calls INTEGER NOT NULL,
+            units INTEGER NOT NULL,
+            PRIMARY KEY (day, channel_key, method)
+        )
+    ''')
+
+def _migrate_live_stream_pool(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS live_stream_pool (
+            stream_id TEXT PRIMARY KEY,
+            channel_key TEXT NOT NULL,
+            stream_key TEXT NOT NULL,
+            stream_url TEXT NOT NULL,
+            title TEXT,
+            created_at INTEGER NOT NULL,
+            last_bound_at INTEGER
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_stream_pool_channel ON live_stream_pool(channel_key, last_bound_at)")
+
+def _migrate_session_stream_id(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(streaming_sessions)")}
+    if "stream_id" not in existing:
+        conn.execute("ALTER TABLE streaming_sessions ADD COLUMN stream_id TEXT")
+
+def _migrate_stream_pool_bindings(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(live_stream_pool)")}
+    if "broadcast_id" not in existing:
+        conn.execute("ALTER TABLE live_stream_pool ADD COLUMN broadcast_id TEXT")
+    # The pool used to mirror every stream of the channel; rows never handed
+    # out by this app came from that mirror and aren't ours to reuse
+    conn.execute("DELETE FROM live_stream_pool WHERE last_bound_at IS NULL")
+
+def _migrate_source_hashes(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS source_hashes (
+            path TEXT PRIMARY KEY,
+            size_bytes INTEGER NOT NULL,
+            mtime REAL NOT NULL,
+            content_hash TEXT NOT NULL
+        )
+    ''')
+
+def _migrate_daemon_stream_key(conn):
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(daemon_streams)")}
+    if "stream_key" not in existing:
+        conn.execute("ALTER TABLE daemon_streams ADD COLUMN stream_key TEXT")
+    # Move keys out of the config JSON into their own column
+    for stream_id, config in conn.execute("SELECT stream_id, config FROM daemon_streams").fetchall():
+        data = json.loads(config)
+        if 'stream_key' in data:
+            stream_key = data.pop('stream_key')
+            conn.execute(
+                "UPDATE daemon_streams SET config = ?, stream_key = ? WHERE stream_id = ?",
+                (json.dumps(data), stream_key, stream_id)
+            )
+
+SCHEMA_MIGRATIONS = [
+    (1, "streaming_sessions restart/downtime columns", _migrate_session_restart_columns),
+    (2, "streaming_logs integer epoch timestamps", _migrate_log_epoch_timestamps),
+    (3, "streaming_logs/stream_metrics indexes", _migrate_log_indexes),
+    (4, "log_rollups table", _migrate_log_rollups),
+    (5, "streaming_logs full-text index", _migrate_log_fts),
+    (6, "download_jobs table", _migrate_download_jobs),
+    (7, "media_library/media_sources tables, download_jobs.name", _migrate_media_library),
+    (8, "media_catalog table", _migrate_media_catalog),
+    (9, "api_quota_usage table", _migrate_api_quota_usage),
+    (10, "live_stream_pool table", _migrate_live_stream_pool),
+    (11, "streaming_sessions.stream_id", _migrate_session_stream_id),
+    (12, "live_stream_pool bound broadcast", _migrate_stream_pool_bindings),
+    (13, "source_hashes table", _migrate_source_hashes),
+    (14, "daemon_streams.stream_key column", _migrate_daemon_stream_key)
+]
+
+def migrate_database(conn):
+    """Apply pending schema migrations; returns the resulting schema version"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, description, migrate in SCHEMA_MIGRATIONS:
+        if target <= version:
+            continue
+        conn.execute("BEGIN")
+        try:
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        version = target
+    return version
+
 def save_channel_auth(channel_name, channel_id, auth_data):
     """Save channel authentication data persistently"""
     try:
-        conn = sqlite3.connect("streaming_logs.db")
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO saved_channels 
-            (channel_name, channel_id, auth_data, created_at, last_used)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            channel_name,
-            channel_id,
-            json.dumps(auth_data),
-            datetime.now().isoformat(),
-            datetime.now().isoformat()
-        ))
-        
-        conn.commit()
-        conn.close()
+        conn = get_db()
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO saved_channels 
+                (channel_name, channel_id, auth_data, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (
+                channel_name,
+                channel_id,
+                json.dumps(auth_data),
+                datetime.now().isoformat(),
+                datetime.now().isoformat()
+            ))
         return True
     except Exception as e:
         st.error(f"Error saving channel auth: {e}")
@@ -143,17 +533,14 @@ def save_channel_auth(channel_name, channel_id, auth_data):
 def load_saved_channels():
     """Load saved channel authentication data"""
     try:
-        conn = sqlite3.connect("streaming_logs.db")
-        cursor = conn.cursor()
-        
-        cursor.execute('''
+        rows = get_db().execute('''
             SELECT channel_name, channel_id, auth_data, last_used
             FROM saved_channels 
             ORDER BY last_used DESC
-        ''')
+        ''').fetchall()
         
         channels = []
-        for row in cursor.fetchall():
+        for row in rows:
             channel_name, channel_id, auth_data, last_used = row
             channels.append({
                 'name': channel_name,
@@ -162,7 +549,6 @@ def load_saved_channels():
                 'last_used': last_used
             })
         
-        conn.close()
         return channels
     except Exception as e:
         st.error(f"Error loading saved channels: {e}")
@@ -171,102 +557,850 @@ def load_saved_channels():
 def update_channel_last_used(channel_name):
     """Update last used timestamp for a channel"""
     try:
-        conn = sqlite3.connect("streaming_logs.db")
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            UPDATE saved_channels 
-            SET last_used = ?
-            WHERE channel_name = ?
-        ''', (datetime.now().isoformat(), channel_name))
-        
-        conn.commit()
-        conn.close()
+        conn = get_db()
+        with conn:
+            conn.execute('''
+                UPDATE saved_channels 
+                SET last_used = ?
+                WHERE channel_name = ?
+            ''', (datetime.now().isoformat(), channel_name))
     except Exception as e:
         st.error(f"Error updating channel last used: {e}")
 
+def log_row(session_id, log_type, message, video_file=None, stream_key=None, channel_name=None):
+    """Build a streaming_logs row for LogWriter.INSERT_SQL"""
+    now = datetime.now()
+    return (
+        now.isoformat(),
+        int(now.timestamp() * 1000),
+        session_id,
+        log_type,
+        message,
+        video_file,
+        stream_key,
+        channel_name
+    )
+
 def log_to_database(session_id, log_type, message, video_file=None, stream_key=None, channel_name=None):
     """Log message to database"""
     try:
-        conn = sqlite3.connect("streaming_logs.db")
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO streaming_logs 
-            (timestamp, session_id, log_type, message, video_file, stream_key, channel_name)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        conn = get_db()
+        with conn:
+            conn.execute(LogWriter.INSERT_SQL, log_row(
+                session_id, log_type, message, video_file, stream_key, channel_name
+            ))
+    except Exception as e:
+        st.error(f"Error logging to database: {e}")
+
+# --- LOG WRITER (batched, asynchronous) ---
+LOG_QUEUE_MAXSIZE = 10000   # Max pending rows before producers block/drop
+LOG_BATCH_SIZE = 500        # Max rows per transaction
+LOG_FLUSH_INTERVAL = 0.5    # Max seconds a row waits before being written
+
+class LogWriter:
+    """Background writer that batches log rows over one persistent SQLite connection"""
+
+    INSERT_SQL = '''
+        INSERT INTO streaming_logs
+        (timestamp, ts, session_id, log_type, message, video_file, stream_key, channel_name)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    METRIC_SQL = '''
+        INSERT INTO stream_metrics
+        (timestamp, session_id, frame, fps, bitrate_kbps, speed, dup_frames, drop_frames, out_time_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+
+    def __init__(self, db_path=DB_PATH, max_queue=LOG_QUEUE_MAXSIZE,
+                 batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.written = 0
+        self.dropped = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, session_id, log_type, message, video_file=None, stream_key=None, channel_name=None):
+        """Queue a log row; blocks briefly when the queue is full, then drops the row"""
+        row = log_row(session_id, log_type, message, video_file, stream_key, channel_name)
+        self._put(self.INSERT_SQL, row)
+
+    def write_metric(self, session_id, sample):
+        """Queue a ProgressSample row for the stream_metrics table"""
+        row = (
             datetime.now().isoformat(),
             session_id,
-            log_type,
-            message,
-            video_file,
-            stream_key,
-            channel_name
-        ))
-        
-        conn.commit()
+            sample.frame,
+            sample.fps,
+            sample.bitrate_kbps,
+            sample.speed,
+            sample.dup_frames,
+            sample.drop_frames,
+            sample.out_time_ms
+        )
+        self._put(self.METRIC_SQL, row)
+
+    def _put(self, sql, row):
+        try:
+            self.queue.put((sql, row), timeout=1.0)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Wait until every queued row has been written (or timeout)"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.queue.unfinished_tasks == 0
+
+    def close(self, timeout=5.0):
+        """Flush pending rows and stop the writer thread"""
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _collect_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = open_connection(self.db_path)
+        try:
+            while not (self._stop.is_set() and self.queue.empty()):
+                batch = self._collect_batch()
+                if not batch:
+                    continue
+                try:
+                    grouped = {}
+                    for sql, row in batch:
+                        grouped.setdefault(sql, []).append(row)
+                    with conn:
+                        for sql, rows in grouped.items():
+                            conn.executemany(sql, rows)
+                    self.written += len(batch)
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"Log writer error: {e}", file=sys.stderr)
+                finally:
+                    for _ in batch:
+                        self.queue.task_done()
+        finally:
+            conn.close()
+
+@st.cache_resource
+def get_log_writer():
+    """Shared log writer, kept alive across Streamlit reruns and sessions"""
+    return LogWriter()
+
+def benchmark_log_writer(lines=5000):
+    """Compare lines/sec of per-line connections against the batched LogWriter"""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench_logs.db")
+        init_database(db_path)
+
+        start = time.perf_counter()
+        for i in range(lines):
+            conn = sqlite3.connect(db_path)
+            conn.execute(LogWriter.INSERT_SQL, log_row(
+                "bench", "FFMPEG",
+                f"frame={i} fps=30 q=23.0 size=1024kB time=00:00:01.00 bitrate=2500.0kbits/s speed=1x",
+                "bench.mp4"
+            ))
+            conn.commit()
+            conn.close()
+        results['per_line'] = lines / (time.perf_counter() - start)
+
+        writer = LogWriter(db_path)
+        start = time.perf_counter()
+        for i in range(lines):
+            writer.write("bench", "FFMPEG",
+                         f"frame={i} fps=30 q=23.0 size=1024kB time=00:00:01.00 bitrate=2500.0kbits/s speed=1x",
+                         "bench.mp4")
+        writer.flush(timeout=60)
+        results['batched'] = lines / (time.perf_counter() - start)
+        writer.close()
+
+    print(f"Per-line connection: {results['per_line']:,.0f} lines/sec")
+    print(f"Batched LogWriter:   {results['batched']:,.0f} lines/sec")
+    print(f"Speedup:             {results['batched'] / results['per_line']:.1f}x")
+    return results
+
+def benchmark_database(writers=4, readers=2, seconds=5):
+    """Concurrency benchmark: ffmpeg-style writers plus UI readers.
+
+    Compares a fresh connection per call on the default rollback journal
+    against pooled WAL connections from the Database layer.
+    """
+    def run(db_path, connect, release):
+        stop = threading.Event()
+        counts = {'writes': 0, 'reads': 0, 'errors': 0}
+        lock = threading.Lock()
+
+        def writer(n):
+            i = 0
+            while not stop.is_set():
+                try:
+                    conn = connect(db_path)
+                    with conn:
+                        conn.execute(LogWriter.INSERT_SQL, log_row(
+                            f"bench_{n}", "FFMPEG", f"frame={i} fps=30 bitrate=2500.0kbits/s speed=1x", "bench.mp4"
+                        ))
+                    release(conn)
+                    with lock:
+                        counts['writes'] += 1
+                except sqlite3.OperationalError:
+                    with lock:
+                        counts['errors'] += 1
+                i += 1
+
+        def reader(n):
+            while not stop.is_set():
+                try:
+                    conn = connect(db_path)
+                    conn.execute('''
+                        SELECT timestamp, log_type, message, video_file, channel_name
+                        FROM streaming_logs WHERE session_id = ? ORDER BY ts DESC LIMIT 100
+                    ''', (f"bench_{n % writers}",)).fetchall()
+                    release(conn)
+                    with lock:
+                        counts['reads'] += 1
+                except sqlite3.OperationalError:
+                    with lock:
+                        counts['errors'] += 1
+
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+        threads += [threading.Thread(target=reader, args=(n,)) for n in range(readers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        return {k: v / seconds if k != 'errors' else v for k, v in counts.items()}
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        init_database(legacy_path)
+        # init_database goes through the pool (WAL); switch the legacy file back
+        get_database(legacy_path).close()
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA journal_mode=DELETE")
         conn.close()
-    except Exception as e:
-        st.error(f"Error logging to database: {e}")
+        results['per_call'] = run(
+            legacy_path, lambda path: sqlite3.connect(path), lambda conn: conn.close()
+        )
+
+        pooled_path = os.path.join(tmp, "pooled.db")
+        init_database(pooled_path)
+        results['pooled_wal'] = run(pooled_path, get_db, lambda conn: None)
+
+    for name, r in results.items():
+        print(f"{name:>10}: {r['writes']:,.0f} writes/s  {r['reads']:,.0f} reads/s  {r['errors']} lock errors")
+    return results
+
+def log_fts_enabled():
+    """Whether the streaming_logs_fts index exists"""
+    return get_db().execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'streaming_logs_fts'"
+    ).fetchone() is not None
+
+SEARCH_TERM_RE = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+def search_terms(text):
+    """Split search text into (term, prefix) pairs; "quoted text" stays one phrase"""
+    terms = []
+    for phrase, phrase_prefix, word in SEARCH_TERM_RE.findall(text):
+        term = " ".join(phrase.split()) if not word else word.rstrip("*").replace('"', '')
+        prefix = bool(phrase_prefix) if not word else word.endswith("*")
+        if term:
+            terms.append((term, prefix))
+    return terms
+
+def fts_query(text):
+    """Turn free text into a safe FTS5 query: every term quoted, `term*` kept as prefix"""
+    return " ".join(
+        f'"{term}"*' if prefix else f'"{term}"'
+        for term, prefix in search_terms(text)
+    )
+
+def _like_conditions(text, column="message"):
+    """LIKE fallback for search text when FTS5 is unavailable (all terms must match)"""
+    terms = search_terms(text)
+    return [f"{column} LIKE ?" for _ in terms], [f"%{term}%" for term, _ in terms]
 
-def get_logs_from_database(session_id=None, limit=100):
-    """Get logs from database"""
+def search_logs(text, limit=50, session_id=None, log_type=None):
+    """Ranked full-text search over all stored log messages"""
     try:
-        conn = sqlite3.connect("streaming_logs.db")
-        cursor = conn.cursor()
+        query = fts_query(text)
+        if not query:
+            # Nothing searchable (e.g. "***"); MATCH '' is a syntax error
+            return []
+        if not log_fts_enabled():
+            return _search_logs_like(text, limit, session_id, log_type)
         
+        conditions, params = ["streaming_logs_fts MATCH ?"], [query]
         if session_id:
-            cursor.execute('''
-                SELECT timestamp, log_type, message, video_file, channel_name
-                FROM streaming_logs 
-                WHERE session_id = ?
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (session_id, limit))
+            conditions.append("l.session_id = ?")
+            params.append(session_id)
+        if log_type:
+            conditions.append("l.log_type = ?")
+            params.append(log_type)
+        
+        rows = get_db().execute(f'''
+            SELECT l.id, l.timestamp, l.session_id, l.log_type, l.channel_name,
+                   snippet(streaming_logs_fts, 0, '[', ']', '…', 16), bm25(streaming_logs_fts)
+            FROM streaming_logs_fts
+            JOIN streaming_logs l ON l.id = streaming_logs_fts.rowid
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bm25(streaming_logs_fts)
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+        return [{
+            'Id': log_id,
+            'Time': timestamp[:19].replace("T", " "),
+            'Session': row_session,
+            'Type': row_type,
+            'Channel': channel,
+            'Match': snippet,
+            'Score': round(-score, 2)
+        } for log_id, timestamp, row_session, row_type, channel, snippet, score in rows]
+    except Exception as e:
+        st.error(f"Error searching logs: {e}")
+        return []
+
+def _search_logs_like(text, limit, session_id=None, log_type=None):
+    """search_logs without FTS5: newest LIKE matches, same row shape, no ranking"""
+    where, params = _log_filters(session_id, log_type, search=text)
+    rows = get_db().execute(f'''
+        SELECT id, timestamp, session_id, log_type, channel_name, message
+        FROM streaming_logs
+        {where}
+        ORDER BY ts DESC, id DESC
+        LIMIT ?
+    ''', (*params, limit)).fetchall()
+    return [{
+        'Id': log_id,
+        'Time': timestamp[:19].replace("T", " "),
+        'Session': row_session,
+        'Type': row_type,
+        'Channel': channel,
+        'Match': message or "",
+        'Score': None
+    } for log_id, timestamp, row_session, row_type, channel, message in rows]
+
+def get_log_context(log_id, radius=5):
+    """Log lines around one entry within the same session"""
+    try:
+        conn = get_db()
+        anchor = conn.execute(
+            "SELECT session_id, ts FROM streaming_logs WHERE id = ?", (log_id,)
+        ).fetchone()
+        if not anchor:
+            return []
+        session_id, ts = anchor
+        older = conn.execute('''
+            SELECT id, timestamp, log_type, message FROM streaming_logs
+            WHERE session_id = ? AND (ts, id) < (?, ?)
+            ORDER BY ts DESC, id DESC LIMIT ?
+        ''', (session_id, ts, log_id, radius)).fetchall()
+        newer = conn.execute('''
+            SELECT id, timestamp, log_type, message FROM streaming_logs
+            WHERE session_id = ? AND (ts, id) >= (?, ?)
+            ORDER BY ts ASC, id ASC LIMIT ?
+        ''', (session_id, ts, log_id, radius + 1)).fetchall()
+        return [{
+            'Hit': "👉" if row_id == log_id else "",
+            'Time': timestamp[:19].replace("T", " "),
+            'Type': log_type,
+            'Message': message
+        } for row_id, timestamp, log_type, message in list(reversed(older)) + newer]
+    except Exception as e:
+        st.error(f"Error loading log context: {e}")
+        return []
+
+def _log_filters(session_id=None, log_type=None, channel_name=None, search=None, before=None,
+                 since_ms=None, until_ms=None):
+    """WHERE clause + params shared by the log queries.
+
+    `before` is a keyset cursor (ts, id): only rows strictly older are returned.
+    `since_ms`/`until_ms` bound the epoch-ms `ts` column (inclusive/exclusive).
+    """
+    conditions, params = [], []
+    if session_id:
+        conditions.append("session_id = ?")
+        params.append(session_id)
+    if log_type:
+        conditions.append("log_type = ?")
+        params.append(log_type)
+    if channel_name:
+        conditions.append("channel_name = ?")
+        params.append(channel_name)
+    if search:
+        if log_fts_enabled():
+            conditions.append("id IN (SELECT rowid FROM streaming_logs_fts WHERE streaming_logs_fts MATCH ?)")
+            params.append(fts_query(search))
         else:
-            cursor.execute('''
-                SELECT timestamp, log_type, message, video_file, channel_name
-                FROM streaming_logs 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (limit,))
-        
-        logs = cursor.fetchall()
-        conn.close()
-        return logs
+            like_conditions, like_params = _like_conditions(search)
+            conditions.extend(like_conditions)
+            params.extend(like_params)
+    if before:
+        conditions.append("(ts, id) < (?, ?)")
+        params.extend(before)
+    if since_ms is not None:
+        conditions.append("ts >= ?")
+        params.append(since_ms)
+    if until_ms is not None:
+        conditions.append("ts < ?")
+        params.append(until_ms)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+def get_logs_from_database(session_id=None, limit=100, log_type=None, channel_name=None, search=None, before=None):
+    """Get logs from database (newest first, served by the ts indexes)"""
+    try:
+        where, params = _log_filters(session_id, log_type, channel_name, search, before)
+        return get_db().execute(f'''
+            SELECT timestamp, log_type, message, video_file, channel_name
+            FROM streaming_logs 
+            {where}
+            ORDER BY ts DESC, id DESC 
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
     except Exception as e:
         st.error(f"Error getting logs from database: {e}")
         return []
 
+def get_log_page(session_id=None, log_type=None, channel_name=None, search=None, before=None, page_size=50):
+    """One keyset-paginated page of logs.
+
+    Returns (rows, next_cursor); rows are dicts ready for st.dataframe and
+    next_cursor is None on the last page.
+    """
+    try:
+        where, params = _log_filters(session_id, log_type, channel_name, search, before)
+        rows = get_db().execute(f'''
+            SELECT id, ts, timestamp, session_id, log_type, message, video_file, channel_name
+            FROM streaming_logs
+            {where}
+            ORDER BY ts DESC, id DESC
+            LIMIT ?
+        ''', (*params, page_size + 1)).fetchall()
+    except Exception as e:
+        st.error(f"Error getting log page: {e}")
+        return [], None
+    
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = (rows[-1][1], rows[-1][0]) if has_more else None
+    page = [{
+        'Time': timestamp[:19].replace("T", " "),
+        'Type': log_type,
+        'Message': message,
+        'Session': row_session,
+        'Channel': channel,
+        'Video': video_file
+    } for _, _, timestamp, row_session, log_type, message, video_file, channel in rows]
+    return page, next_cursor
+
+# --- LOG EXPORT ---
+EXPORT_FORMATS = {
+    "jsonl": ("JSON Lines (gzip)", ".jsonl.gz", "application/gzip"),
+    "csv": ("CSV (gzip)", ".csv.gz", "application/gzip"),
+    "parquet": ("Parquet (zstd)", ".parquet", "application/vnd.apache.parquet")
+}
+EXPORT_COLUMNS = ["id", "timestamp", "ts", "session_id", "log_type", "message", "video_file", "channel_name"]
+EXPORT_CHUNK_SIZE = 5000
+EXPORT_DIR = Path(tempfile.gettempdir()) / "streaming_log_exports"
+EXPORT_MAX_AGE = 3600   # Seconds before old export files are removed
+
+def _iter_log_chunks(session_id=None, log_type=None, since_ms=None, until_ms=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of export rows, oldest first, without loading the full result"""
+    where, params = _log_filters(session_id, log_type, since_ms=since_ms, until_ms=until_ms)
+    cursor = get_db().execute(f'''
+        SELECT {", ".join(EXPORT_COLUMNS)}
+        FROM streaming_logs
+        {where}
+        ORDER BY ts, id
+    ''', params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+def _cleanup_exports():
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    cutoff = time.time() - EXPORT_MAX_AGE
+    for old in EXPORT_DIR.iterdir():
+        if old.stat().st_mtime < cutoff:
+            old.unlink(missing_ok=True)
+
+def export_logs(fmt="jsonl", session_id=None, log_type=None, since_ms=None, until_ms=None, out_path=None):
+    """Stream matching logs to a compressed file in chunks (constant memory).
+
+    Returns (path, row_count). Parquet needs the optional pyarrow package.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if out_path is None:
+        _cleanup_exports()
+        out_path = EXPORT_DIR / f"streaming_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}{EXPORT_FORMATS[fmt][1]}"
+    out_path = Path(out_path)
+    chunks = _iter_log_chunks(session_id, log_type, since_ms, until_ms)
+    count = 0
+    
+    if fmt == "jsonl":
+        with gzip.open(out_path, "wt", encoding="utf-8") as f:
+            for rows in chunks:
+                for row in rows:
+                    f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + "\n")
+                count += len(rows)
+    elif fmt == "csv":
+        with gzip.open(out_path, "wt", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(EXPORT_COLUMNS)
+            for rows in chunks:
+                writer.writerows(rows)
+                count += len(rows)
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([
+            ("id", pa.int64()), ("timestamp", pa.string()), ("ts", pa.int64()),
+            ("session_id", pa.string()), ("log_type", pa.string()), ("message", pa.string()),
+            ("video_file", pa.string()), ("channel_name", pa.string())
+        ])
+        with pq.ParquetWriter(out_path, schema, compression="zstd") as writer:
+            for rows in chunks:
+                columns = list(zip(*rows))
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                    schema=schema
+                ))
+                count += len(rows)
+    return out_path, count
+
+def get_logged_sessions(limit=200):
+    """Recent session ids for the log browser filter"""
+    try:
+        return [row[0] for row in get_db().execute(
+            "SELECT session_id FROM streaming_sessions ORDER BY start_time DESC LIMIT ?", (limit,)
+        )]
+    except Exception as e:
+        st.error(f"Error loading sessions: {e}")
+        return []
+
+def render_log_browser(key, session_id=None, page_size=50):
+    """Paginated log table with server-side filters (one query + one widget per page)"""
+    filter_cols = st.columns(4 if session_id is None else 2)
+    with filter_cols[0]:
+        log_type = st.selectbox("Type", ["All", "INFO", "ERROR", "FFMPEG"], key=f"{key}_type")
+    with filter_cols[1]:
+        search = st.text_input("Search message", key=f"{key}_search", placeholder="e.g. Broken pipe")
+    channel_name = None
+    if session_id is None:
+        with filter_cols[2]:
+            sessions = get_logged_sessions()
+            current = st.session_state.get('session_id')
+            if current and current not in sessions:
+                sessions.insert(0, current)
+            selected_session = st.selectbox("Session", ["All"] + sessions, key=f"{key}_session")
+            session_id = None if selected_session == "All" else selected_session
+        with filter_cols[3]:
+            channel_name = st.text_input("Channel", key=f"{key}_channel") or None
+    
+    filters = (session_id, None if log_type == "All" else log_type, channel_name, search or None)
+    
+    # Cursor stack: one entry per visited page; reset whenever filters change
+    state_key = f"{key}_cursors"
+    if st.session_state.get(f"{key}_filters") != filters:
+        st.session_state[f"{key}_filters"] = filters
+        st.session_state[state_key] = [None]
+    cursors = st.session_state[state_key]
+    
+    rows, next_cursor = get_log_page(*filters, before=cursors[-1], page_size=page_size)
+    if rows:
+        st.dataframe(rows, hide_index=True, use_container_width=True)
+    else:
+        st.info("No logs match the current filters.")
+    
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Newer", key=f"{key}_prev", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+    with col_page:
+        st.caption(f"Page {len(cursors)} · {len(rows)} rows")
+    with col_next:
+        if st.button("Older ➡️", key=f"{key}_next", disabled=next_cursor is None):
+            cursors.append(next_cursor)
+            st.rerun()
+
 def save_streaming_session(session_id, video_file, stream_title, stream_description, tags, category, privacy_status, made_for_kids, channel_name):
     """Save streaming session to database"""
     try:
-        conn = sqlite3.connect("streaming_logs.db")
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT OR REPLACE INTO streaming_sessions 
-            (session_id, start_time, video_file, stream_title, stream_description, tags, category, privacy_status, made_for_kids, channel_name)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            session_id,
-            datetime.now().isoformat(),
-            video_file,
-            stream_title,
-            stream_description,
-            tags,
-            category,
-            privacy_status,
-            made_for_kids,
-            channel_name
-        ))
-        
-        conn.commit()
-        conn.close()
+        conn = get_db()
+        with conn:
+            conn.execute('''
+                INSERT INTO streaming_sessions 
+                (session_id, start_time, video_file, stream_title, stream_description, tags, category, privacy_status, made_for_kids, channel_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET
+                    video_file = excluded.video_file,
+                    stream_title = excluded.stream_title,
+                    stream_description = excluded.stream_description,
+                    tags = excluded.tags,
+                    category = excluded.category,
+                    privacy_status = excluded.privacy_status,
+                    made_for_kids = excluded.made_for_kids,
+                    channel_name = excluded.channel_name
+            ''', (
+                session_id,
+                datetime.now().isoformat(),
+                video_file,
+                stream_title,
+                stream_description,
+                tags,
+                category,
+                privacy_status,
+                made_for_kids,
+                channel_name
+            ))
     except Exception as e:
         st.error(f"Error saving streaming session: {e}")
 
+def record_session_stream(session_id, stream_id):
+    """Remember which stream a UI session started, so a restarted UI can reattach"""
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute('''
+                INSERT INTO streaming_sessions (session_id, start_time, stream_id) VALUES (?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET stream_id = excluded.stream_id
+            ''', (session_id, datetime.now().isoformat(), stream_id))
+    except Exception as e:
+        st.error(f"Error saving stream id: {e}")
+
+def record_stream_restart(session_id, restart_count, downtime_seconds, status=None):
+    """Record reconnect count, accumulated downtime and optionally status for a session"""
+    try:
+        conn = get_db()
+        with conn:
+            if status:
+                conn.execute('''
+                    UPDATE streaming_sessions
+                    SET restart_count = ?, downtime_seconds = ?, status = ?, end_time = ?
+                    WHERE session_id = ?
+                ''', (restart_count, downtime_seconds, status, datetime.now().isoformat(), session_id))
+            else:
+                conn.execute('''
+                    UPDATE streaming_sessions
+                    SET restart_count = ?, downtime_seconds = ?
+                    WHERE session_id = ?
+                ''', (restart_count, downtime_seconds, session_id))
+    except Exception as e:
+        st.error(f"Error recording stream restart: {e}")
+
+# --- LOG RETENTION ---
+LOG_RETENTION_HOURS = {
+    "FFMPEG": 24,          # Raw ffmpeg lines (rolled up per minute first)
+    "INFO": 90 * 24,
+    "ERROR": 90 * 24
+}
+LOG_RETENTION_DEFAULT_HOURS = 30 * 24
+LOG_ROLLUP_TYPES = {"FFMPEG"}
+METRICS_RETENTION_HOURS = 30 * 24
+ROLLUP_RETENTION_HOURS = 365 * 24
+RETENTION_INTERVAL = 15 * 60     # Seconds between retention passes
+RETENTION_CHUNK_SIZE = 5000      # Rows deleted per transaction (keeps write locks short)
+VACUUM_PAGES_PER_PASS = 2000     # Free pages returned to the OS per pass
+VACUUM_CONVERT_MAX_BYTES = 256 * 1024 * 1024   # Larger legacy DBs are converted from the UI only
+
+class RetentionEngine:
+    """Background TTL enforcement, per-minute rollups and incremental vacuum"""
+
+    def __init__(self, db_path=DB_PATH, interval=RETENTION_INTERVAL):
+        self.db_path = db_path
+        self.interval = interval
+        self.last_run = None
+        self.last_result = {}
+        self.incremental_vacuum = False
+        self._run_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name="log-retention", daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+                # After the pass, so the one-time conversion copies fewer rows
+                if not self.incremental_vacuum:
+                    self.ensure_incremental_vacuum()
+            except Exception as e:
+                print(f"Retention error: {e}", file=sys.stderr)
+            time.sleep(self.interval)
+
+    def ensure_incremental_vacuum(self, force=False):
+        """Switch a legacy database to auto_vacuum=INCREMENTAL.
+
+        New files are created incremental by open_connection. Older ones need a
+        one-time full VACUUM, which blocks writers, so it only runs by itself
+        while the file is small; bigger files wait for `force` (UI button).
+        Returns whether incremental vacuum is active.
+        """
+        with self._run_lock:
+            conn = get_db(self.db_path)
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+                page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+                if not force and page_size * page_count > VACUUM_CONVERT_MAX_BYTES:
+                    return False
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            self.incremental_vacuum = True
+            return True
+
+    def _delete_chunked(self, conn, table, where, params):
+        deleted = 0
+        while True:
+            with conn:
+                cursor = conn.execute(f'''
+                    DELETE FROM {table} WHERE rowid IN (
+                        SELECT rowid FROM {table} WHERE {where} LIMIT ?
+                    )
+                ''', (*params, RETENTION_CHUNK_SIZE))
+            deleted += cursor.rowcount
+            if cursor.rowcount < RETENTION_CHUNK_SIZE:
+                return deleted
+
+    def _rollup_chunked(self, conn, log_type, cutoff_ms):
+        """Rollup + delete in per-minute slices of at most ~RETENTION_CHUNK_SIZE rows.
+
+        Each slice is one transaction (rows are never counted twice) and the
+        write lock is released between slices, like _delete_chunked.
+        """
+        deleted = 0
+        while True:
+            # Upper bound of the next slice: the minute of the CHUNK_SIZE-th oldest
+            # row, so a minute is never split across two slices
+            row = conn.execute('''
+                SELECT ts FROM streaming_logs WHERE log_type = ? AND ts < ?
+                ORDER BY ts LIMIT 1 OFFSET ?
+            ''', (log_type, cutoff_ms, RETENTION_CHUNK_SIZE)).fetchone()
+            slice_end = cutoff_ms if row is None else min(cutoff_ms, (row[0] // 60000 + 1) * 60000)
+            with conn:
+                self.rollup(conn, log_type, slice_end)
+                cursor = conn.execute(
+                    "DELETE FROM streaming_logs WHERE log_type = ? AND ts < ?",
+                    (log_type, slice_end)
+                )
+            deleted += cursor.rowcount
+            if row is None:
+                return deleted
+
+    def rollup(self, conn, log_type, cutoff_ms):
+        """Fold rows older than cutoff into per-minute log_rollups rows.
+
+        Runs inside the caller's transaction so the delete that follows sees
+        exactly the rows that were rolled up.
+        """
+        # MAX(ts) makes SQLite take `message` from the newest row in each group
+        conn.execute('''
+            INSERT INTO log_rollups (session_id, log_type, minute_ts, line_count, last_message)
+            SELECT session_id, log_type, minute_ts, line_count, message FROM (
+                SELECT session_id, log_type, (ts / 60000) * 60000 AS minute_ts,
+                       COUNT(*) AS line_count, MAX(ts), message
+                FROM streaming_logs
+                WHERE log_type = ? AND ts < ?
+                GROUP BY session_id, log_type, minute_ts
+            ) WHERE true
+            ON CONFLICT (session_id, log_type, minute_ts) DO UPDATE SET
+                line_count = line_count + excluded.line_count,
+                last_message = excluded.last_message
+        ''', (log_type, cutoff_ms))
+
+    def run_once(self):
+        """One retention pass; returns rows deleted per category"""
+        with self._run_lock:
+            conn = get_db(self.db_path)
+            now_ms = int(time.time() * 1000)
+            result = {}
+            
+            # Rollup + delete per type, then everything else at the default TTL
+            for log_type, hours in LOG_RETENTION_HOURS.items():
+                cutoff_ms = now_ms - hours * 3600 * 1000
+                if log_type in LOG_ROLLUP_TYPES:
+                    result[log_type] = self._rollup_chunked(conn, log_type, cutoff_ms)
+                else:
+                    result[log_type] = self._delete_chunked(
+                        conn, "streaming_logs", "log_type = ? AND ts < ?", (log_type, cutoff_ms)
+                    )
+            
+            known = list(LOG_RETENTION_HOURS)
+            placeholders = ", ".join("?" for _ in known)
+            default_cutoff = now_ms - LOG_RETENTION_DEFAULT_HOURS * 3600 * 1000
+            result['other'] = self._delete_chunked(
+                conn, "streaming_logs", f"ts < ? AND log_type NOT IN ({placeholders})",
+                (default_cutoff, *known)
+            )
+            
+            metrics_cutoff = (datetime.now() - timedelta(hours=METRICS_RETENTION_HOURS)).isoformat()
+            result['stream_metrics'] = self._delete_chunked(
+                conn, "stream_metrics", "timestamp < ?", (metrics_cutoff,)
+            )
+            result['log_rollups'] = self._delete_chunked(
+                conn, "log_rollups", "minute_ts < ?", (now_ms - ROLLUP_RETENTION_HOURS * 3600 * 1000,)
+            )
+            
+            conn.execute(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_PASS})").fetchall()
+            conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+            
+            self.last_run = datetime.now()
+            self.last_result = result
+            return result
+
+@st.cache_resource
+def get_retention_engine():
+    """Shared retention engine, kept alive across Streamlit reruns and sessions"""
+    return RetentionEngine()
+
+def get_database_stats(db_path=DB_PATH):
+    """Database file size, free pages and row counts per log type"""
+    try:
+        conn = get_db(db_path)
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        wal_path = f"{db_path}-wal"
+        return {
+            'db_bytes': page_size * page_count,
+            'free_bytes': page_size * free_pages,
+            'wal_bytes': os.path.getsize(wal_path) if os.path.exists(wal_path) else 0,
+            'log_types': conn.execute(
+                "SELECT log_type, COUNT(*) FROM streaming_logs GROUP BY log_type ORDER BY 2 DESC"
+            ).fetchall(),
+            'rollup_rows': conn.execute("SELECT COUNT(*) FROM log_rollups").fetchone()[0],
+            'metric_rows': conn.execute("SELECT COUNT(*) FROM stream_metrics").fetchone()[0]
+        }
+    except Exception as e:
+        st.error(f"Error reading database stats: {e}")
+        return None
+
 def load_google_oauth_config(json_file):
     """Load Google OAuth configuration from downloaded JSON file"""
     try:
@@ -352,9 +1486,298 @@ def validate_channel_config(config):
     
     return True, "Valid configuration"
 
+# --- YOUTUBE API CLIENTS (cached) ---
+YOUTUBE_DAILY_QUOTA = 10000          # Default Data API units per project per day
+YOUTUBE_QUOTA_TZ = "America/Los_Angeles"   # Quota resets at midnight Pacific
+YOUTUBE_QUOTA_COSTS = {              # Units per call by method (youtube.<resource>.<method>)
+    "list": 1,
+    "insert": 50,
+    "update": 50,
+    "delete": 50,
+    "bind": 50,
+    "transition": 50
+}
+STREAM_POOL_SYNC_TTL = 60            # Seconds a liveStreams.list(mine=True) result is reused
+YOUTUBE_CACHE_TTL = {                # Seconds a cached response stays fresh
+    "channel_info": 600,
+    "broadcasts": 60,
+    "categories": 86400,
+    "stream_health": 15,
+    "live_streams": STREAM_POOL_SYNC_TTL,
+    "pool_bindings": STREAM_POOL_SYNC_TTL
+}
+YOUTUBE_MAX_IDS_PER_CALL = 50        # Max comma-separated ids in one list call
+STREAM_HEALTH_ICONS = {"good": "🟢", "ok": "🟡", "bad": "🟠", "noData": "⚪", "revoked": "🔴"}
+
+def youtube_channel_key(credentials_dict):
+    """Stable per-account key for the client/response caches (never the raw token)"""
+    secret = credentials_dict.get('refresh_token') or credentials_dict.get('token') or credentials_dict.get('access_token') or ""
+    return hashlib.sha256(f"{credentials_dict.get('client_id')}:{secret}".encode()).hexdigest()[:16]
+
+def youtube_quota_day():
+    return datetime.now(ZoneInfo(YOUTUBE_QUOTA_TZ)).strftime("%Y-%m-%d")
+
+def record_youtube_quota(channel_key, method_id):
+    """Add one call of `method_id` (e.g. youtube.liveStreams.insert) to today's usage"""
+    units = YOUTUBE_QUOTA_COSTS.get(method_id.rsplit(".", 1)[-1], 1)
+    try:
+        conn = get_db()
+        with conn:
+            conn.execute('''
+                INSERT INTO api_quota_usage (day, channel_key, method, calls, units)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(day, channel_key, method) DO UPDATE SET
+                    calls = calls + 1, units = units + excluded.units
+            ''', (youtube_quota_day(), channel_key or "unknown", method_id, units))
+    except Exception as e:
+        print(f"Quota accounting error: {e}", file=sys.stderr)
+
+def get_youtube_quota_usage(day=None):
+    """(total units, [(method, calls, units)]) used on `day` (today by default)"""
+    rows = get_db().execute('''
+        SELECT method, SUM(calls), SUM(units) FROM api_quota_usage
+        WHERE day = ? GROUP BY method ORDER BY SUM(units) DESC
+    ''', (day or youtube_quota_day(),)).fetchall()
+    return sum(row[2] for row in rows), rows
+
+def _quota_request_class(channel_key, lock):
+    """HttpRequest subclass that serializes calls on the shared transport and counts quota"""
+    class QuotaCountingRequest(HttpRequest):
+        def execute(self, http=None, num_retries=0):
+            # Quota is charged even for calls that fail
+            record_youtube_quota(channel_key, self.methodId)
+            with lock:
+                return super().execute(http=http, num_retries=num_retries)
+    return QuotaCountingRequest
+
+@st.cache_resource
+def youtube_discovery_document():
+    """Bundled YouTube v3 discovery document, read and kept once per process"""
+    return discovery_cache.get_static_doc("youtube", "v3")
+
+@st.cache_resource
+def get_youtube_client_cache():
+    """channel key -> built YouTube service, shared across reruns and sessions"""
+    return {}
+
+@st.cache_resource
+def get_youtube_response_cache():
+    """(channel key, name, args) -> (expires_at, value)"""
+    return {}
+
+def cached_youtube_call(service, name, args, fetch, fresh=False):
+    """Return fetch() through the TTL response cache for this service's channel.
+
+    `fresh` skips the cached value (the new response still refreshes the cache).
+    """
+    channel_key = getattr(service, '_channel_key', None)
+    if not channel_key:
+        return fetch()
+    cache = get_youtube_response_cache()
+    key = (channel_key, name, args)
+    hit = cache.get(key)
+    if hit and hit[0] > time.monotonic() and not fresh:
+        return hit[1]
+    value = fetch()
+    cache[key] = (time.monotonic() + YOUTUBE_CACHE_TTL[name], value)
+    return value
+
+def invalidate_youtube_cache(service, *names):
+    """Drop cached responses for this channel (all of them if no names given)"""
+    channel_key = getattr(service, '_channel_key', None)
+    cache = get_youtube_response_cache()
+    for key in list(cache):
+        if key[0] == channel_key and (not names or key[1] in names):
+            cache.pop(key, None)
+
+# --- LIVE STREAM POOL (reusable stream keys) ---
+STREAM_POOL_REUSE_GRACE = 600   # Seconds after handing out a stream before it can be reused
+STREAM_POOL_BUSY_STATES = ('active', 'testing', 'error')
+BROADCAST_DONE_STATES = ('complete', 'revoked')   # lifeCycleStatus that frees the bound stream
+STREAM_GONE_REASONS = {'liveStreamNotFound', 'invalidStreamId', 'streamNotFound'}
+
+def _pooled_stream_resource(stream_id, stream_key, stream_url):
+    """liveStream-shaped dict for a pool row (what liveStreams().insert returns)"""
+    return {'id': stream_id, 'cdn': {'ingestionInfo': {'streamName': stream_key, 'ingestionAddress': stream_url}}}
+
+def _list_all_live_streams(service):
+    """Every liveStream of the channel, following nextPageToken"""
+    items, page_token = [], None
+    while True:
+        response = service.liveStreams().list(
+            part="id,cdn,status", mine=True, maxResults=50, pageToken=page_token
+        ).execute()
+        items.extend(response.get('items', []))
+        page_token = response.get('nextPageToken')
+        if not page_token:
+            return {'items': items}
+
+def sync_stream_pool(service):
+    """Refresh the pool (streams this app created) from YouTube; returns {id: streamStatus}
+
+    Streams made elsewhere (Studio, other tools) are never added, so the pool
+    only hands out keys nobody else is configured to push to.
+    """
+    channel_key = getattr(service, '_channel_key', None) or "unknown"
+    response = cached_youtube_call(service, "live_streams", (), lambda: _list_all_live_streams(service))
+    statuses, rows = {}, []
+    for item in response.get('items', []):
+        if item.get('cdn', {}).get('ingestionType') != 'rtmp':
+            continue
+        ingestion = item['cdn']['ingestionInfo']
+        statuses[item['id']] = item.get('status', {}).get('streamStatus', 'unknown')
+        rows.append((ingestion['streamName'], ingestion['ingestionAddress'], item['id']))
+    
+    conn = get_db()
+    with conn:
+        conn.executemany(
+            "UPDATE live_stream_pool SET stream_key = ?, stream_url = ? WHERE stream_id = ?", rows
+        )
+        # The listing above is complete (all pages), so anything missing was deleted
+        # on YouTube; rows younger than the cache TTL may simply not be listed yet
+        known = [row[0] for row in conn.execute(
+            "SELECT stream_id FROM live_stream_pool WHERE channel_key = ? AND created_at < ?",
+            (channel_key, int(time.time() * 1000) - STREAM_POOL_SYNC_TTL * 1000)
+        )]
+        conn.executemany(
+            "DELETE FROM live_stream_pool WHERE stream_id = ?",
+            [(stream_id,) for stream_id in known if stream_id not in statuses]
+        )
+    return statuses
+
+def _bound_broadcast_states(service, broadcast_ids):
+    """{broadcast id: lifeCycleStatus, None if deleted}; one list call per 50 ids"""
+    states = dict.fromkeys(broadcast_ids)
+    for start in range(0, len(broadcast_ids), YOUTUBE_MAX_IDS_PER_CALL):
+        batch = broadcast_ids[start:start + YOUTUBE_MAX_IDS_PER_CALL]
+        response = service.liveBroadcasts().list(
+            part="id,status", id=",".join(batch), maxResults=len(batch)
+        ).execute()
+        for item in response.get('items', []):
+            states[item['id']] = item.get('status', {}).get('lifeCycleStatus')
+    return states
+
+def release_finished_bindings(service):
+    """Clear pool bindings whose broadcast completed; returns ids of streams still bound.
+
+    Broadcast states are cached like the stream listing (STREAM_POOL_SYNC_TTL),
+    so a warm pool costs no list call. Broadcasts bound after the cached check
+    count as still bound until the next one.
+    """
+    channel_key = getattr(service, '_channel_key', None) or "unknown"
+    conn = get_db()
+    bound = dict(conn.execute(
+        "SELECT broadcast_id, stream_id FROM live_stream_pool WHERE channel_key = ? AND broadcast_id IS NOT NULL",
+        (channel_key,)
+    ).fetchall())
+    broadcast_ids = list(bound)
+    if not broadcast_ids:
+        return set()
+    states = cached_youtube_call(
+        service, "pool_bindings", (), lambda: _bound_broadcast_states(service, broadcast_ids)
+    )
+    # Deleted broadcasts don't come back at all and free their stream too
+    finished = [broadcast_id for broadcast_id in broadcast_ids
+                if broadcast_id in states and (states[broadcast_id] or 'complete') in BROADCAST_DONE_STATES]
+    with conn:
+        conn.executemany(
+            "UPDATE live_stream_pool SET broadcast_id = NULL WHERE broadcast_id = ?",
+            [(broadcast_id,) for broadcast_id in finished]
+        )
+    return {bound[broadcast_id] for broadcast_id in broadcast_ids if broadcast_id not in finished}
+
+def mark_pooled_stream_bound(stream_id, broadcast_id):
+    """Record which broadcast a pooled stream is bound to (it's excluded until that ends)"""
+    conn = get_db()
+    with conn:
+        conn.execute("UPDATE live_stream_pool SET broadcast_id = ? WHERE stream_id = ?", (broadcast_id, stream_id))
+
+def acquire_live_stream(service, title, description=""):
+    """An idle liveStream of this channel to bind to, or a newly inserted one.
+
+    Returns (stream resource, reused). A stream counts as idle when YouTube
+    doesn't report it as receiving data and it wasn't handed out in the last
+    STREAM_POOL_REUSE_GRACE seconds (so two broadcasts can't grab the same key).
+    """
+    channel_key = getattr(service, '_channel_key', None) or "unknown"
+    statuses = sync_stream_pool(service)
+    bound = release_finished_bindings(service)
+    now = int(time.time() * 1000)
+    grace_cutoff = now - STREAM_POOL_REUSE_GRACE * 1000
+    conn = get_db()
+    for stream_id, stream_key, stream_url in conn.execute('''
+        SELECT stream_id, stream_key, stream_url FROM live_stream_pool
+        WHERE channel_key = ? AND broadcast_id IS NULL AND (last_bound_at IS NULL OR last_bound_at < ?)
+        ORDER BY last_bound_at IS NOT NULL, last_bound_at
+    ''', (channel_key, grace_cutoff)).fetchall():
+        if stream_id in bound or statuses.get(stream_id) in STREAM_POOL_BUSY_STATES:
+            continue
+        # Claim atomically: another session/process may have picked the same row
+        with conn:
+            cursor = conn.execute('''
+                UPDATE live_stream_pool SET last_bound_at = ?
+                WHERE stream_id = ? AND broadcast_id IS NULL
+                  AND (last_bound_at IS NULL OR last_bound_at < ?)
+            ''', (now, stream_id, grace_cutoff))
+        if cursor.rowcount == 1:
+            return _pooled_stream_resource(stream_id, stream_key, stream_url), True
+    
+    stream_response = service.liveStreams().insert(
+        part="snippet,cdn",
+        body={
+            "snippet": {
+                "title": f"{title} - Stream",
+                "description": description
+            },
+            "cdn": {
+                "resolution": "1080p",
+                "frameRate": "30fps",
+                "ingestionType": "rtmp"
+            }
+        }
+    ).execute()
+    ingestion = stream_response['cdn']['ingestionInfo']
+    with conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO live_stream_pool
+            (stream_id, channel_key, stream_key, stream_url, title, created_at, last_bound_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (stream_response['id'], channel_key, ingestion['streamName'], ingestion['ingestionAddress'],
+              f"{title} - Stream", now, now))
+    invalidate_youtube_cache(service, "live_streams")
+    return stream_response, False
+
+def stream_gone_error(error):
+    """Whether an HttpError says the liveStream doesn't exist (anymore)"""
+    details = getattr(error, 'error_details', None)
+    reasons = {detail.get('reason') for detail in details if isinstance(detail, dict)} if isinstance(details, list) else set()
+    return bool(reasons & STREAM_GONE_REASONS) or (error.resp.status == 404 and not reasons)
+
+def discard_pooled_stream(service, stream_id):
+    """Forget a pooled stream YouTube rejected (e.g. deleted in Studio)"""
+    conn = get_db()
+    with conn:
+        conn.execute("DELETE FROM live_stream_pool WHERE stream_id = ?", (stream_id,))
+    invalidate_youtube_cache(service, "live_streams")
+
+def count_pooled_streams(service):
+    channel_key = getattr(service, '_channel_key', None) or "unknown"
+    return get_db().execute(
+        "SELECT COUNT(*) FROM live_stream_pool WHERE channel_key = ?", (channel_key,)
+    ).fetchone()[0]
+
 def create_youtube_service(credentials_dict):
-    """Create YouTube API service from credentials"""
+    """Create YouTube API service from credentials.
+
+    Services are cached per channel, so the discovery document is parsed and
+    the authorized HTTP transport is set up only once per account.
+    """
     try:
+        channel_key = youtube_channel_key(credentials_dict)
+        clients = get_youtube_client_cache()
+        if channel_key in clients:
+            return clients[channel_key]
+        
         if 'token' in credentials_dict:
             credentials = Credentials.from_authorized_user_info(credentials_dict)
         else:
@@ -366,7 +1789,14 @@ def create_youtube_service(credentials_dict):
                 client_secret=credentials_dict.get('client_secret'),
                 scopes=['https://www.googleapis.com/auth/youtube.force-ssl']
             )
-        service = build('youtube', 'v3', credentials=credentials)
+        request_class = _quota_request_class(channel_key, threading.Lock())
+        document = youtube_discovery_document()
+        if document:
+            service = build_from_document(document, credentials=credentials, requestBuilder=request_class)
+        else:
+            service = build('youtube', 'v3', credentials=credentials, requestBuilder=request_class, cache_discovery=False)
+        service._channel_key = channel_key
+        clients[channel_key] = service
         return service
     except Exception as e:
         st.error(f"Error creating YouTube service: {e}")
@@ -375,21 +1805,10 @@ def create_youtube_service(credentials_dict):
 def get_stream_key_only(service):
     """Get stream key without creating broadcast"""
     try:
-        # Create a simple live stream to get stream key
-        stream_request = service.liveStreams().insert(
-            part="snippet,cdn",
-            body={
-                "snippet": {
-                    "title": f"Stream Key Generator - {datetime.now().strftime('%Y%m%d_%H%M%S')}"
-                },
-                "cdn": {
-                    "resolution": "1080p",
-                    "frameRate": "30fps",
-                    "ingestionType": "rtmp"
-                }
-            }
+        # Reuse an idle stream from the pool; only insert one when none is free
+        stream_response, _ = acquire_live_stream(
+            service, f"Stream Key Generator - {datetime.now().strftime('%Y%m%d_%H%M%S')}"
         )
-        stream_response = stream_request.execute()
         
         return {
             "stream_key": stream_response['cdn']['ingestionInfo']['streamName'],
@@ -400,8 +1819,8 @@ def get_stream_key_only(service):
         st.error(f"Error getting stream key: {e}")
         return None
 
-def get_channel_info(service, channel_id=None):
-    """Get channel information from YouTube API"""
+def get_channel_info(service, channel_id=None, fresh=False):
+    """Get channel information from YouTube API (`fresh` bypasses the cache, for auth checks)"""
     try:
         if channel_id:
             request = service.channels().list(
@@ -414,7 +1833,7 @@ def get_channel_info(service, channel_id=None):
                 mine=True
             )
         
-        response = request.execute()
+        response = cached_youtube_call(service, "channel_info", (channel_id,), request.execute, fresh=fresh)
         return response.get('items', [])
     except Exception as e:
         st.error(f"Error fetching channel info: {e}")
@@ -423,22 +1842,8 @@ def get_channel_info(service, channel_id=None):
 def create_live_stream(service, title, description, scheduled_start_time, tags=None, category_id="20", privacy_status="public", made_for_kids=False):
     """Create a live stream on YouTube with complete settings"""
     try:
-        # Create live stream
-        stream_request = service.liveStreams().insert(
-            part="snippet,cdn",
-            body={
-                "snippet": {
-                    "title": f"{title} - Stream",
-                    "description": description
-                },
-                "cdn": {
-                    "resolution": "1080p",
-                    "frameRate": "30fps",
-                    "ingestionType": "rtmp"
-                }
-            }
-        )
-        stream_response = stream_request.execute()
+        # Live stream: idle one from the pool, or a new one if all are busy
+        stream_response, reused = acquire_live_stream(service, title, description)
         
         # Prepare broadcast body
         broadcast_body = {
@@ -480,123 +1885,2402 @@ def create_live_stream(service, title, description, scheduled_start_time, tags=N
         broadcast_response = broadcast_request.execute()
         
         # Bind stream to broadcast
-        bind_request = service.liveBroadcasts().bind(
-            part="id,contentDetails",
-            id=broadcast_response['id'],
-            streamId=stream_response['id']
+        try:
+            bind_response = service.liveBroadcasts().bind(
+                part="id,contentDetails",
+                id=broadcast_response['id'],
+                streamId=stream_response['id']
+            ).execute()
+        except HttpError as e:
+            if not reused or not stream_gone_error(e):
+                raise
+            # Pooled stream vanished on YouTube's side: drop it and bind a fresh one
+            discard_pooled_stream(service, stream_response['id'])
+            stream_response, _ = acquire_live_stream(service, title, description)
+            bind_response = service.liveBroadcasts().bind(
+                part="id,contentDetails",
+                id=broadcast_response['id'],
+                streamId=stream_response['id']
+            ).execute()
+        mark_pooled_stream_bound(stream_response['id'], broadcast_response['id'])
+        invalidate_youtube_cache(service, "broadcasts", "stream_health")
+        
+        return {
+            "stream_key": stream_response['cdn']['ingestionInfo']['streamName'],
+            "stream_url": stream_response['cdn']['ingestionInfo']['ingestionAddress'],
+            "broadcast_id": broadcast_response['id'],
+            "stream_id": stream_response['id'],
+            "watch_url": f"https://www.youtube.com/watch?v={broadcast_response['id']}",
+            "studio_url": f"https://studio.youtube.com/video/{broadcast_response['id']}/livestreaming",
+            "broadcast_response": broadcast_response
+        }
+    except Exception as e:
+        st.error(f"Error creating live stream: {e}")
+        return None
+
+def get_existing_broadcasts(service, max_results=10):
+    """Get existing live broadcasts"""
+    try:
+        request = service.liveBroadcasts().list(
+            part="snippet,status,contentDetails",
+            mine=True,
+            maxResults=max_results,
+            broadcastStatus="all"
+        )
+        response = cached_youtube_call(service, "broadcasts", (max_results,), request.execute)
+        return response.get('items', [])
+    except Exception as e:
+        st.error(f"Error getting existing broadcasts: {e}")
+        return []
+
+def get_stream_details(service, stream_ids):
+    """Ingestion info and health for many liveStreams with one list call per 50 ids.
+
+    Returns {stream_id: {stream_key, stream_url, stream_id, stream_status, health}}.
+    """
+    details = {}
+    stream_ids = list(dict.fromkeys(stream_id for stream_id in stream_ids if stream_id))
+    for start in range(0, len(stream_ids), YOUTUBE_MAX_IDS_PER_CALL):
+        batch = stream_ids[start:start + YOUTUBE_MAX_IDS_PER_CALL]
+        response = service.liveStreams().list(
+            part="cdn,status",
+            id=",".join(batch),
+            maxResults=len(batch)
+        ).execute()
+        for item in response.get('items', []):
+            ingestion = item['cdn']['ingestionInfo']
+            status = item.get('status', {})
+            details[item['id']] = {
+                "stream_key": ingestion['streamName'],
+                "stream_url": ingestion['ingestionAddress'],
+                "stream_id": item['id'],
+                "stream_status": status.get('streamStatus', 'unknown'),
+                "health": status.get('healthStatus', {}).get('status', 'noData')
+            }
+    return details
+
+def get_existing_broadcasts_with_streams(service, max_results=10):
+    """Existing broadcasts with their bound stream's key and health under 'stream'.
+
+    Two API calls in total (broadcast list + one batched liveStreams list),
+    instead of two more per broadcast when a stream key is requested.
+    """
+    broadcasts = get_existing_broadcasts(service, max_results)
+    stream_ids = tuple(b.get('contentDetails', {}).get('boundStreamId') for b in broadcasts)
+    streams = cached_youtube_call(
+        service, "stream_health", stream_ids, lambda: get_stream_details(service, stream_ids)
+    ) if any(stream_ids) else {}
+    return [
+        dict(broadcast, stream=streams.get(stream_id))
+        for broadcast, stream_id in zip(broadcasts, stream_ids)
+    ]
+
+def get_broadcast_stream_key(service, broadcast_id):
+    """Get stream key for existing broadcast"""
+    try:
+        # Get broadcast details
+        broadcast_request = service.liveBroadcasts().list(
+            part="contentDetails",
+            id=broadcast_id
+        )
+        broadcast_response = broadcast_request.execute()
+        
+        if not broadcast_response['items']:
+            return None
+            
+        stream_id = broadcast_response['items'][0]['contentDetails'].get('boundStreamId')
+        
+        if not stream_id:
+            return None
+            
+        # Get stream details
+        return get_stream_details(service, [stream_id]).get(stream_id)
+    except Exception as e:
+        st.error(f"Error getting broadcast stream key: {e}")
+        return None
+
+# --- FFMPEG PROGRESS METRICS ---
+METRICS_BUFFER_SIZE = 720       # Samples kept in memory per session
+METRICS_SAMPLE_INTERVAL = 10    # Seconds between rows persisted to stream_metrics
+
+ProgressSample = namedtuple(
+    "ProgressSample",
+    ["time", "frame", "fps", "bitrate_kbps", "speed", "dup_frames", "drop_frames", "out_time_ms"]
+)
+
+class FFmpegProgressParser:
+    """Parse ffmpeg `-progress` key=value blocks into ProgressSample tuples"""
+
+    KEYS = {
+        "frame", "fps", "bitrate", "total_size", "out_time_us", "out_time_ms", "out_time",
+        "dup_frames", "drop_frames", "speed", "progress"
+    }
+    KEY_RE = re.compile(r'^([a-z_0-9]+)=(.*)$')
+
+    def __init__(self):
+        self._block = {}
+
+    @staticmethod
+    def _number(value, cast=float):
+        value = value.strip().rstrip("x").replace("kbits/s", "")
+        try:
+            return cast(float(value))
+        except ValueError:
+            return None
+
+    def feed(self, line):
+        """Consume one output line.
+
+        Returns (is_progress, sample): `is_progress` tells the caller the line
+        belonged to a progress block, `sample` is set once a block completes.
+        """
+        match = self.KEY_RE.match(line.strip())
+        if not match:
+            return False, None
+        key, value = match.groups()
+        if key not in self.KEYS and not key.startswith("stream_"):
+            return False, None
+        if key != "progress":
+            self._block[key] = value
+            return True, None
+
+        block, self._block = self._block, {}
+        out_time_us = self._number(block.get("out_time_us", ""), int)
+        sample = ProgressSample(
+            time=time.time(),
+            frame=self._number(block.get("frame", ""), int),
+            fps=self._number(block.get("fps", "")),
+            bitrate_kbps=self._number(block.get("bitrate", "")),
+            speed=self._number(block.get("speed", "")),
+            dup_frames=self._number(block.get("dup_frames", ""), int),
+            drop_frames=self._number(block.get("drop_frames", ""), int),
+            out_time_ms=out_time_us // 1000 if out_time_us is not None else None
+        )
+        return True, sample
+
+@st.cache_resource
+def get_metrics_registry():
+    """Per-session ring buffers of recent ProgressSample values"""
+    return {}
+
+def get_metrics_buffer(session_id):
+    """Get (or create) the ring buffer for a streaming session"""
+    registry = get_metrics_registry()
+    if session_id not in registry:
+        registry[session_id] = deque(maxlen=METRICS_BUFFER_SIZE)
+    return registry[session_id]
+
+def release_metrics_buffer(session_id, buffer):
+    """Drop a finished run's ring buffer (unless a newer run already replaced it)"""
+    registry = get_metrics_registry()
+    if registry.get(session_id) is buffer:
+        registry.pop(session_id, None)
+
+def format_progress_sample(sample):
+    """One-line human summary of a progress sample"""
+    def fmt(value, spec):
+        return "N/A" if value is None else format(value, spec)
+    return (
+        f"📈 fps={fmt(sample.fps, '.1f')} bitrate={fmt(sample.bitrate_kbps, '.0f')}kbps "
+        f"speed={fmt(sample.speed, '.2f')}x dup={fmt(sample.dup_frames, 'd')} "
+        f"drop={fmt(sample.drop_frames, 'd')}"
+    )
+
+def get_stream_metrics(session_id, limit=100):
+    """Get downsampled progress metrics for a session from database"""
+    try:
+        return get_db().execute('''
+            SELECT timestamp, frame, fps, bitrate_kbps, speed, dup_frames, drop_frames, out_time_ms
+            FROM stream_metrics
+            WHERE session_id = ?
+            ORDER BY id DESC
+            LIMIT ?
+        ''', (session_id, limit)).fetchall()
+    except Exception as e:
+        st.error(f"Error getting stream metrics: {e}")
+        return []
+
+# --- ENCODING PROFILE ---
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "1440p": (2560, 1440)
+}
+
+class EncodingProfile:
+    """Video/audio encoding settings that drive the ffmpeg command line"""
+
+    def __init__(self, bitrate="2500k", framerate="30", resolution="1080p", is_shorts=False,
+                 preset="veryfast", audio_bitrate="128k"):
+        self.bitrate = bitrate
+        self.framerate = int(framerate)
+        self.resolution = resolution if resolution in RESOLUTIONS else "1080p"
+        self.is_shorts = is_shorts
+        self.preset = preset
+        self.audio_bitrate = audio_bitrate
+
+    @property
+    def bitrate_kbps(self):
+        return int(str(self.bitrate).lower().rstrip("k"))
+
+    @property
+    def size(self):
+        """Output (width, height); Shorts swap to vertical 9:16"""
+        width, height = RESOLUTIONS[self.resolution]
+        return (height, width) if self.is_shorts else (width, height)
+
+    @property
+    def gop(self):
+        """Keyframe interval: 2 seconds at the chosen frame rate"""
+        return self.framerate * 2
+
+    def scale_filter(self):
+        width, height = self.size
+        return (
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+        )
+
+    def video_args(self):
+        return [
+            "-vf", self.scale_filter(),
+            "-r", str(self.framerate),
+            "-c:v", "libx264", "-preset", self.preset, "-pix_fmt", "yuv420p",
+            "-b:v", f"{self.bitrate_kbps}k",
+            "-maxrate", f"{self.bitrate_kbps}k",
+            "-bufsize", f"{self.bitrate_kbps * 2}k",
+            "-g", str(self.gop), "-keyint_min", str(self.gop), "-sc_threshold", "0"
+        ]
+
+    def audio_args(self):
+        return ["-c:a", "aac", "-b:a", self.audio_bitrate, "-ar", "44100"]
+
+    def key(self):
+        """Stable identifier for this profile"""
+        width, height = self.size
+        return f"{width}x{height}_{self.framerate}fps_{self.bitrate_kbps}k_{self.preset}"
+
+    def to_dict(self):
+        return {
+            'bitrate': self.bitrate,
+            'framerate': self.framerate,
+            'resolution': self.resolution,
+            'is_shorts': self.is_shorts,
+            'preset': self.preset,
+            'audio_bitrate': self.audio_bitrate
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data) if data else cls()
+
+    def __repr__(self):
+        return f"EncodingProfile({self.key()})"
+
+def encoding_profile_from_state():
+    """Build an EncodingProfile from the Technical Settings widgets"""
+    return EncodingProfile(
+        bitrate=st.session_state.get('bitrate_select', "2500k"),
+        framerate=st.session_state.get('framerate_select', "30"),
+        resolution=st.session_state.get('resolution_select', "1080p"),
+        is_shorts=st.session_state.get('is_shorts', False)
+    )
+
+# --- SOURCE PROBE (passthrough detection) ---
+PASSTHROUGH_VIDEO_PROFILES = {"Baseline", "Constrained Baseline", "Main", "High"}
+PASSTHROUGH_MAX_KEYFRAME_INTERVAL = 4.0   # Seconds; YouTube rejects longer GOPs
+PASSTHROUGH_AUDIO_RATES = {"44100", "48000"}
+PROBE_KEYFRAME_WINDOW = 30                # Seconds of video scanned for keyframes
+
+def _run_ffprobe(args):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-print_format", "json"] + args,
+        capture_output=True, text=True, timeout=60
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or "ffprobe failed")
+    return json.loads(result.stdout or "{}")
+
+@st.cache_data(show_spinner=False)
+def _probe_video_cached(video_path, mtime, size):
+    info = _run_ffprobe(["-show_streams", "-show_format", video_path])
+    keyframes = _run_ffprobe([
+        "-select_streams", "v:0", "-skip_frame", "nokey",
+        "-show_entries", "frame=pts_time",
+        "-read_intervals", f"%+{PROBE_KEYFRAME_WINDOW}",
+        video_path
+    ])
+    times = sorted(
+        float(frame['pts_time']) for frame in keyframes.get('frames', [])
+        if frame.get('pts_time') not in (None, "N/A")
+    )
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    info['max_keyframe_interval'] = max(gaps) if gaps else None
+    return info
+
+def probe_video(video_path):
+    """Probe a video with ffprobe (cached per path/mtime/size); None if unavailable.
+
+    Also runs on worker threads (transcodes, admission), so failures go to
+    stderr; UI callers show their own warning on None.
+    """
+    try:
+        stat = os.stat(video_path)
+        return _probe_video_cached(video_path, stat.st_mtime, stat.st_size)
+    except Exception as e:
+        print(f"ffprobe unavailable for {video_path}: {e}", file=sys.stderr)
+        return None
+
+def check_passthrough(probe):
+    """Check whether a probed file can be sent to YouTube with `-c copy`.
+
+    Returns (ok, reasons) where reasons lists why re-encoding is required.
+    """
+    if not probe:
+        return False, ["file could not be probed"]
+    
+    reasons = []
+    streams = probe.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    
+    if not video:
+        reasons.append("no video stream")
+    else:
+        if video.get('codec_name') != 'h264':
+            reasons.append(f"video codec {video.get('codec_name')} (need h264)")
+        elif video.get('profile') not in PASSTHROUGH_VIDEO_PROFILES:
+            reasons.append(f"H.264 profile {video.get('profile')}")
+        if video.get('pix_fmt') not in ('yuv420p', 'yuvj420p'):
+            reasons.append(f"pixel format {video.get('pix_fmt')}")
+        interval = probe.get('max_keyframe_interval')
+        if interval is None:
+            reasons.append("keyframe interval unknown")
+        elif interval > PASSTHROUGH_MAX_KEYFRAME_INTERVAL:
+            reasons.append(f"keyframe interval {interval:.1f}s (max {PASSTHROUGH_MAX_KEYFRAME_INTERVAL:.0f}s)")
+    
+    if not audio:
+        reasons.append("no audio stream")
+    else:
+        if audio.get('codec_name') != 'aac':
+            reasons.append(f"audio codec {audio.get('codec_name')} (need aac)")
+        if str(audio.get('sample_rate')) not in PASSTHROUGH_AUDIO_RATES:
+            reasons.append(f"audio sample rate {audio.get('sample_rate')}")
+    
+    return not reasons, reasons
+
+def profile_mismatch(probe, profile):
+    """Reasons the source doesn't already match the chosen profile's size/frame rate.
+
+    Passthrough sends the source unchanged, so any mismatch (e.g. a Shorts or
+    different resolution profile) needs a re-encode.
+    """
+    video = next((s for s in (probe or {}).get('streams', []) if s.get('codec_type') == 'video'), None)
+    if not video:
+        return []
+    reasons = []
+    width, height = profile.size
+    if (video.get('width'), video.get('height')) != (width, height):
+        reasons.append(
+            f"source is {video.get('width')}x{video.get('height')}, profile is {width}x{height}"
+            + (" (Shorts)" if profile.is_shorts else "")
+        )
+    num, _, den = str(video.get('avg_frame_rate') or "0/1").partition("/")
+    try:
+        fps = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        fps = 0.0
+    if fps and abs(fps - profile.framerate) > 0.5:
+        reasons.append(f"source is {fps:.0f}fps, profile is {profile.framerate}fps")
+    return reasons
+
+# --- TRANSCODE CACHE ---
+TRANSCODE_CACHE_DIR = Path("transcode_cache")
+TRANSCODE_CACHE_QUOTA_GB = 20
+HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+def file_content_hash(path, algorithm="sha256"):
+    """Hex digest (SHA-256 by default) of a file's content, read in chunks"""
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class TranscodeCache:
+    """Encode each (source content, profile) once in the background and reuse it.
+
+    Cached files are stream-ready for the profile, so playback can loop them
+    with `-c copy`. Entries live in the transcode_cache table and are evicted
+    least-recently-used first when the directory exceeds its quota.
+    """
+
+    def __init__(self, cache_dir=TRANSCODE_CACHE_DIR, quota_gb=TRANSCODE_CACHE_QUOTA_GB, db_path=DB_PATH):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.quota_bytes = int(quota_gb * 1024 ** 3)
+        self.db_path = db_path
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="transcode")
+        # Encodes interrupted by a crash/restart leave partial files behind
+        for partial in self.cache_dir.glob("*.partial.mp4"):
+            partial.unlink(missing_ok=True)
+
+    @staticmethod
+    def _source_id(video_path):
+        stat = os.stat(video_path)
+        return (os.path.abspath(video_path), stat.st_mtime, stat.st_size)
+
+    def _stored_hash(self, source_id):
+        """Content hash remembered for this (path, mtime, size), or None"""
+        path, mtime, size = source_id
+        row = get_db(self.db_path).execute(
+            "SELECT content_hash FROM source_hashes WHERE path = ? AND mtime = ? AND size_bytes = ?",
+            (path, mtime, size)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _source_hash(self, video_path, source_id):
+        """Content hash of the source, hashing the file only when it changed"""
+        source_hash = self._stored_hash(source_id)
+        if source_hash:
+            return source_hash
+        source_hash = file_content_hash(video_path)
+        path, mtime, size = source_id
+        conn = get_db(self.db_path)
+        with conn:
+            conn.execute('''
+                INSERT INTO source_hashes (path, size_bytes, mtime, content_hash) VALUES (?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size_bytes = excluded.size_bytes, mtime = excluded.mtime, content_hash = excluded.content_hash
+            ''', (path, size, mtime, source_hash))
+        return source_hash
+
+    @staticmethod
+    def cache_key(source_hash, profile):
+        return f"{source_hash[:16]}_{profile.key()}"
+
+    def lookup(self, video_path, profile):
+        """Return the cached stream-ready path for this source/profile, or None"""
+        try:
+            source_hash = self._stored_hash(self._source_id(video_path))
+        except OSError:
+            return None
+        if not source_hash:
+            return None
+        return self._lookup_key(self.cache_key(source_hash, profile))
+
+    def _lookup_key(self, cache_key):
+        conn = get_db(self.db_path)
+        row = conn.execute(
+            "SELECT path FROM transcode_cache WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        if not row:
+            return None
+        if not os.path.exists(row[0]):
+            with conn:
+                conn.execute("DELETE FROM transcode_cache WHERE cache_key = ?", (cache_key,))
+            return None
+        with conn:
+            conn.execute(
+                "UPDATE transcode_cache SET last_used = ? WHERE cache_key = ?",
+                (datetime.now().isoformat(), cache_key)
+            )
+        return row[0]
+
+    def job(self, video_path, profile):
+        """The transcode job for this source/profile, or None if none was requested"""
+        try:
+            return self.jobs.get((self._source_id(video_path), profile.key()))
+        except OSError:
+            return None
+
+    def request(self, video_path, profile):
+        """Queue a background transcode (no-op if already queued); returns the job dict"""
+        job_id = (self._source_id(video_path), profile.key())
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job and job['state'] not in ('failed', 'cancelled'):
+                return job
+            job = {'state': 'queued', 'progress': 0.0, 'output': None, 'error': None,
+                   'process': None, 'cancelled': False}
+            self.jobs[job_id] = job
+        self._executor.submit(self._transcode, video_path, profile, job_id[0], job)
+        return job
+
+    def cancel(self, video_path, profile):
+        """Cancel a queued or running transcode; returns (ok, message)"""
+        job = self.job(video_path, profile)
+        with self._lock:
+            if not job or job['state'] in ('done', 'failed', 'cancelled'):
+                return False, "No transcode in progress"
+            job['cancelled'] = True
+            process = job['process']
+        if process and process.poll() is None:
+            process.terminate()
+        return True, "Transcode cancelled"
+
+    def _transcode(self, video_path, profile, source_id, job):
+        partial = None
+        try:
+            if job['cancelled']:
+                raise InterruptedError("cancelled")
+            job['state'] = 'hashing'
+            source_hash = self._source_hash(video_path, source_id)
+            cache_key = self.cache_key(source_hash, profile)
+            
+            cached = self._lookup_key(cache_key)
+            if cached:
+                job.update(state='done', progress=1.0, output=cached)
+                return
+            
+            job['state'] = 'encoding'
+            probe = probe_video(video_path) or {}
+            duration = float(probe.get('format', {}).get('duration') or 0)
+            output = self.cache_dir / f"{cache_key}.mp4"
+            partial = self.cache_dir / f"{cache_key}.partial.mp4"
+            cmd = ["ffmpeg", "-y", "-i", video_path]
+            cmd += profile.video_args()
+            cmd += profile.audio_args()
+            cmd += ["-movflags", "+faststart", "-progress", "pipe:1", "-nostats", str(partial)]
+            
+            parser = FFmpegProgressParser()
+            tail = deque(maxlen=20)
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+            with self._lock:
+                job['process'] = process
+                if job['cancelled']:
+                    process.terminate()
+            for line in process.stdout:
+                is_progress, sample = parser.feed(line)
+                if not is_progress:
+                    tail.append(line.strip())
+                elif sample and duration and sample.out_time_ms is not None:
+                    job['progress'] = min(sample.out_time_ms / 1000 / duration, 0.99)
+            returncode = process.wait()
+            if job['cancelled']:
+                raise InterruptedError("cancelled")
+            if returncode != 0:
+                raise RuntimeError("ffmpeg transcode failed: " + " | ".join(tail))
+            
+            # Only a complete encode ever gets the final name
+            os.replace(partial, output)
+            now = datetime.now().isoformat()
+            conn = get_db(self.db_path)
+            with conn:
+                conn.execute('''
+                    INSERT OR REPLACE INTO transcode_cache
+                    (cache_key, source_hash, profile_key, path, size_bytes, created_at, last_used)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (cache_key, source_hash, profile.key(), str(output), output.stat().st_size, now, now))
+            
+            self.evict(keep={str(output)})
+            job.update(state='done', progress=1.0, output=str(output), process=None)
+        except InterruptedError:
+            job.update(state='cancelled', process=None)
+        except Exception as e:
+            job.update(state='failed', error=str(e), process=None)
+            print(f"Transcode error for {video_path}: {e}", file=sys.stderr)
+        finally:
+            if partial is not None and partial.exists():
+                partial.unlink(missing_ok=True)
+
+    def evict(self, keep=()):
+        """Delete least-recently-used entries until the cache fits its quota"""
+        conn = get_db(self.db_path)
+        rows = conn.execute(
+            "SELECT cache_key, path, size_bytes FROM transcode_cache ORDER BY last_used ASC"
+        ).fetchall()
+        total = sum(row[2] for row in rows)
+        if total <= self.quota_bytes:
+            return
+        # Transcodes that running streams (local and daemon) are reading are never evicted
+        protected = {os.path.abspath(path) for path in keep} | streaming_video_paths()
+        for cache_key, path, size_bytes in rows:
+            if total <= self.quota_bytes:
+                break
+            if os.path.abspath(path) in protected:
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+            with conn:
+                conn.execute("DELETE FROM transcode_cache WHERE cache_key = ?", (cache_key,))
+            total -= size_bytes
+
+    def usage_bytes(self):
+        return get_db(self.db_path).execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM transcode_cache"
+        ).fetchone()[0]
+
+@st.cache_resource
+def get_transcode_cache():
+    """Shared transcode cache, kept alive across Streamlit reruns and sessions"""
+    return TranscodeCache()
+
+def run_ffmpeg(video_path, stream_key, profile, log_callback, rtmp_url=None, session_id=None, passthrough=False, on_process=None):
+    """Run FFmpeg for streaming with enhanced logging.
+
+    `on_process` receives the Popen object as soon as ffmpeg is spawned so a
+    supervisor can stop it. Returns ffmpeg's exit code (None on launch error).
+    """
+    returncode = None
+    profile = profile or EncodingProfile()
+    output_url = rtmp_url or f"rtmp://a.rtmp.youtube.com/live2/{stream_key}"
+    cmd = ["ffmpeg", "-re", "-stream_loop", "-1", "-i", video_path]
+    if passthrough:
+        cmd += ["-c", "copy"]
+    else:
+        cmd += profile.video_args()
+        cmd += profile.audio_args()
+    cmd += ["-progress", "pipe:1", "-nostats", "-f", "flv", output_url]
+    
+    mode = "passthrough" if passthrough else profile.key()
+    start_msg = f"🚀 Starting FFmpeg ({mode}): {' '.join(cmd[:6])}... [RTMP URL hidden for security]"
+    log_callback(start_msg)
+    writer = get_log_writer()
+    if session_id:
+        writer.write(session_id, "INFO", start_msg, video_path)
+    
+    metrics = get_metrics_buffer(session_id) if session_id else None
+    try:
+        parser = FFmpegProgressParser()
+        last_persisted = 0
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        if on_process:
+            on_process(process)
+        for line in process.stdout:
+            is_progress, sample = parser.feed(line)
+            if not is_progress:
+                log_callback(line.strip())
+                if session_id:
+                    writer.write(session_id, "FFMPEG", line.strip(), video_path)
+                continue
+            if sample is None:
+                continue
+            if metrics is not None:
+                metrics.append(sample)
+            # Downsample: one persisted row / live log line per interval
+            if sample.time - last_persisted >= METRICS_SAMPLE_INTERVAL:
+                last_persisted = sample.time
+                log_callback(format_progress_sample(sample))
+                if session_id:
+                    writer.write_metric(session_id, sample)
+        returncode = process.wait()
+        
+        if returncode == 0:
+            end_msg = "✅ Streaming completed successfully"
+            log_type = "INFO"
+        else:
+            end_msg = f"⚠️ FFmpeg exited with code {returncode}"
+            log_type = "ERROR"
+        log_callback(end_msg)
+        if session_id:
+            writer.write(session_id, log_type, end_msg, video_path)
+            
+    except Exception as e:
+        error_msg = f"❌ FFmpeg Error: {e}"
+        log_callback(error_msg)
+        if session_id:
+            writer.write(session_id, "ERROR", error_msg, video_path)
+    finally:
+        final_msg = "⏹️ Streaming session ended"
+        log_callback(final_msg)
+        if session_id:
+            writer.write(session_id, "INFO", final_msg, video_path)
+            # Encoder health falls back to the persisted samples from here on
+            release_metrics_buffer(session_id, metrics)
+    return returncode
+
+# --- CHUNKED DOWNLOADER (parallel, resumable) ---
+DOWNLOAD_SEGMENTS = 4                     # Parallel Range requests per file
+DOWNLOAD_MIN_SEGMENT = 16 * 1024 * 1024   # Don't split files into segments smaller than this
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024         # Bytes per read from the socket
+DOWNLOAD_MANIFEST_EVERY = 8 * 1024 * 1024 # Persist segment progress every N bytes
+DOWNLOAD_RETRIES = 5                      # Attempts per segment before giving up
+DOWNLOAD_TIMEOUT = (10, 60)               # (connect, read) seconds
+GDRIVE_FILE_RE = re.compile(r'drive\.google\.com\/(?:file\/d\/|open\?id=|uc\?(?:.*&)?id=)([a-zA-Z0-9_-]+)')
+
+def resolve_download_url(url):
+    """Direct-download URL for Google Drive share links, else the URL unchanged"""
+    match = GDRIVE_FILE_RE.search(url)
+    if match:
+        # usercontent endpoint skips the virus-scan page and honours Range
+        return f"https://drive.usercontent.google.com/download?id={match.group(1)}&export=download&confirm=t"
+    return url
+
+def expected_checksum(headers):
+    """(algorithm, hex digest) advertised by the server, if any"""
+    for part in headers.get('x-goog-hash', '').split(','):
+        algo, _, value = part.strip().partition('=')
+        if algo == 'md5' and value:
+            return 'md5', base64.b64decode(value).hex()
+    if headers.get('Content-MD5'):
+        return 'md5', base64.b64decode(headers['Content-MD5']).hex()
+    return None
+
+class ChunkedDownloader:
+    """Download a file over N parallel HTTP Range requests, resumable after failures.
+
+    Segments are written in place into a preallocated `<dest>.part` file and
+    their progress is kept in `<dest>.part.json`, so a dropped connection (or a
+    restarted app) continues from the last persisted offset instead of zero.
+    Servers without Range support fall back to a single stream.
+    """
+
+    def __init__(self, url, dest, segments=DOWNLOAD_SEGMENTS, sha256=None,
+                 on_progress=None, cancel_event=None, session=None):
+        self.url = resolve_download_url(url)
+        self.dest = Path(dest)
+        self.part_path = self.dest.with_name(self.dest.name + ".part")
+        self.manifest_path = self.dest.with_name(self.dest.name + ".part.json")
+        self.segments = segments
+        self.sha256 = sha256
+        self.on_progress = on_progress
+        self.cancel_event = cancel_event or threading.Event()
+        self.session = session or requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=max(segments, 1))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.total = None
+        self.checksum = None
+        self.manifest = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+
+    def _probe(self):
+        """Size, validators and Range support of the remote file"""
+        resp = self.session.get(self.url, headers={'Range': 'bytes=0-0'}, stream=True,
+                                timeout=DOWNLOAD_TIMEOUT, allow_redirects=True)
+        resp.close()
+        resp.raise_for_status()
+        if 'text/html' in resp.headers.get('Content-Type', ''):
+            raise ValueError("Server returned an HTML page instead of a file (link not public?)")
+        self.url = resp.url  # Keep the post-redirect URL for the segment requests
+        validator = resp.headers.get('ETag') or resp.headers.get('Last-Modified')
+        self.checksum = expected_checksum(resp.headers)
+        content_range = resp.headers.get('Content-Range', '')
+        if resp.status_code == 206 and '/' in content_range and not content_range.endswith('/*'):
+            return int(content_range.rsplit('/', 1)[1]), validator, True
+        length = resp.headers.get('Content-Length')
+        return (int(length) if length else None), validator, False
+
+    def _load_manifest(self, total, validator):
+        """Previous progress if it belongs to the same remote file"""
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (manifest.get('url') != self.url or manifest.get('total') != total
+                or manifest.get('validator') != validator or not self.part_path.exists()):
+            return None
+        return manifest
+
+    def _new_manifest(self, total, validator, ranged):
+        count = max(1, min(self.segments, total // DOWNLOAD_MIN_SEGMENT)) if ranged and total else 1
+        size = -(-total // count) if total else 0
+        segments = [[i * size, min((i + 1) * size, total) - 1, 0] for i in range(count)] if total else [[0, -1, 0]]
+        with open(self.part_path, "wb") as f:
+            if total:
+                f.truncate(total)  # Preallocate so segments can write at their offsets
+        return {'url': self.url, 'total': total, 'validator': validator, 'ranged': ranged, 'segments': segments}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        # Segment threads flush concurrently; they share one temp file name
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps(self.manifest)
+                self._unsaved = 0
+            with open(tmp_path, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.manifest_path)
+
+    def done_bytes(self):
+        return sum(seg[2] for seg in self.manifest['segments']) if self.manifest else 0
+
+    def _advance(self, segment, n):
+        with self._lock:
+            segment[2] += n
+            self._unsaved += n
+            flush = self._unsaved >= DOWNLOAD_MANIFEST_EVERY
+        if flush:
+            self._save_manifest()
+        if self.on_progress:
+            self.on_progress(self.done_bytes(), self.total)
+
+    def _fetch_segment(self, segment):
+        """Download one byte range, resuming from its persisted offset on errors"""
+        start, end, _ = segment
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            offset = start + segment[2]
+            if end >= 0 and offset > end:
+                return
+            headers = {}
+            if self.manifest['ranged']:
+                headers['Range'] = f"bytes={offset}-{end}"
+            elif segment[2]:
+                segment[2] = 0  # No Range support: a retry has to start over
+            try:
+                with self.session.get(self.url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as resp:
+                    resp.raise_for_status()
+                    if headers.get('Range') and resp.status_code != 206:
+                        raise ValueError("Server ignored the Range header")
+                    with open(self.part_path, "r+b") as f:
+                        f.seek(start + segment[2])
+                        for chunk in resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            if self.cancel_event.is_set():
+                                return
+                            if chunk:
+                                f.write(chunk)
+                                self._advance(segment, len(chunk))
+                if end < 0 or start + segment[2] > end:
+                    return
+                raise IOError(f"Connection closed at byte {start + segment[2]} of segment ending {end}")
+            except (requests.RequestException, IOError) as e:
+                if attempt == DOWNLOAD_RETRIES or self.cancel_event.is_set():
+                    raise
+                self._save_manifest()
+                time.sleep(restart_delay(attempt))
+
+    def _verify(self):
+        """Check size and checksum of the finished .part file"""
+        size = self.part_path.stat().st_size
+        if self.total is not None and size != self.total:
+            raise IOError(f"Size mismatch: got {size} bytes, expected {self.total}")
+        if self.sha256 and file_content_hash(self.part_path) != self.sha256.lower():
+            raise IOError("SHA-256 mismatch")
+        if self.checksum and not self.sha256:
+            algo, expected = self.checksum
+            if file_content_hash(self.part_path, algo) != expected:
+                raise IOError(f"{algo.upper()} mismatch")
+
+    def download(self):
+        """Run (or resume) the transfer; returns the final path or raises"""
+        total, validator, ranged = self._probe()
+        self.total = total
+        self.manifest = self._load_manifest(total, validator) or self._new_manifest(total, validator, ranged)
+        self._save_manifest()
+        
+        pending = [seg for seg in self.manifest['segments'] if seg[1] < 0 or seg[0] + seg[2] <= seg[1]]
+        with ThreadPoolExecutor(max_workers=max(len(pending), 1), thread_name_prefix="download") as pool:
+            futures = [pool.submit(self._fetch_segment, seg) for seg in pending]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                self.cancel_event.set()
+                raise
+            finally:
+                self._save_manifest()
+        if self.cancel_event.is_set():
+            raise InterruptedError("Download cancelled")
+        
+        try:
+            self._verify()
+        except IOError:
+            # Corrupt result: drop it so the next attempt starts clean
+            self.part_path.unlink(missing_ok=True)
+            self.manifest_path.unlink(missing_ok=True)
+            raise
+        os.replace(self.part_path, self.dest)
+        self.manifest_path.unlink(missing_ok=True)
+        return self.dest
+
+# --- MEDIA LIBRARY (content-addressed) ---
+MEDIA_LIBRARY_DIR = Path("media_library")
+MEDIA_LIBRARY_QUOTA_GB = 50
+MEDIA_INCOMING_DIR = MEDIA_LIBRARY_DIR / "incoming"   # Downloads/uploads in progress
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024                   # Bytes copied per read while spooling uploads
+
+def media_metadata(path):
+    """Duration/codec/resolution summary from ffprobe ({} if it can't be probed)"""
+    try:
+        info = _run_ffprobe(["-show_streams", "-show_format", str(path)])
+    except Exception:
+        return {}
+    streams = info.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'), {})
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), {})
+    duration = info.get('format', {}).get('duration')
+    return {
+        'duration': float(duration) if duration not in (None, "N/A") else None,
+        'video_codec': video.get('codec_name'),
+        'audio_codec': audio.get('codec_name'),
+        'width': video.get('width'),
+        'height': video.get('height')
+    }
+
+def download_source_key(url):
+    """Stable identity of a download source (Drive file id, else the URL)"""
+    match = GDRIVE_FILE_RE.search(url)
+    return f"gdrive:{match.group(1)}" if match else url.strip()
+
+def streaming_video_paths():
+    """Absolute paths of the videos active streams are reading (local and daemon)"""
+    backends = [get_stream_supervisor()]
+    client = get_stream_daemon_client()
+    if client.available():
+        backends.append(client)
+    paths = set()
+    for backend in backends:
+        for status in backend.all_status():
+            if status['state'] in StreamDaemonClient.ACTIVE_STATES and status.get('video_path'):
+                paths.add(os.path.abspath(status['video_path']))
+    return paths
+
+class MediaLibrary:
+    """Videos stored once per content hash, indexed in the media_library table.
+
+    Re-downloading a known source (or any file with the same content) reuses
+    the stored copy. When the library exceeds its quota the least-recently-used
+    files are evicted, except those being read by a running stream.
+    """
+
+    def __init__(self, library_dir=MEDIA_LIBRARY_DIR, quota_gb=MEDIA_LIBRARY_QUOTA_GB, db_path=DB_PATH):
+        self.library_dir = Path(library_dir)
+        self.library_dir.mkdir(parents=True, exist_ok=True)
+        self.quota_bytes = int(quota_gb * 1024 ** 3)
+        self.db_path = db_path
+
+    def find_source(self, source_key):
+        """Library path already holding this download source, or None"""
+        row = get_db(self.db_path).execute('''
+            SELECT m.path FROM media_sources s JOIN media_library m ON m.media_id = s.media_id
+            WHERE s.source_key = ?
+        ''', (source_key,)).fetchone()
+        if row and os.path.exists(row[0]):
+            self.touch(row[0])
+            return row[0]
+        return None
+
+    def ingest(self, src_path, original_name=None, source_url=None, content_hash=None, meta=None):
+        """Move a finished file into the library; returns (media_id, path).
+
+        If the same content is already stored, `src_path` is deleted and the
+        existing copy is returned instead. `meta` skips the ffprobe call when
+        the caller already probed the file.
+        """
+        src_path = Path(src_path)
+        media_id = content_hash or file_content_hash(src_path)
+        original_name = original_name or src_path.name
+        source_key = download_source_key(source_url) if source_url else None
+        now = int(time.time() * 1000)
+        conn = get_db(self.db_path)
+        
+        row = conn.execute("SELECT path FROM media_library WHERE media_id = ?", (media_id,)).fetchone()
+        if row and os.path.exists(row[0]):
+            src_path.unlink(missing_ok=True)
+            with conn:
+                conn.execute("UPDATE media_library SET last_used = ? WHERE media_id = ?", (now, media_id))
+                self._add_source(conn, source_key, media_id, now)
+            return media_id, row[0]
+        
+        ext = Path(original_name).suffix.lower() or ".mp4"
+        dest = self.library_dir / f"{media_id[:16]}{ext}"
+        shutil.move(str(src_path), dest)
+        meta = meta or media_metadata(dest)
+        with conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO media_library
+                (media_id, path, original_name, source_url, size_bytes,
+                 duration, video_codec, audio_codec, width, height, added_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (media_id, str(dest), original_name, source_url, dest.stat().st_size,
+                  meta.get('duration'), meta.get('video_codec'), meta.get('audio_codec'),
+                  meta.get('width'), meta.get('height'), now, now))
+            self._add_source(conn, source_key, media_id, now)
+        self.evict(keep={str(dest)})
+        return media_id, str(dest)
+
+    @staticmethod
+    def _add_source(conn, source_key, media_id, now):
+        if source_key:
+            conn.execute(
+                "INSERT OR REPLACE INTO media_sources (source_key, media_id, added_at) VALUES (?, ?, ?)",
+                (source_key, media_id, now)
+            )
+
+    def touch(self, path):
+        conn = get_db(self.db_path)
+        with conn:
+            conn.execute("UPDATE media_library SET last_used = ? WHERE path = ?", (int(time.time() * 1000), str(path)))
+
+    def evict(self, keep=()):
+        """Delete least-recently-used media until the library fits its quota"""
+        conn = get_db(self.db_path)
+        rows = conn.execute(
+            "SELECT media_id, path, size_bytes FROM media_library ORDER BY last_used ASC"
+        ).fetchall()
+        total = sum(row[2] or 0 for row in rows)
+        if total <= self.quota_bytes:
+            return
+        # Files of running streams (local and daemon) are never evicted
+        protected = {os.path.abspath(path) for path in keep} | streaming_video_paths()
+        for media_id, path, size_bytes in rows:
+            if total <= self.quota_bytes:
+                break
+            if os.path.abspath(path) in protected:
+                continue
+            if os.path.exists(path):
+                os.remove(path)
+            with conn:
+                conn.execute("DELETE FROM media_library WHERE media_id = ?", (media_id,))
+                conn.execute("DELETE FROM media_sources WHERE media_id = ?", (media_id,))
+            total -= size_bytes or 0
+
+    def usage_bytes(self):
+        return get_db(self.db_path).execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM media_library"
+        ).fetchone()[0]
+
+    def list_media(self):
+        """(path, original_name, size_bytes, duration) rows, most recently used first"""
+        return get_db(self.db_path).execute('''
+            SELECT path, original_name, size_bytes, duration FROM media_library ORDER BY last_used DESC
+        ''').fetchall()
+
+@st.cache_resource
+def get_media_library():
+    """Shared media library, kept alive across Streamlit reruns and sessions"""
+    return MediaLibrary()
+
+def ingest_upload(uploaded_file, library, incoming_dir=MEDIA_INCOMING_DIR):
+    """Spool an uploaded file into the library, hashing it on the way.
+
+    The bytes are copied once, in chunks, to a temp file next to the library
+    (so the final move is a rename) and validated with ffprobe before they are
+    accepted. The client-supplied name is only kept as a label.
+    Returns (ok, library path or error message).
+    """
+    incoming_dir = Path(incoming_dir)
+    incoming_dir.mkdir(parents=True, exist_ok=True)
+    original_name = os.path.basename(uploaded_file.name) or "upload.mp4"
+    digest = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=incoming_dir, suffix=Path(original_name).suffix.lower())
+    try:
+        uploaded_file.seek(0)
+        with os.fdopen(fd, "wb") as f:
+            while True:
+                chunk = uploaded_file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+        
+        meta = media_metadata(tmp_path)
+        if not meta.get('video_codec'):
+            os.remove(tmp_path)
+            return False, f"{original_name} is not a playable video (ffprobe found no video stream)"
+        _, path = library.ingest(tmp_path, original_name, content_hash=digest.hexdigest(), meta=meta)
+        return True, path
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False, f"Upload failed: {e}"
+
+# --- MEDIA CATALOG ---
+MEDIA_CATALOG_DIRS = [Path("."), MEDIA_LIBRARY_DIR]     # Folders offered in "Select Local Video"
+VIDEO_EXTENSIONS = ('.mp4', '.flv', '.avi', '.mov', '.mkv')
+CATALOG_RESCAN_INTERVAL = 60   # Seconds before re-statting an unchanged folder (catches in-place edits)
+CATALOG_PROBE_WORKERS = 2      # Concurrent ffprobe calls for new/changed files
+
+class MediaCatalog:
+    """Index of the videos in MEDIA_CATALOG_DIRS with cached ffprobe metadata.
+
+    refresh() only re-lists a folder when its mtime changed (a file was added,
+    removed or renamed) or CATALOG_RESCAN_INTERVAL passed. Files whose
+    (size, mtime, inode) signature is unchanged are not probed again; new or
+    changed files are probed in the background, so reads stay a single query.
+    """
+
+    def __init__(self, dirs=MEDIA_CATALOG_DIRS, db_path=DB_PATH):
+        self.dirs = [Path(d) for d in dirs]
+        self.db_path = db_path
+        self._dir_state = {}
+        self._probing = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=CATALOG_PROBE_WORKERS, thread_name_prefix="catalog-probe")
+
+    def refresh(self, force=False):
+        """Rescan folders that may have changed; returns the number of new/changed files"""
+        changed = 0
+        for directory in self.dirs:
+            try:
+                dir_mtime = os.stat(directory).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            previous = self._dir_state.get(directory)
+            if (not force and previous and previous[0] == dir_mtime
+                    and time.monotonic() - previous[1] < CATALOG_RESCAN_INTERVAL):
+                continue
+            changed += self._scan_dir(directory)
+            self._dir_state[directory] = (dir_mtime, time.monotonic())
+        return changed
+
+    def _scan_dir(self, directory):
+        conn = get_db(self.db_path)
+        known = {
+            path: (signature, probed_at)
+            for path, *signature, probed_at in conn.execute(
+                "SELECT path, size_bytes, mtime_ns, inode, probed_at FROM media_catalog WHERE dir = ?",
+                (str(directory),)
+            )
+        }
+        now = int(time.time() * 1000)
+        changed, unprobed, seen = [], [], set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(VIDEO_EXTENSIONS) or not entry.is_file():
+                    continue
+                path = os.path.normpath(entry.path)
+                stat = entry.stat()
+                signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+                seen.add(path)
+                previous = known.get(path)
+                if not previous or previous[0] != signature:
+                    changed.append((path, str(directory), entry.name, *signature, now))
+                elif previous[1] is None:
+                    unprobed.append(path)
+        
+        with conn:
+            conn.executemany('''
+                INSERT INTO media_catalog (path, dir, name, size_bytes, mtime_ns, inode, seen_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    size_bytes = excluded.size_bytes, mtime_ns = excluded.mtime_ns, inode = excluded.inode,
+                    seen_at = excluded.seen_at, duration = NULL, video_codec = NULL, audio_codec = NULL,
+                    width = NULL, height = NULL, probed_at = NULL
+            ''', changed)
+            conn.executemany(
+                "DELETE FROM media_catalog WHERE path = ?", [(path,) for path in set(known) - seen]
+            )
+        for path in [row[0] for row in changed] + unprobed:
+            self._queue_probe(path)
+        return len(changed)
+
+    def _queue_probe(self, path):
+        with self._lock:
+            if path in self._probing:
+                return
+            self._probing.add(path)
+        self._executor.submit(self._probe, path)
+
+    def _probe(self, path):
+        try:
+            meta = media_metadata(path)
+            conn = get_db(self.db_path)
+            with conn:
+                conn.execute('''
+                    UPDATE media_catalog
+                    SET duration = ?, video_codec = ?, audio_codec = ?, width = ?, height = ?, probed_at = ?
+                    WHERE path = ?
+                ''', (meta.get('duration'), meta.get('video_codec'), meta.get('audio_codec'),
+                      meta.get('width'), meta.get('height'), int(time.time() * 1000), path))
+        except Exception as e:
+            print(f"Catalog probe error for {path}: {e}", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._probing.discard(path)
+
+    def list_videos(self):
+        """Catalog entries as dicts; library files are labelled with their original name"""
+        rows = get_db(self.db_path).execute('''
+            SELECT c.path, COALESCE(m.original_name, c.name), c.size_bytes, c.duration,
+                   c.video_codec, c.audio_codec, c.width, c.height, c.probed_at IS NOT NULL,
+                   m.media_id IS NOT NULL
+            FROM media_catalog c
+            LEFT JOIN media_library m ON m.path = c.path
+            ORDER BY m.media_id IS NOT NULL, c.name
+        ''').fetchall()
+        return [{
+            'path': path, 'name': name, 'size_bytes': size_bytes, 'duration': duration,
+            'video_codec': video_codec, 'audio_codec': audio_codec, 'width': width, 'height': height,
+            'probed': bool(probed), 'in_library': bool(in_library)
+        } for path, name, size_bytes, duration, video_codec, audio_codec, width, height, probed, in_library in rows]
+
+def format_catalog_entry(entry):
+    """One-line label for the video selectbox"""
+    parts = [("📚 " if entry['in_library'] else "") + entry['name']]
+    if entry['duration']:
+        parts.append(str(timedelta(seconds=int(entry['duration']))))
+    if entry['video_codec']:
+        resolution = f" {entry['width']}x{entry['height']}" if entry['width'] else ""
+        parts.append(f"{entry['video_codec']}{resolution}")
+    elif not entry['probed']:
+        parts.append("probing…")
+    parts.append(f"{entry['size_bytes'] / (1024 * 1024):.0f} MB")
+    return " · ".join(parts)
+
+@st.cache_resource
+def get_media_catalog():
+    """Shared media catalog, kept alive across Streamlit reruns and sessions"""
+    return MediaCatalog()
+
+# --- DOWNLOAD JOBS (background queue) ---
+DOWNLOAD_WORKERS = 2            # Files downloaded concurrently
+DOWNLOAD_PERSIST_INTERVAL = 2   # Seconds between progress writes to download_jobs
+DOWNLOAD_RATE_WINDOW = 1.0      # Seconds between throughput samples
+
+def default_download_name(url, job_id):
+    """File name for a download: the URL's own name if it looks like a video"""
+    match = GDRIVE_FILE_RE.search(url)
+    if match:
+        return f"gdrive_{match.group(1)}.mp4"
+    name = os.path.basename(urllib.parse.urlparse(url).path)
+    if name.lower().endswith(('.mp4', '.flv', '.avi', '.mov', '.mkv')):
+        return name
+    return f"download_{job_id}.mp4"
+
+class DownloadManager:
+    """Download URLs on a worker pool; jobs are tracked in the download_jobs table.
+
+    Live progress (bytes, throughput, ETA) is kept in memory and written to the
+    table every few seconds. Jobs left queued/running by a previous process are
+    re-queued on startup and resume from their .part manifest. Finished files
+    are moved into the media library, and sources it already holds are not
+    downloaded again.
+    """
+
+    def __init__(self, library, workers=DOWNLOAD_WORKERS, download_dir=MEDIA_INCOMING_DIR, db_path=DB_PATH):
+        self.library = library
+        self.download_dir = Path(download_dir)
+        self.download_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.jobs = {}
+        self._cancel = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download-job")
+
+    def restore(self):
+        """Re-queue jobs interrupted by a restart; returns how many"""
+        rows = get_db(self.db_path).execute(
+            "SELECT id, url, dest, name FROM download_jobs WHERE state IN ('queued', 'running') ORDER BY created_at"
+        ).fetchall()
+        for job_id, url, dest, name in rows:
+            self._submit(job_id, url, dest, name or os.path.basename(dest))
+        return len(rows)
+
+    def enqueue(self, url, dest=None, sha256=None):
+        """Queue a download; returns (ok, job_id or error message)"""
+        url = url.strip()
+        if not url.lower().startswith(("http://", "https://")):
+            return False, "URL must start with http:// or https://"
+        with self._lock:
+            for job in self.jobs.values():
+                if job['url'] == url and job['state'] in ('queued', 'running', 'ingesting'):
+                    return False, f"Already downloading as job {job['id']}"
+        job_id = hashlib.sha1(f"{url}{time.time()}".encode()).hexdigest()[:10]
+        name = default_download_name(url, job_id)
+        now = int(time.time() * 1000)
+        
+        existing = self.library.find_source(download_source_key(url))
+        if existing:
+            # Already in the library: record a finished job instead of re-downloading
+            size = os.path.getsize(existing)
+            conn = get_db(self.db_path)
+            with conn:
+                conn.execute('''
+                    INSERT INTO download_jobs (id, url, dest, name, state, bytes_done, total_bytes,
+                                               created_at, updated_at, finished_at)
+                    VALUES (?, ?, ?, ?, 'done', ?, ?, ?, ?, ?)
+                ''', (job_id, url, existing, name, size, size, now, now, now))
+            return True, job_id
+        
+        dest = str(dest or self.download_dir / f"{job_id}_{name}")
+        conn = get_db(self.db_path)
+        with conn:
+            conn.execute('''
+                INSERT INTO download_jobs (id, url, dest, name, state, bytes_done, created_at, updated_at)
+                VALUES (?, ?, ?, ?, 'queued', 0, ?, ?)
+            ''', (job_id, url, dest, name, now, now))
+        self._submit(job_id, url, dest, name, sha256)
+        return True, job_id
+
+    def _submit(self, job_id, url, dest, name, sha256=None):
+        job = {
+            'id': job_id, 'url': url, 'dest': dest, 'name': name, 'state': 'queued', 'bytes_done': 0,
+            'total_bytes': None, 'rate_bps': None, 'eta_s': None, 'error': None
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+            self._cancel[job_id] = threading.Event()
+        self._executor.submit(self._run, job, sha256)
+
+    def _persist(self, job, finished=False):
+        now = int(time.time() * 1000)
+        conn = get_db(self.db_path)
+        with conn:
+            conn.execute('''
+                UPDATE download_jobs
+                SET state = ?, dest = ?, bytes_done = ?, total_bytes = ?, error = ?, updated_at = ?,
+                    finished_at = COALESCE(finished_at, ?)
+                WHERE id = ?
+            ''', (job['state'], job['dest'], job['bytes_done'], job['total_bytes'], job['error'], now,
+                  now if finished else None, job['id']))
+
+    def _run(self, job, sha256=None):
+        cancel_event = self._cancel[job['id']]
+        if cancel_event.is_set():
+            return
+        job['state'] = 'running'
+        self._persist(job)
+        sample = {'at': time.monotonic(), 'bytes': None, 'persisted': time.monotonic()}
+        
+        def on_progress(done, total):
+            job['bytes_done'], job['total_bytes'] = done, total
+            now = time.monotonic()
+            if sample['bytes'] is None:
+                # First callback of this run: resumed bytes don't count toward throughput
+                sample.update(at=now, bytes=done)
+            elif now - sample['at'] >= DOWNLOAD_RATE_WINDOW:
+                rate = (done - sample['bytes']) / (now - sample['at'])
+                job['rate_bps'] = rate if job['rate_bps'] is None else 0.7 * job['rate_bps'] + 0.3 * rate
+                job['eta_s'] = (total - done) / job['rate_bps'] if total and job['rate_bps'] else None
+                sample.update(at=now, bytes=done)
+            if now - sample['persisted'] >= DOWNLOAD_PERSIST_INTERVAL:
+                sample['persisted'] = now
+                self._persist(job)
+        
+        try:
+            try:
+                ChunkedDownloader(job['url'], job['dest'], sha256=sha256,
+                                  on_progress=on_progress, cancel_event=cancel_event).download()
+            except ValueError:
+                # Drive pages we can't fetch directly (e.g. quota warning) — let gdown handle it
+                if not GDRIVE_FILE_RE.search(job['url']):
+                    raise
+                gdown.download(job['url'], job['dest'], quiet=True, fuzzy=True, resume=True)
+            job['state'] = 'ingesting'
+            _, job['dest'] = self.library.ingest(job['dest'], job['name'], job['url'], sha256)
+            job.update(state='done', rate_bps=None, eta_s=0)
+            job['bytes_done'] = job['total_bytes'] = os.path.getsize(job['dest'])
+        except InterruptedError:
+            job.update(state='cancelled', rate_bps=None, eta_s=None)
+        except Exception as e:
+            job.update(state='failed', error=str(e), rate_bps=None, eta_s=None)
+            print(f"Download error for {job['url']}: {e}", file=sys.stderr)
+        self._persist(job, finished=True)
+
+    def cancel(self, job_id):
+        """Stop a queued/running job; its .part file is kept so it can be re-queued"""
+        event = self._cancel.get(job_id)
+        job = self.jobs.get(job_id)
+        if not event or not job or job['state'] not in ('queued', 'running'):
+            return False, f"Job {job_id} is not active"
+        event.set()
+        if job['state'] == 'queued':
+            job['state'] = 'cancelled'
+            self._persist(job, finished=True)
+        return True, f"Job {job_id} cancelled"
+
+    def active_count(self):
+        return sum(1 for job in self.jobs.values() if job['state'] in ('queued', 'running', 'ingesting'))
+
+    def list_jobs(self, limit=20):
+        """Recent jobs, newest first, with live throughput/ETA for active ones"""
+        rows = get_db(self.db_path).execute('''
+            SELECT id, url, dest, name, state, bytes_done, total_bytes, error
+            FROM download_jobs ORDER BY created_at DESC LIMIT ?
+        ''', (limit,)).fetchall()
+        jobs = []
+        for job_id, url, dest, name, state, bytes_done, total_bytes, error in rows:
+            job = dict(self.jobs.get(job_id) or {
+                'id': job_id, 'url': url, 'dest': dest, 'name': name or os.path.basename(dest),
+                'state': state, 'bytes_done': bytes_done,
+                'total_bytes': total_bytes, 'rate_bps': None, 'eta_s': None, 'error': error
+            })
+            jobs.append(job)
+        return jobs
+
+@st.cache_resource
+def get_download_manager():
+    """Shared download queue; resumes jobs interrupted by the last shutdown"""
+    manager = DownloadManager(get_media_library())
+    manager.restore()
+    return manager
+
+# --- RESOURCE MONITOR (admission control) ---
+MONITOR_INTERVAL = 2.0             # Seconds between psutil samples
+CPU_HEADROOM_PCT = 20              # Keep this much CPU free after admitting a stream
+RAM_HEADROOM_PCT = 10              # Refuse new streams above (100 - this)% RAM
+UPLINK_CAPACITY_MBPS = float(os.environ.get("UPLINK_CAPACITY_MBPS", 100))   # Server uplink capacity
+UPLINK_HEADROOM_PCT = 20           # Keep this much uplink free
+ENCODE_CPU_ESTIMATE = 100.0        # % of one core per encoding stream (until observed)
+PASSTHROUGH_CPU_ESTIMATE = 5.0     # % of one core per passthrough stream (until observed)
+STREAM_AUDIO_KBPS = 128            # Audio bitrate on top of the video bitrate of an encode
+
+def estimate_uplink_mbps(video_path, profile, passthrough):
+    """Uplink one stream will use; with -c copy that's the source's own bitrate"""
+    if passthrough:
+        probe = probe_video(video_path) or {}
+        bit_rate = probe.get('format', {}).get('bit_rate')
+        if bit_rate:
+            return float(bit_rate) / 1_000_000
+    return (profile.bitrate_kbps + STREAM_AUDIO_KBPS) / 1000
+
+class ResourceMonitor:
+    """Background psutil sampler for CPU, RAM, uplink and per-ffmpeg usage"""
+
+    def __init__(self, interval=MONITOR_INTERVAL):
+        self.interval = interval
+        self.cpu_count = psutil.cpu_count() or 1
+        self.pid_source = None     # Callable returning {pid: (stream_id, passthrough)}
+        self.listeners = []        # Callables run after each sample
+        self.latest = {'cpu': 0.0, 'ram': 0.0, 'tx_mbps': 0.0, 'processes': {}, 'time': None}
+        self.history = deque(maxlen=300)
+        self._procs = {}
+        self._thread = threading.Thread(target=self._run, name="resource-monitor", daemon=True)
+        self._thread.start()
+
+    def _sample_processes(self):
+        pids = self.pid_source() if self.pid_source else {}
+        stats = {}
+        for pid, (stream_id, passthrough) in pids.items():
+            try:
+                proc = self._procs.get(pid)
+                if proc is None:
+                    proc = self._procs[pid] = psutil.Process(pid)
+                    proc.cpu_percent(None)  # Prime the counter; first reading is 0
+                stats[stream_id] = {
+                    'pid': pid,
+                    'cpu': proc.cpu_percent(None),
+                    'rss_mb': proc.memory_info().rss / (1024 * 1024),
+                    'passthrough': passthrough
+                }
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self._procs.pop(pid, None)
+        for pid in list(self._procs):
+            if pid not in pids:
+                del self._procs[pid]
+        return stats
+
+    def _run(self):
+        psutil.cpu_percent(None)
+        last_sent = psutil.net_io_counters().bytes_sent
+        last_time = time.monotonic()
+        while True:
+            time.sleep(self.interval)
+            try:
+                now = time.monotonic()
+                sent = psutil.net_io_counters().bytes_sent
+                tx_mbps = (sent - last_sent) * 8 / (now - last_time) / 1_000_000
+                last_sent, last_time = sent, now
+                self.latest = {
+                    'cpu': psutil.cpu_percent(None),
+                    'ram': psutil.virtual_memory().percent,
+                    'tx_mbps': tx_mbps,
+                    'processes': self._sample_processes(),
+                    'time': datetime.now()
+                }
+                self.history.append((self.latest['time'], self.latest['cpu'], self.latest['ram'], tx_mbps))
+                for listener in self.listeners:
+                    listener()
+            except Exception as e:
+                print(f"Resource monitor error: {e}", file=sys.stderr)
+
+    def stream_cpu_estimate(self, passthrough):
+        """Expected system-wide CPU % for one more stream, from observed ffmpeg usage"""
+        observed = [p['cpu'] for p in self.latest['processes'].values() if p['passthrough'] == passthrough]
+        per_core = (sum(observed) / len(observed)) if observed else (
+            PASSTHROUGH_CPU_ESTIMATE if passthrough else ENCODE_CPU_ESTIMATE
         )
-        bind_response = bind_request.execute()
+        return per_core / self.cpu_count
+
+    def check_admission(self, uplink_mbps, passthrough, pending=()):
+        """Check whether another stream fits in the headroom; returns (ok, message).
+
+        `pending` lists (uplink_mbps, passthrough) for admitted streams that have
+        not shown up in a sample yet, so bursts of starts are not all admitted at once.
+        """
+        latest = self.latest
+        projected_cpu = latest['cpu'] + self.stream_cpu_estimate(passthrough)
+        projected_tx = latest['tx_mbps'] + uplink_mbps
+        for pending_uplink, pending_passthrough in pending:
+            projected_cpu += self.stream_cpu_estimate(pending_passthrough)
+            projected_tx += pending_uplink
         
+        cpu_limit = 100 - CPU_HEADROOM_PCT
+        tx_limit = UPLINK_CAPACITY_MBPS * (100 - UPLINK_HEADROOM_PCT) / 100
+        if projected_cpu > cpu_limit:
+            return False, f"CPU would reach {projected_cpu:.0f}% (limit {cpu_limit}%)"
+        if latest['ram'] > 100 - RAM_HEADROOM_PCT:
+            return False, f"RAM at {latest['ram']:.0f}% (limit {100 - RAM_HEADROOM_PCT}%)"
+        if projected_tx > tx_limit:
+            return False, f"Uplink would reach {projected_tx:.1f} Mbps (limit {tx_limit:.0f} Mbps)"
+        return True, "Resources available"
+
+@st.cache_resource
+def get_resource_monitor():
+    """Shared resource monitor, kept alive across Streamlit reruns and sessions"""
+    return ResourceMonitor()
+
+# --- STREAM SUPERVISOR ---
+MAX_STREAMS_PER_CORE = 1.0   # Encoding streams allowed per CPU core
+STREAM_COPY_COST = 0.1       # Passthrough streams cost a fraction of an encode
+STOP_TIMEOUT = 5             # Seconds to wait for ffmpeg to exit before killing
+STREAM_LOG_LINES = 200       # Recent log lines kept per stream for the live tail
+
+# Reconnect policy (jittered exponential backoff + circuit breaker)
+RESTART_BASE_DELAY = 2       # Seconds before the first reconnect
+RESTART_MAX_DELAY = 60       # Upper bound on the backoff delay
+RESTART_MAX_ATTEMPTS = 10    # Consecutive failures before giving up
+RESTART_STABLE_AFTER = 120   # Uptime (seconds) that resets the failure count
+RTMP_ERROR_RE = re.compile(
+    r'(Connection (reset|refused|timed out)|Broken pipe|I/O error|Input/output error|'
+    r'Failed to update header|Error writing trailer|RTMP_\w+|Server error|End of file)',
+    re.IGNORECASE
+)
+
+class LogRingBuffer:
+    """Fixed-capacity live log buffer with a monotonically increasing seq number.
+
+    One writer (the ffmpeg reader thread) and any number of readers. Entries are
+    (seq, line) tuples; deque.append and deque.copy are atomic under the GIL, so
+    neither side takes a lock and a reader never sees a half-written entry.
+    """
+
+    def __init__(self, capacity=STREAM_LOG_LINES):
+        self._entries = deque(maxlen=capacity)
+        self.seq = 0
+
+    def append(self, line):
+        seq = self.seq + 1
+        self._entries.append((seq, line))
+        self.seq = seq
+
+    def since(self, after_seq=0, limit=None):
+        """(last seq, lines with seq > after_seq) from one consistent snapshot"""
+        snapshot = self._entries.copy()
+        lines = [line for seq, line in snapshot if seq > after_seq]
+        if limit:
+            lines = lines[-limit:]
+        return (snapshot[-1][0] if snapshot else self.seq), lines
+
+    def latest(self, limit=50):
+        return self.since(0, limit)[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+def restart_delay(attempt):
+    """Jittered exponential backoff delay for the given attempt (1-based)"""
+    delay = min(RESTART_BASE_DELAY * (2 ** (attempt - 1)), RESTART_MAX_DELAY)
+    return delay * random.uniform(0.5, 1.5)
+
+class StreamHandle:
+    """One supervised ffmpeg stream and the config needed to (re)start it"""
+
+    def __init__(self, stream_id, video_path, stream_key, profile, log_callback=None,
+                 rtmp_url=None, session_id=None, passthrough=False, log_buffer=None):
+        self.stream_id = stream_id
+        self.video_path = video_path
+        self.stream_key = stream_key
+        self.profile = profile or EncodingProfile()
+        self.log_callback = log_callback
+        self.rtmp_url = rtmp_url
+        self.session_id = session_id
+        self.passthrough = passthrough
+        self.process = None
+        self.thread = None
+        self.state = 'starting'
+        self.started_at = None
+        self.ended_at = None
+        self.returncode = None
+        self.stop_requested = False
+        self.restarts = 0
+        self.downtime = 0.0
+        self.down_since = None
+        self.next_retry_at = None
+        self.rtmp_error = None
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()     # Guards state/process/stop_requested between _run and stop()
+        self.queued_at = None
+        self._uplink_mbps = None
+        self.log_buffer = log_buffer or LogRingBuffer()
+
+    def on_line(self, msg):
+        """Log callback wrapper that remembers the last RTMP/I-O error"""
+        if RTMP_ERROR_RE.search(msg):
+            self.rtmp_error = msg
+        self.log_buffer.append(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
+        if self.log_callback:
+            self.log_callback(msg)
+
+    def config(self):
+        """JSON-serializable start arguments (used to persist/restore streams)"""
         return {
-            "stream_key": stream_response['cdn']['ingestionInfo']['streamName'],
-            "stream_url": stream_response['cdn']['ingestionInfo']['ingestionAddress'],
-            "broadcast_id": broadcast_response['id'],
-            "stream_id": stream_response['id'],
-            "watch_url": f"https://www.youtube.com/watch?v={broadcast_response['id']}",
-            "studio_url": f"https://studio.youtube.com/video/{broadcast_response['id']}/livestreaming",
-            "broadcast_response": broadcast_response
+            'video_path': self.video_path,
+            'stream_key': self.stream_key,
+            'profile': self.profile.to_dict(),
+            'rtmp_url': self.rtmp_url,
+            'session_id': self.session_id,
+            'passthrough': self.passthrough
         }
-    except Exception as e:
-        st.error(f"Error creating live stream: {e}")
-        return None
 
-def get_existing_broadcasts(service, max_results=10):
-    """Get existing live broadcasts"""
-    try:
-        request = service.liveBroadcasts().list(
-            part="snippet,status,contentDetails",
-            mine=True,
-            maxResults=max_results,
-            broadcastStatus="all"
-        )
-        response = request.execute()
-        return response.get('items', [])
-    except Exception as e:
-        st.error(f"Error getting existing broadcasts: {e}")
-        return []
+    @property
+    def cost(self):
+        return STREAM_COPY_COST if self.passthrough else 1.0
 
-def get_broadcast_stream_key(service, broadcast_id):
-    """Get stream key for existing broadcast"""
-    try:
-        # Get broadcast details
-        broadcast_request = service.liveBroadcasts().list(
-            part="contentDetails",
-            id=broadcast_id
+    @property
+    def uplink_mbps(self):
+        if self._uplink_mbps is None:
+            self._uplink_mbps = estimate_uplink_mbps(self.video_path, self.profile, self.passthrough)
+        return self._uplink_mbps
+
+    @property
+    def is_live(self):
+        return self.state in ('starting', 'running', 'reconnecting')
+
+    @property
+    def is_active(self):
+        return self.is_live or self.state == 'queued'
+
+    def status(self):
+        uptime = None
+        if self.started_at:
+            uptime = ((self.ended_at or datetime.now()) - self.started_at).total_seconds()
+        return {
+            'stream_id': self.stream_id,
+            'state': self.state,
+            'pid': self.process.pid if self.process else None,
+            'video': os.path.basename(self.video_path),
+            'video_path': os.path.abspath(self.video_path),
+            'mode': "passthrough" if self.passthrough else self.profile.key(),
+            'started_at': self.started_at,
+            'uptime_s': int(uptime) if uptime is not None else None,
+            'returncode': self.returncode,
+            'session_id': self.session_id,
+            'restarts': self.restarts,
+            'downtime_s': round(self.downtime, 1),
+            'next_retry_at': self.next_retry_at
+        }
+
+class StreamSupervisor:
+    """Process-level registry of ffmpeg streams keyed by stream id"""
+
+    def __init__(self, max_streams=None, monitor=None):
+        self.max_streams = max_streams or max(1.0, (os.cpu_count() or 1) * MAX_STREAMS_PER_CORE)
+        self.streams = {}
+        self.monitor = monitor
+        self._lock = threading.Lock()
+        if monitor:
+            monitor.pid_source = self.pids
+            monitor.listeners.append(self._drain_queue)
+
+    def load(self):
+        """Current CPU budget used by live streams"""
+        return sum(h.cost for h in self.streams.values() if h.is_live)
+
+    def pids(self):
+        """Running ffmpeg PIDs mapped to (stream_id, passthrough)"""
+        return {
+            h.process.pid: (h.stream_id, h.passthrough)
+            for h in list(self.streams.values())
+            if h.process and h.process.poll() is None
+        }
+
+    def _admit(self, handle):
+        """Slot limit plus resource headroom check; returns (ok, message)"""
+        if self.load() + handle.cost > self.max_streams:
+            return False, f"Server at capacity: {self.load():.1f}/{self.max_streams:g} stream slots in use"
+        # The first stream is always admitted: waiting cannot free resources
+        if self.monitor and self.load() > 0:
+            pending = [
+                (h.uplink_mbps, h.passthrough) for h in self.streams.values()
+                if h.is_live and h.process is None
+            ]
+            return self.monitor.check_admission(handle.uplink_mbps, handle.passthrough, pending)
+        return True, "Admitted"
+
+    def start(self, stream_id, video_path, stream_key, profile=None, log_callback=None,
+              rtmp_url=None, session_id=None, passthrough=False, queue_if_busy=False):
+        """Start a stream, or queue it until resources free up; returns (ok, message)"""
+        with self._lock:
+            current = self.streams.get(stream_id)
+            if current and current.is_active:
+                return False, f"Stream {stream_id} is already running"
+            # Keep the same log buffer across restarts so viewers' seq cursors stay valid
+            handle = StreamHandle(
+                stream_id, video_path, stream_key, profile, log_callback,
+                rtmp_url, session_id, passthrough, current.log_buffer if current else None
+            )
+            admitted, reason = self._admit(handle)
+            if not admitted and not queue_if_busy:
+                return False, reason
+            self.streams[stream_id] = handle
+            if not admitted:
+                handle.state = 'queued'
+                handle.queued_at = datetime.now()
+                return True, f"Stream {stream_id} queued: {reason}"
+            self._launch(handle)
+        return True, f"Stream {stream_id} started"
+
+    def _drain_queue(self):
+        """Start queued streams (oldest first) while resources allow"""
+        with self._lock:
+            queued = sorted(
+                (h for h in self.streams.values() if h.state == 'queued'),
+                key=lambda h: h.queued_at
+            )
+            for handle in queued:
+                admitted, _ = self._admit(handle)
+                if not admitted:
+                    break
+                handle.state = 'starting'
+                self._log(handle, "INFO", "▶️ Resources available, starting queued stream")
+                self._launch(handle)
+
+    def _launch(self, handle):
+        handle.started_at = datetime.now()
+        handle.thread = threading.Thread(
+            target=self._run, args=(handle,), name=f"ffmpeg-{handle.stream_id}", daemon=True
         )
-        broadcast_response = broadcast_request.execute()
-        
-        if not broadcast_response['items']:
-            return None
+        handle.thread.start()
+
+    def _log(self, handle, log_type, msg):
+        handle.on_line(msg)
+        if handle.session_id:
+            get_log_writer().write(handle.session_id, log_type, msg, handle.video_path)
+
+    def _run(self, handle):
+        def on_process(process):
+            with handle.lock:
+                if handle.stop_requested:
+                    # stop() came in while ffmpeg was being spawned: it never saw
+                    # this process, so end it here instead of leaving it unsupervised
+                    process.kill()
+                    return
+                handle.process = process
+                handle.state = 'running'
+            handle.next_retry_at = None
+            if handle.down_since is not None:
+                handle.downtime += time.monotonic() - handle.down_since
+                handle.down_since = None
+                if handle.session_id:
+                    record_stream_restart(handle.session_id, handle.restarts, handle.downtime)
+
+        attempts = 0
+        while True:
+            with handle.lock:
+                if handle.stop_requested:
+                    handle.state = 'stopped'
+                    break
+            run_started = time.monotonic()
+            handle.rtmp_error = None
+            handle.returncode = run_ffmpeg(
+                handle.video_path, handle.stream_key, handle.profile, handle.on_line,
+                handle.rtmp_url, handle.session_id, handle.passthrough, on_process=on_process
+            )
+            exited_at = time.monotonic()
+            with handle.lock:
+                handle.process = None
+                if handle.stop_requested:
+                    handle.state = 'stopped'
+                    break
+                if handle.returncode == 0 and not handle.rtmp_error:
+                    handle.state = 'exited'
+                    break
             
-        stream_id = broadcast_response['items'][0]['contentDetails'].get('boundStreamId')
-        
-        if not stream_id:
-            return None
+            # Failure: reconnect unless the circuit breaker trips
+            if exited_at - run_started >= RESTART_STABLE_AFTER:
+                attempts = 0
+            attempts += 1
+            handle.down_since = exited_at
+            if attempts > RESTART_MAX_ATTEMPTS:
+                with handle.lock:
+                    handle.state = 'failed'
+                self._log(handle, "ERROR", (
+                    f"🛑 Giving up after {RESTART_MAX_ATTEMPTS} consecutive failures "
+                    f"(last: {handle.rtmp_error or f'exit code {handle.returncode}'})"
+                ))
+                if handle.session_id:
+                    record_stream_restart(handle.session_id, handle.restarts, handle.downtime, status='failed')
+                break
             
-        # Get stream details
-        stream_request = service.liveStreams().list(
-            part="cdn",
-            id=stream_id
+            delay = restart_delay(attempts)
+            with handle.lock:
+                if handle.stop_requested:
+                    handle.state = 'stopped'
+                    break
+                handle.state = 'reconnecting'
+            handle.next_retry_at = datetime.now() + timedelta(seconds=delay)
+            self._log(handle, "ERROR", (
+                f"🔁 Stream dropped ({handle.rtmp_error or f'exit code {handle.returncode}'}); "
+                f"reconnecting in {delay:.1f}s (attempt {attempts}/{RESTART_MAX_ATTEMPTS})"
+            ))
+            if handle.stop_event.wait(delay):
+                with handle.lock:
+                    handle.state = 'stopped'
+                break
+            handle.restarts += 1
+        
+        if handle.down_since is not None:
+            handle.downtime += time.monotonic() - handle.down_since
+            handle.down_since = None
+        handle.ended_at = datetime.now()
+
+    def stop(self, stream_id):
+        """Stop one stream (only its own ffmpeg process); returns (ok, message)"""
+        handle = self.streams.get(stream_id)
+        if not handle or not handle.is_active:
+            return False, f"Stream {stream_id} is not running"
+        with handle.lock:
+            handle.stop_requested = True
+            handle.stop_event.set()
+            # None while 'starting'/'reconnecting': _run sees stop_requested before
+            # spawning, or on_process kills the process it just spawned
+            process = handle.process
+        if process and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if handle.thread:
+            handle.thread.join(timeout=STOP_TIMEOUT)
+        with handle.lock:
+            handle.state = 'stopped'
+        return True, f"Stream {stream_id} stopped"
+
+    def all_status_with_usage(self):
+        """Stream status merged with the monitor's per-process CPU/RAM sample"""
+        usage = self.monitor.latest['processes'] if self.monitor else {}
+        rows = []
+        for status in self.all_status():
+            proc = usage.get(status['stream_id'], {})
+            status['cpu_pct'] = round(proc['cpu'], 1) if proc else None
+            status['rss_mb'] = round(proc['rss_mb'], 1) if proc else None
+            rows.append(status)
+        return rows
+
+    def restart(self, stream_id):
+        """Stop and start a stream again with the same config"""
+        handle = self.streams.get(stream_id)
+        if not handle:
+            return False, f"Stream {stream_id} not found"
+        if handle.is_active:
+            self.stop(stream_id)
+        return self.start(
+            stream_id, handle.video_path, handle.stream_key, handle.profile, handle.log_callback,
+            handle.rtmp_url, handle.session_id, handle.passthrough
         )
-        stream_response = stream_request.execute()
-        
-        if stream_response['items']:
-            stream_info = stream_response['items'][0]['cdn']['ingestionInfo']
-            return {
-                "stream_key": stream_info['streamName'],
-                "stream_url": stream_info['ingestionAddress'],
-                "stream_id": stream_id
-            }
+
+    def logs(self, stream_id, limit=50):
+        """Most recent log lines captured for a stream"""
+        handle = self.streams.get(stream_id)
+        return handle.log_buffer.latest(limit) if handle else []
+
+    def tail(self, stream_id, after_seq=0):
+        """(seq, new lines) since `after_seq`; seq is 0 for unknown streams"""
+        handle = self.streams.get(stream_id)
+        return handle.log_buffer.since(after_seq) if handle else (0, [])
+
+    def is_running(self, stream_id):
+        handle = self.streams.get(stream_id)
+        return bool(handle and handle.is_active)
+
+    def status(self, stream_id):
+        handle = self.streams.get(stream_id)
+        return handle.status() if handle else None
+
+    def all_status(self):
+        return [handle.status() for handle in self.streams.values()]
+
+@st.cache_resource
+def get_stream_supervisor():
+    """Shared stream supervisor, kept alive across Streamlit reruns and sessions"""
+    return StreamSupervisor(monitor=get_resource_monitor())
+
+# --- HEADLESS STREAM DAEMON ---
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8765
+DAEMON_URL = os.environ.get("STREAM_DAEMON_URL", f"http://{DAEMON_HOST}:{DAEMON_PORT}")
+DAEMON_TOKEN = os.environ.get("STREAM_DAEMON_TOKEN")
+DAEMON_PERSIST_INTERVAL = 5   # Seconds between stream state snapshots
+
+class StreamDaemon:
+    """Owns the supervisor in a standalone process and persists stream state"""
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self.supervisor = StreamSupervisor(monitor=get_resource_monitor())
+
+    def _save(self, stream_id, desired_state, config=None):
+        status = self.supervisor.status(stream_id) or {}
+        conn = get_db(self.db_path)
+        with conn:
+            if config is not None:
+                # The stream key lives in its own column, never in the config JSON
+                stored = {k: v for k, v in config.items() if k != 'stream_key'}
+                conn.execute('''
+                    INSERT OR REPLACE INTO daemon_streams
+                    (stream_id, config, stream_key, desired_state, state, pid, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (stream_id, json.dumps(stored), config['stream_key'], desired_state,
+                      status.get('state'), status.get('pid'), datetime.now().isoformat()))
+            else:
+                conn.execute('''
+                    UPDATE daemon_streams SET desired_state = ?, state = ?, pid = ?, updated_at = ?
+                    WHERE stream_id = ?
+                ''', (desired_state, status.get('state'), status.get('pid'),
+                      datetime.now().isoformat(), stream_id))
+
+    def start_stream(self, stream_id, config, queue_if_busy=False):
+        ok, message = self.supervisor.start(
+            stream_id, config['video_path'], config['stream_key'],
+            EncodingProfile.from_dict(config.get('profile')), None,
+            config.get('rtmp_url'), config.get('session_id'), config.get('passthrough', False),
+            queue_if_busy
+        )
+        if ok:
+            self._save(stream_id, 'running', config)
+        return ok, message
+
+    def stop_stream(self, stream_id):
+        ok, message = self.supervisor.stop(stream_id)
+        self._save(stream_id, 'stopped')
+        return ok, message
+
+    def restart_stream(self, stream_id):
+        ok, message = self.supervisor.restart(stream_id)
+        if ok:
+            self._save(stream_id, 'running')
+        return ok, message
+
+    def restore(self):
+        """Restart streams that were running when the daemon last exited"""
+        rows = get_db(self.db_path).execute(
+            "SELECT stream_id, config, stream_key FROM daemon_streams WHERE desired_state = 'running'"
+        ).fetchall()
+        for stream_id, config, stream_key in rows:
+            config = json.loads(config)
+            config.setdefault('stream_key', stream_key)
+            ok, message = self.start_stream(stream_id, config, queue_if_busy=True)
+            print(f"Restore {stream_id}: {message}", file=sys.stderr)
+
+    def persist_loop(self):
+        while True:
+            time.sleep(DAEMON_PERSIST_INTERVAL)
+            for status in self.supervisor.all_status():
+                try:
+                    desired = 'running' if status['state'] in ('starting', 'running', 'reconnecting', 'queued') else 'stopped'
+                    self._save(status['stream_id'], desired)
+                except Exception as e:
+                    print(f"Daemon persist error: {e}", file=sys.stderr)
+
+DAEMON_RTMP_SCHEMES = ('rtmp', 'rtmps')
+
+def daemon_video_allowed(video_path):
+    """Only videos the UI can offer: catalog folders, the library and the transcode cache"""
+    path = Path(video_path).resolve()
+    roots = {Path(root).resolve() for root in [*MEDIA_CATALOG_DIRS, TRANSCODE_CACHE_DIR]}
+    return path.parent in roots and path.suffix.lower() in VIDEO_EXTENSIONS and path.is_file()
+
+def validate_daemon_config(config):
+    """Error message for a start request the daemon must refuse, else None"""
+    if not isinstance(config, dict) or not config.get('video_path') or not config.get('stream_key'):
+        return "config needs video_path and stream_key"
+    if not daemon_video_allowed(config['video_path']):
+        return "video_path is outside the media folders"
+    rtmp_url = config.get('rtmp_url')
+    if rtmp_url and urllib.parse.urlparse(rtmp_url).scheme not in DAEMON_RTMP_SCHEMES:
+        return "rtmp_url must be an rtmp:// or rtmps:// URL"
+    return None
+
+def is_loopback_host(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """Local JSON control API for the stream daemon"""
+
+    server_version = "StreamDaemon/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, payload):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        if DAEMON_TOKEN and self.headers.get("X-Daemon-Token") != DAEMON_TOKEN:
+            self._send(401, {'error': 'unauthorized'})
+            return False
+        return True
+
+    def _int_param(self, query, name, default):
+        """Integer query parameter; sends 400 and returns None if it isn't one"""
+        try:
+            return int(query.get(name, [default])[0])
+        except ValueError:
+            self._send(400, {'error': f"{name} must be an integer"})
+            return None
+
+    def _route(self):
+        parsed = urllib.parse.urlparse(self.path)
+        parts = [urllib.parse.unquote(p) for p in parsed.path.strip("/").split("/") if p]
+        return parts, urllib.parse.parse_qs(parsed.query)
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        daemon = self.server.daemon
+        supervisor = daemon.supervisor
+        parts, query = self._route()
+        if parts == ["health"]:
+            self._send(200, {
+                'ok': True,
+                'load': supervisor.load(),
+                'max_streams': supervisor.max_streams,
+                'resources': supervisor.monitor.latest if supervisor.monitor else None
+            })
+        elif parts == ["streams"]:
+            self._send(200, supervisor.all_status_with_usage())
+        elif len(parts) == 2 and parts[0] == "streams":
+            status = supervisor.status(parts[1])
+            self._send(200 if status else 404, status or {'error': 'not found'})
+        elif len(parts) == 3 and parts[0] == "streams" and parts[2] == "logs":
+            limit = self._int_param(query, 'limit', 50)
+            if limit is not None:
+                self._send(200, supervisor.logs(parts[1], limit))
+        elif len(parts) == 3 and parts[0] == "streams" and parts[2] == "tail":
+            after = self._int_param(query, 'after', 0)
+            if after is not None:
+                seq, lines = supervisor.tail(parts[1], after)
+                self._send(200, {'seq': seq, 'lines': lines})
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        daemon = self.server.daemon
+        parts, _ = self._route()
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {'error': 'invalid JSON'})
+            return
         
-        return None
-    except Exception as e:
-        st.error(f"Error getting broadcast stream key: {e}")
-        return None
+        if parts == ["streams"]:
+            if not payload.get('stream_id') or not payload.get('config'):
+                self._send(400, {'error': 'stream_id and config are required'})
+                return
+            error = validate_daemon_config(payload['config'])
+            if error:
+                self._send(400, {'error': error})
+                return
+            ok, message = daemon.start_stream(
+                payload['stream_id'], payload['config'], payload.get('queue_if_busy', False)
+            )
+        elif len(parts) == 3 and parts[0] == "streams" and parts[2] == "stop":
+            ok, message = daemon.stop_stream(parts[1])
+        elif len(parts) == 3 and parts[0] == "streams" and parts[2] == "restart":
+            ok, message = daemon.restart_stream(parts[1])
+        else:
+            self._send(404, {'error': 'not found'})
+            return
+        self._send(200 if ok else 409, {'ok': ok, 'message': message})
 
-def run_ffmpeg(video_path, stream_key, is_shorts, log_callback, rtmp_url=None, session_id=None):
-    """Run FFmpeg for streaming with enhanced logging"""
-    output_url = rtmp_url or f"rtmp://a.rtmp.youtube.com/live2/{stream_key}"
-    scale = "-vf scale=720:1280" if is_shorts else ""
-    cmd = [
-        "ffmpeg", "-re", "-stream_loop", "-1", "-i", video_path,
-        "-c:v", "libx264", "-preset", "veryfast", "-b:v", "2500k",
-        "-maxrate", "2500k", "-bufsize", "5000k",
-        "-g", "60", "-keyint_min", "60",
-        "-c:a", "aac", "-b:a", "128k",
-        "-f", "flv"
-    ]
-    if scale:
-        cmd += scale.split()
-    cmd.append(output_url)
-    
-    start_msg = f"🚀 Starting FFmpeg: {' '.join(cmd[:8])}... [RTMP URL hidden for security]"
-    log_callback(start_msg)
-    if session_id:
-        log_to_database(session_id, "INFO", start_msg, video_path)
+def run_stream_daemon(host=DAEMON_HOST, port=DAEMON_PORT):
+    """Run the headless stream daemon until interrupted"""
+    if not is_loopback_host(host) and not DAEMON_TOKEN:
+        raise SystemExit(f"Refusing to listen on {host} without STREAM_DAEMON_TOKEN set")
+    init_database()
+    get_retention_engine()
+    daemon = StreamDaemon()
+    daemon.restore()
+    threading.Thread(target=daemon.persist_loop, name="daemon-persist", daemon=True).start()
     
+    server = ThreadingHTTPServer((host, port), DaemonRequestHandler)
+    server.daemon = daemon
+    print(f"Stream daemon listening on http://{host}:{port}", file=sys.stderr)
     try:
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        for line in process.stdout:
-            log_callback(line.strip())
-            if session_id:
-                log_to_database(session_id, "FFMPEG", line.strip(), video_path)
-        process.wait()
-        
-        end_msg = "✅ Streaming completed successfully"
-        log_callback(end_msg)
-        if session_id:
-            log_to_database(session_id, "INFO", end_msg, video_path)
-            
-    except Exception as e:
-        error_msg = f"❌ FFmpeg Error: {e}"
-        log_callback(error_msg)
-        if session_id:
-            log_to_database(session_id, "ERROR", error_msg, video_path)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
     finally:
-        final_msg = "⏹️ Streaming session ended"
-        log_callback(final_msg)
-        if session_id:
-            log_to_database(session_id, "INFO", final_msg, video_path)
+        server.server_close()
+        get_log_writer().close()
+
+class StreamDaemonClient:
+    """HTTP client for the stream daemon with the StreamSupervisor interface the UI uses"""
+
+    ACTIVE_STATES = ('starting', 'running', 'reconnecting', 'queued')
+
+    def __init__(self, url=DAEMON_URL, token=DAEMON_TOKEN, timeout=5):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        if token:
+            self.session.headers["X-Daemon-Token"] = token
+        self.max_streams = 0
+        self._load = 0.0
+
+    def _request(self, method, path, payload=None, timeout=None):
+        """(status code, JSON body); (None, {'error': ...}) if the daemon can't be reached"""
+        try:
+            response = self.session.request(
+                method, f"{self.url}{path}", json=payload, timeout=timeout or self.timeout
+            )
+            return response.status_code, response.json()
+        except (requests.RequestException, ValueError) as e:
+            return None, {'error': f"Stream daemon unreachable: {e}"}
+
+    @staticmethod
+    def _parse_status(status):
+        for field in ('started_at', 'next_retry_at'):
+            if status.get(field):
+                status[field] = datetime.fromisoformat(status[field])
+        return status
+
+    def available(self):
+        """Health check; also refreshes capacity figures"""
+        code, health = self._request("GET", "/health", timeout=0.5)
+        if code != 200:
+            return False
+        self.max_streams = health['max_streams']
+        self._load = health['load']
+        return True
+
+    def load(self):
+        return self._load
+
+    def start(self, stream_id, video_path, stream_key, profile=None, log_callback=None,
+              rtmp_url=None, session_id=None, passthrough=False, queue_if_busy=False):
+        config = {
+            'video_path': os.path.abspath(video_path),
+            'stream_key': stream_key,
+            'profile': (profile or EncodingProfile()).to_dict(),
+            'rtmp_url': rtmp_url,
+            'session_id': session_id,
+            'passthrough': passthrough
+        }
+        _, result = self._request("POST", "/streams", {
+            'stream_id': stream_id, 'config': config, 'queue_if_busy': queue_if_busy
+        })
+        return result.get('ok', False), result.get('message') or result.get('error')
+
+    def stop(self, stream_id):
+        _, result = self._request("POST", f"/streams/{urllib.parse.quote(stream_id)}/stop")
+        return result.get('ok', False), result.get('message') or result.get('error')
+
+    def restart(self, stream_id):
+        _, result = self._request("POST", f"/streams/{urllib.parse.quote(stream_id)}/restart")
+        return result.get('ok', False), result.get('message') or result.get('error')
+
+    def status(self, stream_id):
+        code, status = self._request("GET", f"/streams/{urllib.parse.quote(stream_id)}")
+        return self._parse_status(status) if code == 200 else None
+
+    def is_running(self, stream_id):
+        status = self.status(stream_id)
+        return bool(status and status['state'] in self.ACTIVE_STATES)
+
+    def all_status_with_usage(self):
+        code, streams = self._request("GET", "/streams")
+        return [self._parse_status(status) for status in streams] if code == 200 else []
+
+    def all_status(self):
+        return self.all_status_with_usage()
+
+    def logs(self, stream_id, limit=50):
+        code, lines = self._request("GET", f"/streams/{urllib.parse.quote(stream_id)}/logs?limit={limit}")
+        return lines if code == 200 else []
+
+    def tail(self, stream_id, after_seq=0):
+        code, data = self._request("GET", f"/streams/{urllib.parse.quote(stream_id)}/tail?after={after_seq}")
+        return (data['seq'], data['lines']) if code == 200 else (0, [])
+
+@st.cache_resource
+def get_stream_daemon_client():
+    return StreamDaemonClient()
+
+def get_stream_backend():
+    """Stream daemon client when the daemon is running, else the in-process supervisor"""
+    client = get_stream_daemon_client()
+    if client.available():
+        return client
+    return get_stream_supervisor()
+
+def make_stream_id(stream_key, rtmp_url=None):
+    """Stable stream id derived from the ingest target.
+
+    Unlike the Streamlit session id it survives a browser refresh or a UI
+    restart, and one ingest target can only carry one ffmpeg anyway.
+    """
+    digest = hashlib.sha256(f"{rtmp_url or ''}|{stream_key}".encode()).hexdigest()[:12]
+    return f"stream_{digest}"
+
+STREAM_UI_ADMIN = os.environ.get("STREAM_UI_ADMIN") == "1"   # Lets every viewer attach to/stop any stream
+
+def attach_stream(stream_id, own=False):
+    """Point this browser session at a stream (kept in the URL so a refresh keeps it).
+
+    `own` marks streams this browser session started; only those (or, for
+    admins, any stream) get attach/stop controls in the Server Streams panel.
+    The session's own session_id is never replaced, so attaching can't take
+    over another viewer's log session.
+    """
+    st.session_state['stream_id'] = stream_id
+    st.query_params['stream'] = stream_id
+    if own:
+        st.session_state.setdefault('own_streams', set()).add(stream_id)
+
+def detach_stream():
+    st.session_state.pop('stream_id', None)
+    if 'stream' in st.query_params:
+        del st.query_params['stream']
+
+def can_control_stream(stream_id):
+    return STREAM_UI_ADMIN or stream_id in st.session_state.get('own_streams', set())
+
+def restore_attached_stream(backend):
+    """Reattach after a browser refresh from the ?stream= URL parameter only"""
+    if st.session_state.get('stream_id'):
+        return
+    from_url = st.query_params.get('stream')
+    if from_url and backend.status(from_url):
+        attach_stream(from_url)
+
+# --- LIVE PANELS ---
+LIVE_REFRESH_INTERVAL = 2   # Seconds between live panel refreshes while streaming
+LIVE_TAIL_LINES = 50        # Lines shown in the live log tail
+
+def live_fragment(fn, live, *args):
+    """Run `fn` as a Streamlit fragment that re-runs on its own while `live`.
+
+    Only the fragment re-executes on each tick, not the whole script.
+    """
+    return st.fragment(fn, run_every=LIVE_REFRESH_INTERVAL if live else None)(*args)
+
+def render_stream_status(supervisor, stream_id, live=False):
+    """LIVE/OFFLINE badge, reconnect info and server resource metrics"""
+    stream_status = supervisor.status(stream_id) if stream_id else None
+    running = bool(stream_status and stream_status['state'] in StreamDaemonClient.ACTIVE_STATES)
+    if live and not running:
+        # Stream ended while ticking: one full rerun refreshes buttons and stops the timers
+        st.rerun()
+    if stream_status and stream_status['state'] == 'queued':
+        st.warning("⏳ QUEUED — waiting for server resources")
+    elif running:
+        st.error("🔴 LIVE")
+        
+        # Live stats
+        if stream_status['started_at']:
+            duration = datetime.now() - stream_status['started_at']
+            st.metric("⏱️ Duration", str(duration).split('.')[0])
+        if stream_status['state'] == 'reconnecting':
+            st.warning(f"🔁 Reconnecting at {stream_status['next_retry_at'].strftime('%H:%M:%S')}")
+        if stream_status['restarts']:
+            st.caption(f"Reconnects: {stream_status['restarts']} · Downtime: {stream_status['downtime_s']:.0f}s")
+    else:
+        st.success("⚫ OFFLINE")
+        if stream_status and stream_status['state'] == 'failed':
+            st.warning(f"⚠️ Last stream exited with code {stream_status['returncode']}")
+    
+    # Server resources
+    monitor = get_resource_monitor()
+    col_res1, col_res2, col_res3 = st.columns(3)
+    col_res1.metric("🧠 CPU", f"{monitor.latest['cpu']:.0f}%")
+    col_res2.metric("💾 RAM", f"{monitor.latest['ram']:.0f}%")
+    col_res3.metric("📤 Uplink", f"{monitor.latest['tx_mbps']:.1f} Mbps")
+
+def render_encoder_health(session_id):
+    """Latest ffmpeg progress sample (falls back to the last persisted one)"""
+    metrics = get_metrics_registry().get(session_id)
+    if metrics:
+        latest = metrics[-1]
+        col_m1, col_m2 = st.columns(2)
+        with col_m1:
+            st.metric("🎞️ FPS", f"{latest.fps:.1f}" if latest.fps is not None else "N/A")
+            st.metric("⚡ Speed", f"{latest.speed:.2f}x" if latest.speed is not None else "N/A")
+        with col_m2:
+            st.metric("📊 Bitrate", f"{latest.bitrate_kbps:.0f} kbps" if latest.bitrate_kbps is not None else "N/A")
+            st.metric("🧊 Dropped / Dup", f"{latest.drop_frames or 0} / {latest.dup_frames or 0}")
+    else:
+        persisted = get_stream_metrics(session_id, 1)
+        if persisted:
+            timestamp, frame, fps, bitrate_kbps, speed, dup_frames, drop_frames, out_time_ms = persisted[0]
+            st.caption(f"Last sample {timestamp[:19]}: fps={fps} bitrate={bitrate_kbps}kbps speed={speed}x drop={drop_frames}")
+
+def render_live_log_tail(supervisor, stream_id):
+    """Incremental log tail: each tick fetches only lines after the last seq seen"""
+    if not stream_id:
+        st.info("No live logs available. Start streaming to see real-time logs.")
+        return
+    tail_key = f"live_tail_{stream_id}"
+    if tail_key not in st.session_state:
+        st.session_state[tail_key] = {'seq': 0, 'lines': deque(maxlen=LIVE_TAIL_LINES)}
+    tail_state = st.session_state[tail_key]
+    
+    seq, new_lines = supervisor.tail(stream_id, tail_state['seq'])
+    if seq < tail_state['seq']:
+        # Stream was restarted from scratch (new handle) — start over
+        tail_state['lines'].clear()
+        seq, new_lines = supervisor.tail(stream_id, 0)
+    tail_state['lines'].extend(new_lines)
+    tail_state['seq'] = seq
+    
+    if tail_state['lines']:
+        st.code("\n".join(tail_state['lines']), language=None)
+    else:
+        st.info("No live logs available. Start streaming to see real-time logs.")
+
+def render_download_jobs(manager, live=False):
+    """Progress table for background downloads; reruns the page when one finishes"""
+    if live and manager.active_count() == 0:
+        # Last job finished, failed or was cancelled: one full rerun stops the timer
+        st.rerun()
+    jobs = manager.list_jobs(10)
+    if not jobs:
+        return
+    done_ids = {job['id'] for job in jobs if job['state'] == 'done'}
+    seen_done = st.session_state.setdefault('downloads_seen_done', set(done_ids))
+    if done_ids - seen_done:
+        # New file in the library: make it the active video and rerun the page
+        newest = next(job for job in jobs if job['id'] in done_ids - seen_done)
+        st.session_state['library_video'] = newest['dest']
+        seen_done.update(done_ids)
+        st.rerun()
+    
+    st.dataframe([{
+        'File': job['name'],
+        'State': job['state'],
+        'Progress': 100.0 * job['bytes_done'] / job['total_bytes'] if job['total_bytes'] else 0.0,
+        'MB': round(job['bytes_done'] / (1024 * 1024), 1),
+        'MB/s': round(job['rate_bps'] / (1024 * 1024), 2) if job['rate_bps'] else None,
+        'ETA': str(timedelta(seconds=int(job['eta_s']))) if job['eta_s'] else None,
+        'Error': job['error']
+    } for job in jobs], hide_index=True, use_container_width=True, column_config={
+        'Progress': st.column_config.ProgressColumn("Progress", min_value=0.0, max_value=100.0, format="%.0f%%")
+    })
+    
+    active = [job['id'] for job in jobs if job['state'] in ('queued', 'running')]
+    if active:
+        col_dl1, col_dl2 = st.columns([3, 1])
+        cancel_id = col_dl1.selectbox("Active job", active, label_visibility="collapsed",
+                                      format_func=lambda job_id: next(
+                                          job['name'] for job in jobs if job['id'] == job_id))
+        if col_dl2.button("✖️ Cancel"):
+            ok, message = manager.cancel(cancel_id)
+            (st.success if ok else st.error)(message)
 
 def auto_process_auth_code():
     """Automatically process authorization code from URL"""
@@ -634,7 +4318,7 @@ def auto_process_auth_code():
                         # Test the connection
                         service = create_youtube_service(creds_dict)
                         if service:
-                            channels = get_channel_info(service)
+                            channels = get_channel_info(service, fresh=True)
                             if channels:
                                 channel = channels[0]
                                 st.session_state['youtube_service'] = service
@@ -659,8 +4343,22 @@ def auto_process_auth_code():
             else:
                 st.error("❌ OAuth configuration not found. Please upload OAuth JSON first.")
 
-def get_youtube_categories():
-    """Get YouTube video categories"""
+def get_youtube_categories(service=None, region_code="US"):
+    """Get YouTube video categories (live list from the API when a service is given)"""
+    if service:
+        try:
+            response = cached_youtube_call(
+                service, "categories", (region_code,),
+                service.videoCategories().list(part="snippet", regionCode=region_code).execute
+            )
+            categories = {
+                item['id']: item['snippet']['title']
+                for item in response.get('items', []) if item['snippet'].get('assignable')
+            }
+            if "20" in categories:
+                return categories
+        except Exception as e:
+            print(f"Category fetch failed, using defaults: {e}", file=sys.stderr)
     return {
         "1": "Film & Animation",
         "2": "Autos & Vehicles", 
@@ -679,35 +4377,30 @@ def get_youtube_categories():
     }
 
 # Fungsi untuk auto start streaming
-def auto_start_streaming(video_path, stream_key, is_shorts=False, custom_rtmp=None, session_id=None):
+def auto_start_streaming(video_path, stream_key, profile=None, custom_rtmp=None, session_id=None, passthrough=False, queue_if_busy=False):
     """Auto start streaming dengan konfigurasi default"""
     if not video_path or not stream_key:
         st.error("❌ Video atau stream key tidak ditemukan!")
         return False
     
-    # Set session state untuk streaming
-    st.session_state['streaming'] = True
-    st.session_state['stream_start_time'] = datetime.now()
-    st.session_state['live_logs'] = []
-    
-    def log_callback(msg):
-        if 'live_logs' not in st.session_state:
-            st.session_state['live_logs'] = []
-        st.session_state['live_logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
-        # Keep only last 100 logs in memory
-        if len(st.session_state['live_logs']) > 100:
-            st.session_state['live_logs'] = st.session_state['live_logs'][-100:]
-    
-    # Jalankan FFmpeg di thread terpisah
-    st.session_state['ffmpeg_thread'] = threading.Thread(
-        target=run_ffmpeg, 
-        args=(video_path, stream_key, is_shorts, log_callback, custom_rtmp or None, session_id), 
-        daemon=True
+    # Jalankan FFmpeg lewat supervisor (atau daemon jika aktif)
+    # Live logs go to the stream's ring buffer; viewers read it via supervisor.tail()
+    stream_id = make_stream_id(stream_key, custom_rtmp)
+    ok, message = get_stream_backend().start(
+        stream_id, video_path, stream_key, profile, None,
+        custom_rtmp or None, session_id, passthrough, queue_if_busy
     )
-    st.session_state['ffmpeg_thread'].start()
+    if not ok:
+        st.error(f"❌ {message}")
+        log_to_database(session_id, "ERROR", message, video_path)
+        return False
+    
+    attach_stream(stream_id, own=True)
+    record_session_stream(session_id, stream_id)
     
     # Log ke database
     log_to_database(session_id, "INFO", f"Auto streaming started: {video_path}")
+    get_media_library().touch(video_path)
     return True
 
 # Fungsi untuk auto create live broadcast dengan setting manual/otomatis
@@ -770,13 +4463,12 @@ def main():
     
     # Initialize database
     init_database()
+    get_retention_engine()
     
     # Initialize session state
     if 'session_id' not in st.session_state:
         st.session_state['session_id'] = f"session_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
     
-    if 'live_logs' not in st.session_state:
-        st.session_state['live_logs'] = []
     
     st.title("🎥 Advanced YouTube Live Streaming Platform")
     st.markdown("---")
@@ -809,7 +4501,7 @@ def main():
                         service = create_youtube_service(channel['auth'])
                         if service:
                             # Verify the authentication is still valid
-                            channels = get_channel_info(service)
+                            channels = get_channel_info(service, fresh=True)
                             if channels:
                                 channel_info = channels[0]
                                 st.session_state['youtube_service'] = service
@@ -886,7 +4578,7 @@ def main():
                                 # Test the connection
                                 service = create_youtube_service(creds_dict)
                                 if service:
-                                    channels = get_channel_info(service)
+                                    channels = get_channel_info(service, fresh=True)
                                     if channels:
                                         channel = channels[0]
                                         st.success(f"🎉 Connected to: {channel['snippet']['title']}")
@@ -934,20 +4626,102 @@ def main():
         
         with col_log2:
             if st.button("🗑️ Clear Session Logs"):
-                st.session_state['live_logs'] = []
+                # Only this viewer's tail is reset; the stream's buffer is shared
+                tail_state = st.session_state.get(f"live_tail_{st.session_state.get('stream_id')}")
+                if tail_state:
+                    tail_state['lines'].clear()
                 st.success("Logs cleared!")
         
-        # Export logs
-        if st.button("📥 Export All Logs"):
-            all_logs = get_logs_from_database(limit=1000)
-            if all_logs:
-                logs_text = "\n".join([f"[{log[0]}] {log[1]}: {log[2]}" for log in all_logs])
-                st.download_button(
-                    label="💾 Download Logs",
-                    data=logs_text,
-                    file_name=f"streaming_logs_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-                    mime="text/plain"
+        # Database size / retention
+        with st.expander("🗄️ Database"):
+            stats = get_database_stats()
+            if stats:
+                st.metric("DB Size", f"{stats['db_bytes'] / (1024 * 1024):.1f} MB",
+                          help=f"Free pages: {stats['free_bytes'] / (1024 * 1024):.1f} MB · "
+                               f"WAL: {stats['wal_bytes'] / (1024 * 1024):.1f} MB")
+                st.dataframe(
+                    [{'Type': log_type, 'Rows': count} for log_type, count in stats['log_types']]
+                    + [{'Type': 'rollups (per minute)', 'Rows': stats['rollup_rows']},
+                       {'Type': 'stream_metrics', 'Rows': stats['metric_rows']}],
+                    hide_index=True, use_container_width=True
                 )
+            retention = get_retention_engine()
+            if retention.last_run:
+                st.caption(f"Last cleanup {retention.last_run.strftime('%H:%M:%S')}: "
+                           + ", ".join(f"{k} -{v}" for k, v in retention.last_result.items()))
+            if st.button("🧹 Run Cleanup Now"):
+                retention.run_once()
+                st.rerun()
+            if not retention.incremental_vacuum:
+                st.caption("Free space is not returned to disk until the database is converted "
+                           "to incremental vacuum (one-time, blocks logging while it runs).")
+                if st.button("🗜️ Convert Now"):
+                    retention.ensure_incremental_vacuum(force=True)
+                    st.rerun()
+        
+        # YouTube Data API quota (units reset at midnight Pacific)
+        with st.expander("📈 YouTube API Quota"):
+            used_units, quota_rows = get_youtube_quota_usage()
+            st.progress(min(used_units / YOUTUBE_DAILY_QUOTA, 1.0),
+                        text=f"{used_units:,} / {YOUTUBE_DAILY_QUOTA:,} units today")
+            if quota_rows:
+                st.dataframe(
+                    [{'Method': method.replace("youtube.", ""), 'Calls': calls, 'Units': units}
+                     for method, calls, units in quota_rows],
+                    hide_index=True, use_container_width=True
+                )
+            st.caption(f"Cached responses: {len(get_youtube_response_cache())}")
+            if 'youtube_service' in st.session_state:
+                st.caption(f"Reusable stream keys: {count_pooled_streams(st.session_state['youtube_service'])}")
+            if st.button("♻️ Clear API Cache"):
+                get_youtube_response_cache().clear()
+                st.rerun()
+        
+        # Export logs
+        with st.expander("📥 Export Logs"):
+            export_fmt = st.selectbox("Format", list(EXPORT_FORMATS), key="export_fmt",
+                                      format_func=lambda fmt: EXPORT_FORMATS[fmt][0])
+            export_scope = st.selectbox("Session", ["All sessions", "Current session"], key="export_scope")
+            export_type = st.selectbox("Type", ["All", "INFO", "ERROR", "FFMPEG"], key="export_type")
+            export_range = st.date_input(
+                "Date range", value=(datetime.now().date() - timedelta(days=30), datetime.now().date()),
+                key="export_range"
+            )
+            if st.button("📦 Prepare Export"):
+                since_ms = until_ms = None
+                if isinstance(export_range, (list, tuple)) and len(export_range) == 2:
+                    since_ms = int(datetime.combine(export_range[0], datetime.min.time()).timestamp() * 1000)
+                    until_ms = int(datetime.combine(export_range[1] + timedelta(days=1), datetime.min.time()).timestamp() * 1000)
+                try:
+                    with st.spinner("Exporting logs..."):
+                        path, count = export_logs(
+                            export_fmt,
+                            session_id=st.session_state['session_id'] if export_scope == "Current session" else None,
+                            log_type=None if export_type == "All" else export_type,
+                            since_ms=since_ms,
+                            until_ms=until_ms
+                        )
+                    st.session_state['export_file'] = (str(path), count, export_fmt)
+                except ImportError:
+                    st.error("Parquet export needs pyarrow (pip install pyarrow)")
+                except Exception as e:
+                    st.error(f"Error exporting logs: {e}")
+            
+            if st.session_state.get('export_file'):
+                path, count, fmt = st.session_state['export_file']
+                if os.path.exists(path):
+                    st.caption(f"{count:,} rows · {os.path.getsize(path) / (1024 * 1024):.1f} MB")
+                    # Deferred data: the file is read only when the button is clicked,
+                    # not on every rerun; the old export is forgotten after download
+                    st.download_button(
+                        label="💾 Download Logs",
+                        data=lambda: Path(path).read_bytes(),
+                        file_name=os.path.basename(path),
+                        mime=EXPORT_FORMATS[fmt][2],
+                        on_click=lambda: st.session_state.pop('export_file', None)
+                    )
+                else:
+                    st.session_state.pop('export_file', None)
     
     # Main content area
     col1, col2 = st.columns([2, 1])
@@ -956,61 +4730,120 @@ def main():
         st.header("🎥 Video Source")
         
         # 1. Local Selection
-        video_files = [f for f in os.listdir('.') if f.endswith(('.mp4', '.flv', '.avi', '.mov', '.mkv'))]
-        selected_video = st.selectbox("Select Local Video", ["-- Select --"] + video_files)
+        catalog = get_media_catalog()
+        catalog.refresh()
+        catalog_videos = {entry['path']: entry for entry in catalog.list_videos()}
+        selected_video = st.selectbox(
+            "Select Local Video", ["-- Select --"] + list(catalog_videos),
+            format_func=lambda option: format_catalog_entry(catalog_videos[option]) if option in catalog_videos else option
+        )
+        with st.expander(f"📚 Media Catalog ({len(catalog_videos)} files)"):
+            if catalog_videos:
+                st.dataframe([{
+                    'Name': entry['name'],
+                    'Duration': str(timedelta(seconds=int(entry['duration']))) if entry['duration'] else None,
+                    'Video': entry['video_codec'],
+                    'Resolution': f"{entry['width']}x{entry['height']}" if entry['width'] else None,
+                    'Audio': entry['audio_codec'],
+                    'Size (MB)': round(entry['size_bytes'] / (1024 * 1024), 1),
+                    'Path': entry['path']
+                } for entry in catalog_videos.values()], hide_index=True, use_container_width=True)
+            if st.button("🔄 Rescan Folders"):
+                catalog.refresh(force=True)
+                st.rerun()
         
         # 2. Smart Downloader (GDrive)
         st.markdown("---")
         st.write("🔗 **Smart Downloader (Google Drive 1GB+ Support):**")
         url_input = st.text_input("Paste URL (Direct/GDrive)", key="dl_url")
+        download_manager = get_download_manager()
         if st.button("⬇️ Download ke Server"):
             if url_input:
-                try:
-                    with st.spinner("⏳ Mendownload file besar (menggunakan gdown)..."):
-                        save_path = "downloaded_video.mp4"
-                        gdrive_match = re.search(r'drive\.google\.com\/file\/d\/([a-zA-Z0-9_-]+)', url_input)
-                        
-                        if gdrive_match:
-                            file_id = gdrive_match.group(1)
-                            if os.path.exists(save_path): os.remove(save_path)
-                            url = f'https://drive.google.com/uc?id={file_id}'
-                            gdown.download(url, save_path, quiet=False, fuzzy=True)
-                        else:
-                            resp = requests.get(url_input, stream=True)
-                            with open(save_path, 'wb') as f:
-                                for chunk in resp.iter_content(chunk_size=1024*1024):
-                                    if chunk: f.write(chunk)
-                        
-                        if os.path.exists(save_path):
-                            sz = os.path.getsize(save_path)/(1024*1024)
-                            st.success(f"✅ Download Sukses! Ukuran: {sz:.2f} MB")
-                            st.rerun()
-                        else: st.error("Gagal.")
-                except Exception as e: st.error(f"Error: {e}")
+                ok, result = download_manager.enqueue(url_input)
+                if ok:
+                    st.success(f"📥 Download queued (job {result})")
+                else:
+                    st.error(f"❌ {result}")
+        
+        downloads_live = download_manager.active_count() > 0
+        live_fragment(render_download_jobs, downloads_live, download_manager, downloads_live)
 
         # 3. Manual Upload (Chunked)
         st.markdown("---")
-        uploaded_file = st.file_uploader("Upload Manual (Max 200MB)", type=['mp4', 'mkv'])
+        upload_nonce = st.session_state.setdefault('upload_nonce', 0)
+        uploaded_file = st.file_uploader("Upload Manual (Max 2GB)", type=['mp4', 'mkv'], key=f"upload_{upload_nonce}")
         if uploaded_file:
             with st.spinner("Saving..."):
-                with open(uploaded_file.name, "wb") as f:
-                    while True:
-                        chunk = uploaded_file.read(5*1024*1024)
-                        if not chunk: break
-                        f.write(chunk)
-            st.success("Uploaded!")
+                ok, result = ingest_upload(uploaded_file, get_media_library())
+            if ok:
+                st.session_state['library_video'] = result
+            else:
+                st.session_state['upload_error'] = result
+            # Fresh uploader key: Streamlit drops its in-memory copy and
+            # the next rerun doesn't see (and re-ingest) the same file
+            st.session_state['upload_nonce'] = upload_nonce + 1
             st.rerun()
+        if st.session_state.get('upload_error'):
+            st.error(f"❌ {st.session_state.pop('upload_error')}")
 
         # Determine Active Video
         active_video = None
         if selected_video != "-- Select --": active_video = selected_video
-        elif os.path.exists("downloaded_video.mp4"): active_video = "downloaded_video.mp4"
-        elif uploaded_file: active_video = uploaded_file.name
+        elif st.session_state.get('library_video'): active_video = st.session_state['library_video']
         
-        if active_video and os.path.exists(active_video):
-            sz = os.path.getsize(active_video)/(1024*1024)
-            st.success(f"🎬 Active: **{active_video}** ({sz:.2f} MB)")
+        active_entry = catalog_videos.get(os.path.normpath(active_video)) if active_video else None
+        if active_entry:
+            sz = active_entry['size_bytes']/(1024*1024)
+            st.success(f"🎬 Active: **{format_catalog_entry(active_entry)}**")
             if sz < 1: st.warning("⚠️ File terlalu kecil (<1MB). Cek link Google Drive!")
+        video_path = active_entry['path'] if active_entry else None
+        
+        # Probe source: stream-copy when already YouTube-compatible,
+        # otherwise loop a pre-transcoded copy once it is ready
+        use_passthrough = False
+        stream_source = video_path
+        needs_transcode = False
+        if video_path:
+            source_probe = probe_video(video_path)
+            if source_probe is None:
+                st.warning(f"⚠️ ffprobe could not read {os.path.basename(video_path)}; it will be re-encoded")
+            passthrough_ok, passthrough_reasons = check_passthrough(source_probe)
+            mismatch = profile_mismatch(source_probe, encoding_profile_from_state())
+            if passthrough_ok and not mismatch:
+                use_passthrough = st.checkbox(
+                    "⚡ Passthrough (no re-encode)", value=True, key="use_passthrough",
+                    help="Source is already H.264/AAC with a short GOP and matches the "
+                         "profile's size and frame rate; stream it with -c copy"
+                )
+            else:
+                # Incompatible codecs, or a profile (Shorts, other size/fps) the source doesn't match
+                st.caption("🔁 Re-encoding required: " + "; ".join(passthrough_reasons + mismatch))
+                transcode_cache = get_transcode_cache()
+                cache_profile = encoding_profile_from_state()
+                cached_path = transcode_cache.lookup(video_path, cache_profile)
+                if cached_path:
+                    stream_source = cached_path
+                    use_passthrough = True
+                    st.success(f"⚡ Pre-transcoded copy ready ({cache_profile.key()}) — streaming with -c copy")
+                else:
+                    # Encoding only starts on request (button or a re-encoding stream start),
+                    # never just because a video was selected
+                    needs_transcode = True
+                    job = transcode_cache.job(video_path, cache_profile)
+                    if job and job['state'] not in ('done', 'failed', 'cancelled'):
+                        col_tc1, col_tc2 = st.columns([3, 1])
+                        col_tc1.progress(job['progress'], text=f"🛠️ Pre-transcoding for {cache_profile.key()}: {job['state']}")
+                        if col_tc2.button("✖️ Cancel", key="cancel_transcode"):
+                            transcode_cache.cancel(video_path, cache_profile)
+                            st.rerun()
+                    else:
+                        if job and job['state'] == 'failed':
+                            st.warning(f"⚠️ Pre-transcode failed, will encode live: {job['error']}")
+                        if st.button("🛠️ Pre-transcode for -c copy looping", key="request_transcode",
+                                     help="Encode a stream-ready copy once in the background; "
+                                          "later starts of this video skip live encoding"):
+                            transcode_cache.request(video_path, cache_profile)
+                            st.rerun()
         
         # YouTube Authentication Status
         if 'youtube_service' in st.session_state and 'channel_info' in st.session_state:
@@ -1051,7 +4884,7 @@ def main():
                         auto_made_for_kids = st.checkbox("👶 Made for Kids", key="auto_made_for_kids")
                     
                     with col_set2:
-                        categories = get_youtube_categories()
+                        categories = get_youtube_categories(st.session_state.get('youtube_service'))
                         category_names = list(categories.values())
                         selected_category_name = st.selectbox("📂 Category", category_names, index=category_names.index("Gaming"), key="auto_category")
                         auto_category_id = [k for k, v in categories.items() if v == selected_category_name][0]
@@ -1109,10 +4942,15 @@ def main():
                 if live_info and video_path:
                     # Auto start streaming
                     if auto_start_streaming(
-                        video_path, 
+                        stream_source, 
                         live_info['stream_key'],
-                        session_id=st.session_state['session_id']
+                        profile=encoding_profile_from_state(),
+                        session_id=st.session_state['session_id'],
+                        passthrough=use_passthrough,
+                        queue_if_busy=st.session_state.get('queue_if_busy', False)
                     ):
+                        if needs_transcode:
+                            get_transcode_cache().request(video_path, encoding_profile_from_state())
                         st.success("🎉 Auto live stream started successfully!")
                         st.rerun()
                     else:
@@ -1218,7 +5056,7 @@ def main():
                                 with col_info1:
                                     st.write(f"**🎬 Title:** {stream_title}")
                                     st.write(f"**🔒 Privacy:** {privacy_status.title()}")
-                                    st.write(f"**📂 Category:** {get_youtube_categories().get(category_id, 'Unknown')}")
+                                    st.write(f"**📂 Category:** {get_youtube_categories(st.session_state.get('youtube_service')).get(category_id, 'Unknown')}")
                                 
                                 with col_info2:
                                     st.write(f"**🏷️ Tags:** {', '.join(tags) if tags else 'None'}")
@@ -1246,54 +5084,65 @@ def main():
                         log_to_database(st.session_state['session_id'], "ERROR", error_msg)
             
             with col_btn3:
+                channel_key = getattr(st.session_state['youtube_service'], '_channel_key', None)
                 if st.button("📋 View Existing Streams", help="View and manage existing live broadcasts"):
                     try:
                         service = st.session_state['youtube_service']
                         with st.spinner("Loading existing broadcasts..."):
-                            broadcasts = get_existing_broadcasts(service)
-                            
-                            if broadcasts:
-                                st.success(f"📺 Found {len(broadcasts)} existing broadcasts:")
-                                
-                                for i, broadcast in enumerate(broadcasts):
-                                    with st.expander(f"🎬 {broadcast['snippet']['title']} - {broadcast['status']['lifeCycleStatus']}"):
-                                        col_bc1, col_bc2 = st.columns(2)
-                                        
-                                        with col_bc1:
-                                            st.write(f"**Title:** {broadcast['snippet']['title']}")
-                                            st.write(f"**Status:** {broadcast['status']['lifeCycleStatus']}")
-                                            st.write(f"**Privacy:** {broadcast['status']['privacyStatus']}")
-                                            st.write(f"**Created:** {broadcast['snippet']['publishedAt'][:10]}")
-                                        
-                                        with col_bc2:
-                                            watch_url = f"https://www.youtube.com/watch?v={broadcast['id']}"
-                                            studio_url = f"https://studio.youtube.com/video/{broadcast['id']}/livestreaming"
-                                            
-                                            st.markdown(f"**Watch:** [Open]({watch_url})")
-                                            st.markdown(f"**Studio:** [Manage]({studio_url})")
-                                            
-                                            if st.button(f"🔑 Use This Stream", key=f"use_broadcast_{i}"):
-                                                # Get stream key for this broadcast
-                                                stream_info = get_broadcast_stream_key(service, broadcast['id'])
-                                                if stream_info:
-                                                    st.session_state['current_stream_key'] = stream_info['stream_key']
-                                                    st.session_state['live_broadcast_info'] = {
-                                                        'broadcast_id': broadcast['id'],
-                                                        'watch_url': watch_url,
-                                                        'studio_url': studio_url,
-                                                        'stream_key': stream_info['stream_key'],
-                                                        'stream_url': stream_info['stream_url']
-                                                    }
-                                                    st.success(f"✅ Using stream: {broadcast['snippet']['title']}")
-                                                    st.rerun()
-                                                else:
-                                                    st.error("❌ Could not get stream key for this broadcast")
-                            else:
-                                st.info("📺 No existing broadcasts found. Create a new one above!")
+                            # Kept in session state so the per-row buttons survive the next rerun,
+                            # tagged with the channel so switching channels drops the list
+                            st.session_state['existing_broadcasts'] = (
+                                channel_key, get_existing_broadcasts_with_streams(service)
+                            )
                     except Exception as e:
                         error_msg = f"Error loading existing broadcasts: {e}"
                         st.error(error_msg)
                         log_to_database(st.session_state['session_id'], "ERROR", error_msg)
+                
+                listed_channel, broadcasts = st.session_state.get('existing_broadcasts', (None, None))
+                if listed_channel != channel_key:
+                    st.session_state.pop('existing_broadcasts', None)
+                    broadcasts = None
+                if broadcasts:
+                    st.success(f"📺 Found {len(broadcasts)} existing broadcasts:")
+                    
+                    for i, broadcast in enumerate(broadcasts):
+                        stream_info = broadcast.get('stream')
+                        health = STREAM_HEALTH_ICONS.get(stream_info['health'], "⚪") if stream_info else "⚪"
+                        with st.expander(f"{health} {broadcast['snippet']['title']} - {broadcast['status']['lifeCycleStatus']}"):
+                            col_bc1, col_bc2 = st.columns(2)
+                            
+                            with col_bc1:
+                                st.write(f"**Title:** {broadcast['snippet']['title']}")
+                                st.write(f"**Status:** {broadcast['status']['lifeCycleStatus']}")
+                                st.write(f"**Privacy:** {broadcast['status']['privacyStatus']}")
+                                st.write(f"**Created:** {broadcast['snippet']['publishedAt'][:10]}")
+                                if stream_info:
+                                    st.write(f"**Stream:** {stream_info['stream_status']} · health {stream_info['health']}")
+                                else:
+                                    st.write("**Stream:** not bound")
+                            
+                            with col_bc2:
+                                watch_url = f"https://www.youtube.com/watch?v={broadcast['id']}"
+                                studio_url = f"https://studio.youtube.com/video/{broadcast['id']}/livestreaming"
+                                
+                                st.markdown(f"**Watch:** [Open]({watch_url})")
+                                st.markdown(f"**Studio:** [Manage]({studio_url})")
+                                
+                                if st.button(f"🔑 Use This Stream", key=f"use_broadcast_{i}", disabled=not stream_info):
+                                    # Stream key was resolved with the list — no extra API calls
+                                    st.session_state['current_stream_key'] = stream_info['stream_key']
+                                    st.session_state['live_broadcast_info'] = {
+                                        'broadcast_id': broadcast['id'],
+                                        'watch_url': watch_url,
+                                        'studio_url': studio_url,
+                                        'stream_key': stream_info['stream_key'],
+                                        'stream_url': stream_info['stream_url']
+                                    }
+                                    st.success(f"✅ Using stream: {broadcast['snippet']['title']}")
+                                    st.rerun()
+                elif broadcasts is not None:
+                    st.info("📺 No existing broadcasts found. Create a new one above!")
         
         # Channel selection from JSON config
         elif 'channel_config' in st.session_state:
@@ -1316,7 +5165,7 @@ def main():
                     if st.button("Verify Authentication"):
                         service = create_youtube_service(selected_channel['auth'])
                         if service:
-                            channels = get_channel_info(service)
+                            channels = get_channel_info(service, fresh=True)
                             if channels:
                                 channel = channels[0]
                                 st.success(f"✅ Authenticated as: {channel['snippet']['title']}")
@@ -1356,7 +5205,7 @@ def main():
             made_for_kids = st.checkbox("👶 Made for Kids", key="made_for_kids")
         
         with col_basic2:
-            categories = get_youtube_categories()
+            categories = get_youtube_categories(st.session_state.get('youtube_service'))
             category_names = list(categories.values())
             selected_category_name = st.selectbox("📂 Category", category_names, index=category_names.index("Gaming"))
             category_id = [k for k, v in categories.items() if v == selected_category_name][0]
@@ -1386,13 +5235,16 @@ def main():
             col_tech1, col_tech2 = st.columns(2)
             
             with col_tech1:
-                is_shorts = st.checkbox("📱 Shorts Mode (720x1280)")
+                is_shorts = st.checkbox("📱 Shorts Mode (vertical 9:16)", key="is_shorts")
                 enable_chat = st.checkbox("💬 Enable Live Chat", value=True)
             
             with col_tech2:
-                bitrate = st.selectbox("📊 Bitrate", ["1500k", "2500k", "4000k", "6000k"], index=1)
-                framerate = st.selectbox("🎞️ Frame Rate", ["24", "30", "60"], index=1)
-                resolution = st.selectbox("📺 Resolution", ["720p", "1080p", "1440p"], index=1)
+                bitrate = st.selectbox("📊 Bitrate", ["1500k", "2500k", "4000k", "6000k"], index=1, key="bitrate_select")
+                framerate = st.selectbox("🎞️ Frame Rate", ["24", "30", "60"], index=1, key="framerate_select")
+                resolution = st.selectbox("📺 Resolution", ["720p", "1080p", "1440p"], index=1, key="resolution_select")
+            
+            profile = encoding_profile_from_state()
+            st.caption(f"Encoder: {profile.key()} · GOP {profile.gop} frames")
         
         # Advanced settings
         with st.expander("⚙️ Advanced Settings"):
@@ -1414,18 +5266,21 @@ def main():
         st.header("📊 Status & Controls")
         
         # Streaming status
-        streaming = st.session_state.get('streaming', False)
-        if streaming:
-            st.error("🔴 LIVE")
-            
-            # Live stats
-            if 'stream_start_time' in st.session_state:
-                duration = datetime.now() - st.session_state['stream_start_time']
-                st.metric("⏱️ Duration", str(duration).split('.')[0])
-        else:
-            st.success("⚫ OFFLINE")
+        supervisor = get_stream_backend()
+        if isinstance(supervisor, StreamDaemonClient):
+            st.caption(f"🛰️ Streams managed by daemon at {supervisor.url}")
+        restore_attached_stream(supervisor)
+        stream_id = st.session_state.get('stream_id')
+        stream_status = supervisor.status(stream_id) if stream_id else None
+        streaming = bool(stream_status and stream_status['state'] in StreamDaemonClient.ACTIVE_STATES)
+        if stream_id:
+            st.caption(f"Stream: `{stream_id}`")
+        live_refresh = st.session_state.get('live_auto_refresh', True) and streaming
+        live_fragment(render_stream_status, live_refresh, supervisor, stream_id, live_refresh)
         
         # Control buttons
+        queue_if_busy = st.checkbox("⏳ Queue if server is busy", key="queue_if_busy",
+                                    help="Wait for CPU/uplink headroom instead of refusing to start")
         if st.button("▶️ Start Streaming", type="primary"):
             # Get the current stream key
             stream_key = st.session_state.get('current_stream_key', '')
@@ -1448,39 +5303,68 @@ def main():
                     st.session_state.get('channel_info', {}).get('snippet', {}).get('title', 'Unknown')
                 )
                 
-                # Start streaming
-                st.session_state['streaming'] = True
-                st.session_state['stream_start_time'] = datetime.now()
-                st.session_state['live_logs'] = []
-                
-                def log_callback(msg):
-                    if 'live_logs' not in st.session_state:
-                        st.session_state['live_logs'] = []
-                    st.session_state['live_logs'].append(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
-                    # Keep only last 100 logs in memory
-                    if len(st.session_state['live_logs']) > 100:
-                        st.session_state['live_logs'] = st.session_state['live_logs'][-100:]
-                
-                st.session_state['ffmpeg_thread'] = threading.Thread(
-                    target=run_ffmpeg, 
-                    args=(video_path, stream_key, is_shorts, log_callback, custom_rtmp or None, st.session_state['session_id']), 
-                    daemon=True
+                # Start streaming (live logs go to the stream's ring buffer)
+                new_stream_id = make_stream_id(stream_key, custom_rtmp or None)
+                ok, message = supervisor.start(
+                    new_stream_id, stream_source, stream_key, profile, None,
+                    custom_rtmp or None, st.session_state['session_id'], use_passthrough,
+                    queue_if_busy
                 )
-                st.session_state['ffmpeg_thread'].start()
-                st.success("🚀 Streaming started!")
-                log_to_database(st.session_state['session_id'], "INFO", f"Streaming started: {video_path}")
+                if ok:
+                    attach_stream(new_stream_id, own=True)
+                    record_session_stream(st.session_state['session_id'], new_stream_id)
+                    if needs_transcode:
+                        # This stream encodes live; prepare a -c copy source for the next start
+                        get_transcode_cache().request(video_path, profile)
+                    st.success(f"🚀 {message}")
+                    log_to_database(st.session_state['session_id'], "INFO", f"Streaming started: {video_path}")
+                    get_media_library().touch(video_path)
+                    st.rerun()
+                else:
+                    st.error(f"❌ {message}")
+                    log_to_database(st.session_state['session_id'], "ERROR", message, video_path)
+        
+        col_ctl1, col_ctl2 = st.columns(2)
+        with col_ctl1:
+            if st.button("⏹️ Stop Streaming", type="secondary", disabled=not stream_id):
+                supervisor.stop(stream_id)
+                st.warning("⏸️ Streaming stopped!")
+                log_to_database(st.session_state['session_id'], "INFO", "Streaming stopped by user")
                 st.rerun()
         
-        if st.button("⏹️ Stop Streaming", type="secondary"):
-            st.session_state['streaming'] = False
-            if 'stream_start_time' in st.session_state:
-                del st.session_state['stream_start_time']
-            os.system("pkill ffmpeg")
-            if os.path.exists("temp_video.mp4"):
-                os.remove("temp_video.mp4")
-            st.warning("⏸️ Streaming stopped!")
-            log_to_database(st.session_state['session_id'], "INFO", "Streaming stopped by user")
-            st.rerun()
+        with col_ctl2:
+            if st.button("🔁 Restart Streaming", disabled=stream_status is None):
+                ok, message = supervisor.restart(stream_id)
+                if ok:
+                    log_to_database(st.session_state['session_id'], "INFO", "Streaming restarted by user")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {message}")
+        
+        # Server-wide stream registry
+        with st.expander(f"🖥️ Server Streams ({supervisor.load():.1f}/{supervisor.max_streams:g} slots)"):
+            server_streams = supervisor.all_status_with_usage()
+            if server_streams:
+                st.dataframe(server_streams, hide_index=True, use_container_width=True)
+                for server_stream in server_streams:
+                    sid = server_stream['stream_id']
+                    # Viewers only control streams they started (STREAM_UI_ADMIN=1 lifts this)
+                    if not can_control_stream(sid):
+                        continue
+                    col_srv1, col_srv2, col_srv3 = st.columns([3, 1, 1])
+                    attached = " · 📌 attached" if sid == stream_id else ""
+                    col_srv1.write(f"`{sid}` · {server_stream['video']} · {server_stream['state']}{attached}")
+                    if col_srv2.button("🔗 Attach", key=f"attach_{sid}", disabled=sid == stream_id):
+                        attach_stream(sid)
+                        st.rerun()
+                    if col_srv3.button("⏹️ Stop", key=f"stop_{sid}",
+                                       disabled=server_stream['state'] not in StreamDaemonClient.ACTIVE_STATES):
+                        ok, message = supervisor.stop(sid)
+                        log_to_database(server_stream.get('session_id') or st.session_state['session_id'],
+                                        "INFO" if ok else "ERROR", f"Stop {sid}: {message}")
+                        st.rerun()
+            else:
+                st.info("No streams on this server.")
         
         # Live broadcast info
         if 'live_broadcast_info' in st.session_state:
@@ -1494,12 +5378,18 @@ def main():
         # Statistics
         st.subheader("📈 Statistics")
         
+        # Encoder health from ffmpeg progress samples
+        # Metrics are recorded under the session that started the stream (read-only view)
+        stream_session = (stream_status or {}).get('session_id') or st.session_state['session_id']
+        live_fragment(render_encoder_health, live_refresh, stream_session)
+        
         # Session stats
         session_logs = get_logs_from_database(st.session_state['session_id'], 50)
         st.metric("Session Logs", len(session_logs))
         
-        if 'live_logs' in st.session_state:
-            st.metric("Live Log Entries", len(st.session_state['live_logs']))
+        live_seq, _ = supervisor.tail(stream_id, sys.maxsize) if stream_id else (0, [])
+        if live_seq:
+            st.metric("Live Log Entries", live_seq)
         
         # Channel info display
         if 'channel_config' in st.session_state:
@@ -1527,78 +5417,82 @@ def main():
     with tab1:
         st.subheader("Real-time Streaming Logs")
         
-        # Live logs container
-        log_container = st.container()
-        with log_container:
-            if 'live_logs' in st.session_state and st.session_state['live_logs']:
-                # Show last 50 live logs
-                recent_logs = st.session_state['live_logs'][-50:]
-                logs_text = "\n".join(recent_logs)
-                st.text_area("Live Logs", logs_text, height=300, disabled=True, key="live_logs_display")
-            else:
-                st.info("No live logs available. Start streaming to see real-time logs.")
-        
-        # Auto-refresh toggle
-        auto_refresh = st.checkbox("🔄 Auto-refresh logs", value=streaming)
+        # Auto-refresh toggle (only the live panels re-run, not the whole page)
+        st.checkbox("🔄 Auto-refresh logs", value=True, key="live_auto_refresh")
         
-        if auto_refresh and streaming:
-            time.sleep(2)
-            st.rerun()
+        # Live log tail (delta fetch since the last seq seen)
+        live_fragment(render_live_log_tail, live_refresh, supervisor, stream_id)
     
     with tab2:
         st.subheader("Current Session History")
-        
-        session_logs = get_logs_from_database(st.session_state['session_id'], 100)
-        if session_logs:
-            # Create a formatted display
-            for log in session_logs[:20]:  # Show last 20 session logs
-                timestamp, log_type, message, video_file, channel_name = log
-                
-                # Color code by log type
-                if log_type == "ERROR":
-                    st.error(f"**{timestamp}** - {message}")
-                elif log_type == "INFO":
-                    st.info(f"**{timestamp}** - {message}")
-                elif log_type == "FFMPEG":
-                    st.text(f"{timestamp} - {message}")
-                else:
-                    st.write(f"**{timestamp}** - {message}")
-        else:
-            st.info("No session logs available yet.")
+        render_log_browser("session_logs", session_id=st.session_state['session_id'], page_size=20)
     
     with tab3:
         st.subheader("All Historical Logs")
         
-        # Filter options
-        col_filter1, col_filter2 = st.columns(2)
-        
-        with col_filter1:
-            log_limit = st.selectbox("Show logs", [50, 100, 200, 500], index=1)
-        
-        with col_filter2:
-            log_type_filter = st.selectbox("Filter by type", ["All", "INFO", "ERROR", "FFMPEG"])
-        
-        all_logs = get_logs_from_database(limit=log_limit)
+        # Full-text search across every stored line
+        search_text = st.text_input("🔎 Search all logs", key="fts_query",
+                                    placeholder='e.g. "Broken pipe" or rtmp*')
+        if search_text:
+            hits = search_logs(search_text)
+            if hits:
+                st.dataframe(hits, hide_index=True, use_container_width=True)
+                hit_id = st.selectbox(
+                    "Show context for", [hit['Id'] for hit in hits], key="fts_hit",
+                    format_func=lambda log_id: next(
+                        f"{hit['Time']} · {hit['Session']} · {hit['Match'][:60]}"
+                        for hit in hits if hit['Id'] == log_id
+                    )
+                )
+                st.dataframe(get_log_context(hit_id), hide_index=True, use_container_width=True)
+            else:
+                st.info("No matching log lines.")
+            st.markdown("---")
         
-        if all_logs:
-            # Filter by type if selected
-            if log_type_filter != "All":
-                all_logs = [log for log in all_logs if log[1] == log_type_filter]
-            
-            # Display in expandable sections
-            for i, log in enumerate(all_logs[:50]):  # Limit display to 50 for performance
-                timestamp, log_type, message, video_file, channel_name = log
-                
-                with st.expander(f"{log_type} - {timestamp} - {message[:50]}..."):
-                    st.write(f"**Timestamp:** {timestamp}")
-                    st.write(f"**Type:** {log_type}")
-                    st.write(f"**Message:** {message}")
-                    if video_file:
-                        st.write(f"**Video File:** {video_file}")
-                    if channel_name:
-                        st.write(f"**Channel:** {channel_name}")
-        else:
-            st.info("No historical logs available.")
+        render_log_browser("all_logs")
+
+def cli(argv):
+    """Command line entry points besides the Streamlit UI"""
+    parser = argparse.ArgumentParser(prog="app.py", description="YouTube Live Streaming tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    
+    daemon_parser = subparsers.add_parser("daemon", help="Run the headless stream daemon")
+    daemon_parser.add_argument("--host", default=DAEMON_HOST)
+    daemon_parser.add_argument("--port", type=int, default=DAEMON_PORT)
+    
+    bench_parser = subparsers.add_parser("bench-logs", help="Benchmark the batched log writer")
+    bench_parser.add_argument("lines", type=int, nargs="?", default=5000)
+    
+    export_parser = subparsers.add_parser("export-logs", help="Export logs to a compressed file")
+    export_parser.add_argument("out", help="Output file path")
+    export_parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="jsonl")
+    export_parser.add_argument("--session")
+    export_parser.add_argument("--type", dest="log_type")
+    export_parser.add_argument("--since", help="Start date (YYYY-MM-DD)")
+    export_parser.add_argument("--until", help="End date, exclusive (YYYY-MM-DD)")
+    
+    bench_db_parser = subparsers.add_parser("bench-db", help="Benchmark concurrent database access")
+    bench_db_parser.add_argument("--writers", type=int, default=4)
+    bench_db_parser.add_argument("--readers", type=int, default=2)
+    bench_db_parser.add_argument("--seconds", type=float, default=5)
+    
+    args = parser.parse_args(argv)
+    if args.command == "daemon":
+        run_stream_daemon(args.host, args.port)
+    elif args.command == "bench-logs":
+        benchmark_log_writer(args.lines)
+    elif args.command == "export-logs":
+        def to_ms(day):
+            return int(datetime.fromisoformat(day).timestamp() * 1000) if day else None
+        path, count = export_logs(
+            args.format, args.session, args.log_type, to_ms(args.since), to_ms(args.until), args.out
+        )
+        print(f"Exported {count:,} rows to {path}")
+    elif args.command == "bench-db":
+        benchmark_database(args.writers, args.readers, args.seconds)
 
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) > 1:
+        cli(sys.argv[1:])
+    else:
+        main()
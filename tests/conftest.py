@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Fresh, fully migrated database in a temporary working directory"""
+    monkeypatch.chdir(tmp_path)
+    app.get_database.clear()
+    app.init_database()
+    yield app.get_db()
+    app.get_database.clear()
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import app
+
+PAYLOAD = os.urandom(64 * 1024 + 123)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        options = self.server.options
+        range_header = self.headers.get('Range') if options['ranges'] else None
+        with self.server.lock:
+            self.server.requests.append(range_header)
+        start, end = 0, len(PAYLOAD) - 1
+        if range_header:
+            first, _, last = range_header.removeprefix("bytes=").partition("-")
+            start, end = int(first), min(int(last), len(PAYLOAD) - 1) if last else len(PAYLOAD) - 1
+        body = PAYLOAD[start:end + 1]
+
+        self.send_response(206 if range_header else 200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', '"v1"')
+        if range_header:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{len(PAYLOAD)}")
+        self.end_headers()
+
+        with self.server.lock:
+            drop = len(body) > 1 and end not in self.server.dropped and options['drop_once']
+            if drop:
+                self.server.dropped.add(end)
+        if drop:
+            # Send half of the body, then hang up
+            self.wfile.write(body[:len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            return
+        self.wfile.write(body)
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # The Range 0-0 probe hangs up without reading the body
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = QuietServer(("127.0.0.1", 0), RangeHandler)
+    httpd.options = {'ranges': True, 'drop_once': False}
+    httpd.requests, httpd.dropped, httpd.lock = [], set(), threading.Lock()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture(autouse=True)
+def small_segments(monkeypatch):
+    monkeypatch.setattr(app, "DOWNLOAD_MIN_SEGMENT", 8 * 1024)
+    monkeypatch.setattr(app, "DOWNLOAD_CHUNK_SIZE", 4 * 1024)
+    monkeypatch.setattr(app, "DOWNLOAD_MANIFEST_EVERY", 4 * 1024)
+    monkeypatch.setattr(app, "restart_delay", lambda attempt: 0)
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}/video.mp4"
+
+
+def segment_ranges(total, count):
+    size = -(-total // count)
+    return [f"bytes={i * size}-{min((i + 1) * size, total) - 1}" for i in range(count)]
+
+
+def test_parallel_ranges_reassemble_the_file(server, tmp_path):
+    dest = tmp_path / "video.mp4"
+
+    result = app.ChunkedDownloader(url(server), dest, segments=4).download()
+
+    assert result == dest
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests[0] == "bytes=0-0"
+    assert sorted(server.requests[1:]) == sorted(segment_ranges(len(PAYLOAD), 4))
+    assert not (tmp_path / "video.mp4.part").exists()
+    assert not (tmp_path / "video.mp4.part.json").exists()
+
+
+def test_small_files_use_fewer_segments(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DOWNLOAD_MIN_SEGMENT", 40 * 1024)
+
+    app.ChunkedDownloader(url(server), tmp_path / "video.mp4", segments=4).download()
+
+    assert len(server.requests) == 1 + 1
+
+
+def test_server_without_range_support_streams_once(server, tmp_path):
+    server.options['ranges'] = False
+    dest = tmp_path / "video.mp4"
+
+    app.ChunkedDownloader(url(server), dest, segments=4).download()
+
+    assert dest.read_bytes() == PAYLOAD
+    assert server.requests == [None, None]
+
+
+def test_dropped_connection_resumes_from_offset(server, tmp_path):
+    server.options['drop_once'] = True
+    dest = tmp_path / "video.mp4"
+
+    app.ChunkedDownloader(url(server), dest, segments=2).download()
+
+    assert dest.read_bytes() == PAYLOAD
+    first_segment, second_segment = segment_ranges(len(PAYLOAD), 2)
+    retries = server.requests[3:]
+    assert len(retries) == 2
+    # Retries continue after the bytes already written, not from the segment start
+    assert all(retry not in (first_segment, second_segment) for retry in retries)
+    assert {retry.rsplit("-", 1)[1] for retry in retries} == {
+        first_segment.rsplit("-", 1)[1], second_segment.rsplit("-", 1)[1]
+    }
+
+
+def test_cancelled_download_resumes_with_manifest(server, tmp_path):
+    dest = tmp_path / "video.mp4"
+    cancel = threading.Event()
+
+    def cancel_midway(done, total):
+        if done >= total // 2:
+            cancel.set()
+
+    downloader = app.ChunkedDownloader(url(server), dest, segments=1, on_progress=cancel_midway,
+                                       cancel_event=cancel)
+    with pytest.raises(InterruptedError):
+        downloader.download()
+    assert (tmp_path / "video.mp4.part.json").exists()
+
+    server.requests.clear()
+    app.ChunkedDownloader(url(server), dest, segments=1).download()
+
+    assert dest.read_bytes() == PAYLOAD
+    resumed_from = int(server.requests[1].removeprefix("bytes=").split("-")[0])
+    assert resumed_from >= len(PAYLOAD) // 2
+
+
+def test_checksum_mismatch_discards_the_download(server, tmp_path):
+    dest = tmp_path / "video.mp4"
+
+    with pytest.raises(IOError, match="SHA-256"):
+        app.ChunkedDownloader(url(server), dest, sha256="0" * 64).download()
+
+    assert not dest.exists()
+    assert not (tmp_path / "video.mp4.part").exists()
+
+
+def test_matching_checksum_passes(server, tmp_path):
+    dest = tmp_path / "video.mp4"
+
+    app.ChunkedDownloader(url(server), dest, sha256=hashlib.sha256(PAYLOAD).hexdigest()).download()
+
+    assert dest.read_bytes() == PAYLOAD
@@ -0,0 +1,63 @@
+import threading
+
+import app
+
+
+def connection_in_thread(database, hold=None):
+    seen = []
+
+    def run():
+        seen.append(database.connection())
+        if hold:
+            hold.wait()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, seen
+
+
+def test_connection_is_reused_after_its_thread_ends(tmp_path):
+    database = app.Database(tmp_path / "pool.db")
+    first, seen_first = connection_in_thread(database)
+    first.join()
+    second, seen_second = connection_in_thread(database)
+    second.join()
+
+    assert seen_second[0] is seen_first[0]
+
+
+def test_live_threads_get_their_own_connection(tmp_path):
+    database = app.Database(tmp_path / "pool.db")
+    # Both threads hold their connection until the other has one too
+    hold = threading.Barrier(2)
+    first, seen_first = connection_in_thread(database, hold)
+    second, seen_second = connection_in_thread(database, hold)
+    first.join()
+    second.join()
+
+    assert seen_first[0] is not seen_second[0]
+
+
+def test_open_transaction_is_rolled_back_before_reuse(tmp_path):
+    database = app.Database(tmp_path / "pool.db")
+    database.connection().execute("CREATE TABLE t (x)")
+
+    def write_without_commit():
+        database.connection().execute("INSERT INTO t VALUES (1)")
+
+    thread = threading.Thread(target=write_without_commit)
+    thread.start()
+    thread.join()
+
+    assert database.connection().execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_idle_queue_is_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DB_POOL_IDLE", 1)
+    database = app.Database(tmp_path / "pool.db")
+    hold = threading.Barrier(3)
+    threads = [connection_in_thread(database, hold)[0] for _ in range(3)]
+    for thread in threads:
+        thread.join()
+
+    assert database._idle.qsize() == 1
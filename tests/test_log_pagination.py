@@ -0,0 +1,56 @@
+import app
+
+
+def insert_logs(conn, rows):
+    with conn:
+        conn.executemany(
+            "INSERT INTO streaming_logs (timestamp, session_id, log_type, message, ts) VALUES (?, ?, ?, ?, ?)",
+            [("2024-05-01T12:00:00", session_id, log_type, message, ts) for session_id, log_type, message, ts in rows]
+        )
+
+
+def all_pages(**filters):
+    pages, cursor = [], None
+    while True:
+        rows, cursor = app.get_log_page(before=cursor, **filters)
+        pages.append(rows)
+        if cursor is None:
+            return pages
+
+
+def test_pages_cover_every_row_once_newest_first(db):
+    # Groups of identical timestamps exercise the (ts, id) tie-breaker
+    insert_logs(db, [("s1", "INFO", f"line {i}", 1_000 + i // 3) for i in range(25)])
+
+    pages = all_pages(page_size=7)
+
+    assert [len(page) for page in pages] == [7, 7, 7, 4]
+    messages = [row['Message'] for page in pages for row in page]
+    assert messages == [f"line {i}" for i in reversed(range(25))]
+
+
+def test_exact_multiple_of_page_size_ends_with_no_cursor(db):
+    insert_logs(db, [("s1", "INFO", f"line {i}", i) for i in range(10)])
+
+    rows, cursor = app.get_log_page(page_size=10)
+
+    assert len(rows) == 10
+    assert cursor is None
+
+
+def test_filters_apply_on_every_page(db):
+    insert_logs(db, [
+        ("s1" if i % 2 else "s2", "ERROR" if i % 3 == 0 else "INFO", f"line {i}", i)
+        for i in range(40)
+    ])
+
+    pages = all_pages(session_id="s1", log_type="ERROR", page_size=3)
+    rows = [row for page in pages for row in page]
+
+    assert rows
+    assert all(row['Session'] == "s1" and row['Type'] == "ERROR" for row in rows)
+    assert len(rows) == sum(1 for i in range(40) if i % 2 and i % 3 == 0)
+
+
+def test_empty_table(db):
+    assert app.get_log_page() == ([], None)
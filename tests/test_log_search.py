@@ -0,0 +1,77 @@
+import pytest
+
+import app
+
+HIT_KEYS = {'Id', 'Time', 'Session', 'Type', 'Channel', 'Match', 'Score'}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("rtmp error", '"rtmp" "error"'),
+    ("rtmp*", '"rtmp"*'),
+    ('"Broken pipe"', '"Broken pipe"'),
+    ('"Broken   pipe" rtmp*', '"Broken pipe" "rtmp"*'),
+    ('"conn re"* x', '"conn re"* "x"'),
+    ('say"hi OR NEAR(', '"sayhi" "OR" "NEAR("'),
+    ("   ", ""),
+    ("***", ""),
+])
+def test_fts_query(text, expected):
+    assert app.fts_query(text) == expected
+
+
+def insert_logs(conn, messages):
+    with conn:
+        conn.executemany(
+            "INSERT INTO streaming_logs (timestamp, session_id, log_type, message, ts) VALUES (?, ?, ?, ?, ?)",
+            [("2024-05-01T12:00:00", "s1", "ERROR", message, i) for i, message in enumerate(messages)]
+        )
+
+
+MESSAGES = [
+    "av_interleaved_write_frame(): Broken pipe",
+    "pipe is broken somewhere else",
+    "Connection to tcp://a.rtmp.youtube.com:1935 failed",
+]
+
+
+@pytest.fixture(params=["fts5", "like"])
+def search_db(request, db, monkeypatch):
+    if request.param == "fts5":
+        if not app.log_fts_enabled():
+            pytest.skip("SQLite built without FTS5")
+    else:
+        monkeypatch.setattr(app, "log_fts_enabled", lambda: False)
+    insert_logs(db, MESSAGES)
+    return db
+
+
+def test_phrase_matches_only_adjacent_words(search_db):
+    hits = app.search_logs('"broken pipe"')
+
+    assert [hit['Match'].replace("[", "").replace("]", "") for hit in hits] == [MESSAGES[0]]
+
+
+def test_terms_must_all_match(search_db):
+    hits = app.search_logs("pipe broken")
+
+    assert len(hits) == 2
+
+
+def test_prefix_search(search_db):
+    hits = app.search_logs("rtm*")
+
+    assert len(hits) == 1
+
+
+def test_hits_have_the_same_shape_with_and_without_fts(search_db):
+    hits = app.search_logs("pipe")
+
+    assert hits
+    assert all(set(hit) == HIT_KEYS for hit in hits)
+    # The context view is keyed by Id
+    assert app.get_log_context(hits[0]['Id'])
+
+
+@pytest.mark.parametrize("text", ["", "***", '""'])
+def test_query_without_terms_finds_nothing(search_db, text):
+    assert app.search_logs(text) == []
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+import app
+
+LATEST_VERSION = app.SCHEMA_MIGRATIONS[-1][0]
+
+
+def columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_fresh_database_is_fully_migrated(db):
+    assert db.execute("PRAGMA user_version").fetchone()[0] == LATEST_VERSION
+    assert {"ts"} <= columns(db, "streaming_logs")
+    assert {"restart_count", "downtime_seconds", "stream_id"} <= columns(db, "streaming_sessions")
+
+
+def test_versions_are_increasing():
+    versions = [version for version, _, _ in app.SCHEMA_MIGRATIONS]
+    assert versions == sorted(set(versions))
+
+
+def test_migrating_twice_is_a_no_op(db):
+    assert app.migrate_database(db) == LATEST_VERSION
+    assert db.execute("PRAGMA user_version").fetchone()[0] == LATEST_VERSION
+
+
+def test_legacy_database_is_upgraded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    legacy = sqlite3.connect("legacy.db")
+    legacy.executescript('''
+        CREATE TABLE streaming_logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            log_type TEXT NOT NULL,
+            message TEXT NOT NULL,
+            video_file TEXT,
+            stream_key TEXT,
+            channel_name TEXT
+        );
+        CREATE TABLE streaming_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT UNIQUE NOT NULL,
+            start_time TEXT NOT NULL,
+            end_time TEXT,
+            video_file TEXT,
+            stream_title TEXT,
+            stream_description TEXT,
+            tags TEXT,
+            category TEXT,
+            privacy_status TEXT,
+            made_for_kids BOOLEAN,
+            channel_name TEXT,
+            status TEXT DEFAULT 'active'
+        );
+        INSERT INTO streaming_logs (timestamp, session_id, log_type, message)
+        VALUES ('2024-05-01T12:00:00.250000', 's1', 'INFO', 'old line'),
+               ('not a timestamp', 's1', 'INFO', 'broken line');
+        INSERT INTO streaming_sessions (session_id, start_time) VALUES ('s1', '2024-05-01T12:00:00');
+    ''')
+    legacy.commit()
+    legacy.close()
+
+    app.init_database("legacy.db")
+    conn = app.get_db("legacy.db")
+
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == LATEST_VERSION
+    ts = dict(conn.execute("SELECT message, ts FROM streaming_logs").fetchall())
+    assert ts["old line"] == app._iso_to_epoch_ms('2024-05-01T12:00:00.250000')
+    assert ts["old line"] % 1000 == 250
+    assert conn.execute(
+        "SELECT restart_count, stream_id FROM streaming_sessions WHERE session_id = 's1'"
+    ).fetchone() == (0, None)
+
+
+def test_failed_migration_rolls_back(db, monkeypatch):
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (x INTEGER)")
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(app, "SCHEMA_MIGRATIONS", app.SCHEMA_MIGRATIONS + [(LATEST_VERSION + 1, "broken", broken)])
+
+    with pytest.raises(RuntimeError):
+        app.migrate_database(db)
+
+    assert db.execute("PRAGMA user_version").fetchone()[0] == LATEST_VERSION
+    assert db.execute("SELECT 1 FROM sqlite_master WHERE name = 'half_done'").fetchone() is None
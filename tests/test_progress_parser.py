@@ -0,0 +1,85 @@
+from app import FFmpegProgressParser, get_metrics_buffer, get_metrics_registry, release_metrics_buffer
+
+PROGRESS_BLOCK = """frame=250
+fps=25.00
+stream_0_0_q=28.0
+bitrate=2496.3kbits/s
+total_size=3145728
+out_time_us=10000000
+out_time_ms=10000000
+out_time=00:00:10.000000
+dup_frames=1
+drop_frames=2
+speed=1.01x
+progress=continue
+"""
+
+
+def feed_all(parser, text):
+    return [parser.feed(line) for line in text.splitlines(keepends=True)]
+
+
+def test_block_yields_one_sample_on_progress_line():
+    results = feed_all(FFmpegProgressParser(), PROGRESS_BLOCK)
+
+    assert all(is_progress for is_progress, _ in results)
+    samples = [sample for _, sample in results if sample is not None]
+    assert len(samples) == 1
+    sample = samples[0]
+    assert sample.frame == 250
+    assert sample.fps == 25.0
+    assert sample.bitrate_kbps == 2496.3
+    assert sample.speed == 1.01
+    assert sample.dup_frames == 1
+    assert sample.drop_frames == 2
+    assert sample.out_time_ms == 10000
+
+
+def test_log_lines_are_not_progress():
+    parser = FFmpegProgressParser()
+
+    assert parser.feed("Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'video.mp4':\n") == (False, None)
+    assert parser.feed("[flv @ 0x55] Failed to update header with correct duration.\n") == (False, None)
+    # key=value lines with unknown keys belong to the regular log
+    assert parser.feed("encoder=Lavf60.3.100\n") == (False, None)
+
+
+def test_unparseable_values_become_none():
+    parser = FFmpegProgressParser()
+    feed_all(parser, "frame=N/A\nbitrate=N/A\nspeed=N/A\nout_time_us=N/A\n")
+
+    _, sample = parser.feed("progress=end\n")
+
+    assert sample.frame is None
+    assert sample.bitrate_kbps is None
+    assert sample.speed is None
+    assert sample.out_time_ms is None
+
+
+def test_blocks_do_not_leak_into_each_other():
+    parser = FFmpegProgressParser()
+    feed_all(parser, PROGRESS_BLOCK)
+
+    _, sample = parser.feed("progress=continue\n")
+
+    assert sample.frame is None
+    assert sample.fps is None
+
+
+def test_finished_run_releases_its_metrics_buffer():
+    buffer = get_metrics_buffer("sess-metrics")
+
+    release_metrics_buffer("sess-metrics", buffer)
+
+    assert "sess-metrics" not in get_metrics_registry()
+
+
+def test_stale_release_keeps_the_newer_runs_buffer():
+    old = get_metrics_buffer("sess-restart")
+    release_metrics_buffer("sess-restart", old)
+    new = get_metrics_buffer("sess-restart")
+
+    release_metrics_buffer("sess-restart", old)
+
+    assert get_metrics_registry()["sess-restart"] is new
+    release_metrics_buffer("sess-restart", new)
@@ -0,0 +1,41 @@
+import random
+
+import pytest
+
+import app
+from app import RESTART_BASE_DELAY, RESTART_MAX_DELAY, restart_delay
+
+
+@pytest.mark.parametrize("attempt", range(1, 12))
+def test_delay_within_jitter_bounds(attempt):
+    base = min(RESTART_BASE_DELAY * 2 ** (attempt - 1), RESTART_MAX_DELAY)
+    for _ in range(50):
+        assert 0.5 * base <= restart_delay(attempt) <= 1.5 * base
+
+
+def test_delay_doubles_until_capped(monkeypatch):
+    monkeypatch.setattr(random, "uniform", lambda low, high: 1.0)
+
+    delays = [restart_delay(attempt) for attempt in range(1, 10)]
+
+    assert delays[:3] == [RESTART_BASE_DELAY, RESTART_BASE_DELAY * 2, RESTART_BASE_DELAY * 4]
+    assert max(delays) == RESTART_MAX_DELAY
+    assert delays == sorted(delays)
+
+
+def test_jitter_spreads_retries():
+    assert len({round(restart_delay(3), 6) for _ in range(20)}) > 1
+
+
+def test_saving_session_keeps_restart_stats(db):
+    app.save_streaming_session("sess", "a.mp4", "Title", "", "", "20", "public", False, "Channel")
+    app.record_session_stream("sess", "stream_abc")
+    app.record_stream_restart("sess", 3, 12.5)
+
+    app.save_streaming_session("sess", "b.mp4", "New title", "", "", "20", "public", False, "Channel")
+
+    row = db.execute(
+        "SELECT video_file, stream_title, restart_count, downtime_seconds, stream_id FROM streaming_sessions WHERE session_id = ?",
+        ("sess",)
+    ).fetchone()
+    assert row == ("b.mp4", "New title", 3, 12.5, "stream_abc")
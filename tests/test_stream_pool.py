@@ -0,0 +1,253 @@
+import json
+from datetime import datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import app
+
+
+def http_error(status, reason):
+    content = json.dumps({'error': {'errors': [{'reason': reason}], 'message': reason}}).encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+class Request:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+
+class FakeLiveStreams:
+    PAGE_SIZE = 2
+
+    def __init__(self, youtube):
+        self.youtube = youtube
+
+    def list(self, part, mine=True, maxResults=50, pageToken=None):
+        self.youtube.calls.append("liveStreams.list")
+        items = list(self.youtube.streams.values())
+        start = int(pageToken or 0)
+        page = {'items': items[start:start + self.PAGE_SIZE]}
+        if start + self.PAGE_SIZE < len(items):
+            page['nextPageToken'] = str(start + self.PAGE_SIZE)
+        return Request(lambda: page)
+
+    def insert(self, part, body):
+        self.youtube.calls.append("liveStreams.insert")
+        self.youtube.inserted += 1
+        stream = self.youtube.add_stream(f"s{self.youtube.inserted}")
+        return Request(lambda: stream)
+
+
+class FakeLiveBroadcasts:
+    def __init__(self, youtube):
+        self.youtube = youtube
+
+    def list(self, part, id, maxResults=None):
+        self.youtube.calls.append("liveBroadcasts.list")
+        states = self.youtube.broadcasts
+        return Request(lambda: {'items': [
+            {'id': broadcast_id, 'status': {'lifeCycleStatus': states[broadcast_id]}}
+            for broadcast_id in id.split(",") if broadcast_id in states
+        ]})
+
+    def insert(self, part, body):
+        self.youtube.calls.append("liveBroadcasts.insert")
+        broadcast_id = f"b{len(self.youtube.broadcasts) + 1}"
+        self.youtube.broadcasts[broadcast_id] = 'ready'
+        return Request(lambda: {'id': broadcast_id})
+
+    def bind(self, part, id, streamId):
+        def bind():
+            self.youtube.calls.append(f"bind:{streamId}")
+            if self.youtube.bind_error:
+                raise self.youtube.bind_error
+            if streamId not in self.youtube.streams:
+                raise http_error(404, 'liveStreamNotFound')
+            return {'id': id}
+        return Request(bind)
+
+
+class FakeYouTube:
+    _channel_key = "channel-1"
+
+    def __init__(self):
+        self.streams, self.broadcasts, self.calls = {}, {}, []
+        self.inserted = 0
+        self.bind_error = None
+
+    def add_stream(self, stream_id, status='ready'):
+        self.streams[stream_id] = {
+            'id': stream_id,
+            'cdn': {'ingestionType': 'rtmp',
+                    'ingestionInfo': {'streamName': f"key-{stream_id}", 'ingestionAddress': "rtmp://a.rtmp.youtube.com/live2"}},
+            'status': {'streamStatus': status}
+        }
+        return self.streams[stream_id]
+
+    def liveStreams(self):
+        return FakeLiveStreams(self)
+
+    def liveBroadcasts(self):
+        return FakeLiveBroadcasts(self)
+
+
+@pytest.fixture
+def youtube(db, monkeypatch):
+    # Negative: streams handed out in the same millisecond are already reusable
+    monkeypatch.setattr(app, "STREAM_POOL_REUSE_GRACE", -1)
+    app.get_youtube_response_cache().clear()
+    yield FakeYouTube()
+    app.get_youtube_response_cache().clear()
+
+
+def go_live(youtube):
+    # As if the pool caches had expired since the last broadcast
+    app.invalidate_youtube_cache(youtube, "live_streams", "pool_bindings")
+    return app.create_live_stream(youtube, "Title", "Description", datetime.now())
+
+
+def pool_rows(db):
+    return dict(db.execute("SELECT stream_id, broadcast_id FROM live_stream_pool").fetchall())
+
+
+def test_first_broadcast_inserts_and_records_binding(youtube, db):
+    live = go_live(youtube)
+
+    assert live['stream_key'] == f"key-{live['stream_id']}"
+    assert pool_rows(db) == {live['stream_id']: live['broadcast_id']}
+
+
+def test_warm_pool_broadcast_only_inserts_and_binds(youtube, db):
+    first, second = go_live(youtube), go_live(youtube)
+    youtube.broadcasts[first['broadcast_id']] = 'complete'
+    youtube.broadcasts[second['broadcast_id']] = 'complete'
+    go_live(youtube)   # Refreshes both caches; reuses one freed stream
+    youtube.calls.clear()
+
+    live = app.create_live_stream(youtube, "Title", "Description", datetime.now())
+
+    assert live['stream_id'] in (first['stream_id'], second['stream_id'])
+    assert youtube.calls == ["liveBroadcasts.insert", f"bind:{live['stream_id']}"]
+
+
+def test_binding_made_after_the_cached_check_counts_as_bound(youtube, db):
+    first = go_live(youtube)
+    youtube.broadcasts[first['broadcast_id']] = 'complete'
+    second = go_live(youtube)
+    assert second['stream_id'] == first['stream_id']
+
+    third = app.create_live_stream(youtube, "Title", "Description", datetime.now())
+
+    assert third['stream_id'] != second['stream_id']
+
+
+def test_streams_made_elsewhere_are_not_pooled(youtube, db):
+    youtube.add_stream("studio-stream")
+
+    live = go_live(youtube)
+
+    assert live['stream_id'] != "studio-stream"
+    assert "studio-stream" not in pool_rows(db)
+
+
+def test_bound_stream_is_reused_only_after_its_broadcast_ends(youtube, db):
+    first = go_live(youtube)
+    second = go_live(youtube)
+    assert second['stream_id'] != first['stream_id']
+
+    youtube.broadcasts[first['broadcast_id']] = 'complete'
+    third = go_live(youtube)
+
+    assert third['stream_id'] == first['stream_id']
+    assert youtube.calls.count("liveStreams.insert") == 2
+
+
+def test_deleted_broadcast_frees_its_stream(youtube, db):
+    first = go_live(youtube)
+    del youtube.broadcasts[first['broadcast_id']]
+
+    assert go_live(youtube)['stream_id'] == first['stream_id']
+
+
+def test_streams_receiving_data_are_skipped(youtube, db):
+    first = go_live(youtube)
+    youtube.broadcasts[first['broadcast_id']] = 'complete'
+    youtube.streams[first['stream_id']]['status']['streamStatus'] = 'active'
+
+    assert go_live(youtube)['stream_id'] != first['stream_id']
+
+
+def test_claim_lost_to_another_session_inserts_a_new_stream(youtube, db, monkeypatch):
+    first = go_live(youtube)
+    youtube.broadcasts[first['broadcast_id']] = 'complete'
+    monkeypatch.setattr(app, "STREAM_POOL_REUSE_GRACE", 600)
+    with db:
+        db.execute("UPDATE live_stream_pool SET last_bound_at = 0")
+
+    release = app.release_finished_bindings
+
+    def release_then_claim_elsewhere(service):
+        bound = release(service)
+        with db:
+            db.execute("UPDATE live_stream_pool SET last_bound_at = ?", (int(datetime.now().timestamp() * 1000),))
+        return bound
+
+    monkeypatch.setattr(app, "release_finished_bindings", release_then_claim_elsewhere)
+
+    assert go_live(youtube)['stream_id'] != first['stream_id']
+
+
+def test_sync_reads_every_page_before_pruning(youtube, db, monkeypatch):
+    monkeypatch.setattr(app, "STREAM_POOL_SYNC_TTL", -1)
+    for stream_id in ("x1", "x2", "x3"):
+        youtube.add_stream(stream_id)
+    live = go_live(youtube)   # Inserted last, so it's listed on the second page
+
+    statuses = app.sync_stream_pool(youtube)
+
+    assert live['stream_id'] in statuses
+    assert live['stream_id'] in pool_rows(db)
+
+    del youtube.streams[live['stream_id']]
+    app.invalidate_youtube_cache(youtube, "live_streams")
+    app.sync_stream_pool(youtube)
+
+    assert live['stream_id'] not in pool_rows(db)
+
+
+def test_bind_falls_back_when_pooled_stream_is_gone(youtube, db):
+    first = go_live(youtube)
+    youtube.broadcasts[first['broadcast_id']] = 'complete'
+    # Deleted on YouTube while the cached listing still shows it
+    stale_listing = {'items': [youtube.streams.pop(first['stream_id'])]}
+    app.get_youtube_response_cache()[(youtube._channel_key, "live_streams", ())] = (float("inf"), stale_listing)
+
+    live = app.create_live_stream(youtube, "Title", "Description", datetime.now())
+
+    assert live['stream_id'] != first['stream_id']
+    assert first['stream_id'] not in pool_rows(db)
+
+
+def test_other_bind_errors_are_not_retried(youtube, db):
+    first = go_live(youtube)
+    youtube.broadcasts[first['broadcast_id']] = 'complete'
+    youtube.bind_error = http_error(403, 'insufficientLivePermissions')
+
+    assert go_live(youtube) is None
+    assert youtube.calls.count("liveStreams.insert") == 1
+    assert first['stream_id'] in pool_rows(db)
+
+
+@pytest.mark.parametrize("status, reason, gone", [
+    (404, 'liveStreamNotFound', True),
+    (400, 'invalidStreamId', True),
+    (403, 'insufficientLivePermissions', False),
+    (500, 'backendError', False),
+])
+def test_stream_gone_error(status, reason, gone):
+    assert app.stream_gone_error(http_error(status, reason)) is gone